@@ -0,0 +1,181 @@
+"""Sliding-window message flood, duplicate, mention and join-burst detection"""
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+ANTISPAM_DEFAULTS = {
+    "enabled": False,
+    "messages": 6,            # this many messages...
+    "seconds": 5,             # ...within this many seconds is a flood
+    "duplicates": 4,          # identical messages in a row
+    "duplicate_seconds": 30,
+    "mentions": 0,            # user mentions in one message (0 disables antimention)
+    "timeout_minutes": 10
+}
+
+ANTIRAID_DEFAULTS = {
+    "enabled": False,
+    "joins": 10,              # this many joins...
+    "seconds": 10,            # ...within this many seconds is a raid
+    "lock_minutes": 10,
+    "channels": []            # channels to lock; empty means the system channel
+}
+
+# Allowed (min, max) for numeric settings; values outside are clamped, non-numbers use the default
+CONFIG_BOUNDS = {
+    "messages": (2, 100),
+    "seconds": (1, 3600),
+    "duplicates": (2, 100),
+    "duplicate_seconds": (1, 3600),
+    "mentions": (0, 100),
+    "timeout_minutes": (1, 40320),
+    "joins": (2, 1000),
+    "lock_minutes": (1, 1440)
+}
+
+def resolve_config(defaults: Dict[str, Any], config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Merge a guild's settings over the defaults, or None when disabled.
+
+    Settings can come from the dashboard unchecked, so numbers are clamped
+    to CONFIG_BOUNDS; a window of 0 messages would otherwise break every hit().
+    """
+    resolved = {**defaults, **(config or {})}
+    if not resolved["enabled"]:
+        return None
+    for key, (low, high) in CONFIG_BOUNDS.items():
+        if key not in defaults:
+            continue
+        value = resolved[key]
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            value = defaults[key]
+        resolved[key] = min(max(int(value), low), high)
+    if not isinstance(resolved.get("channels", []), list):
+        resolved["channels"] = []
+    return resolved
+
+class RateWindow:
+    """Ring buffer of the last `limit` event times.
+
+    The window is full when `limit` events fit inside `seconds`, which is an
+    O(1) check against the oldest entry.
+    """
+    __slots__ = ("times",)
+
+    def __init__(self, limit: int):
+        self.times: Deque[float] = deque(maxlen=limit)
+
+    def hit(self, now: float, seconds: float) -> bool:
+        """Record an event, returning True if the rate was exceeded"""
+        self.times.append(now)
+        return len(self.times) == self.times.maxlen and now - self.times[0] <= seconds
+
+    @property
+    def last(self) -> float:
+        return self.times[-1] if self.times else 0.0
+
+class UserActivity:
+    """One member's recent messages"""
+    __slots__ = ("window", "last_hash", "repeats", "repeat_started")
+
+    def __init__(self, limit: int):
+        self.window = RateWindow(limit)
+        self.last_hash = None
+        self.repeats = 0
+        self.repeat_started = 0.0
+
+class SpamDetector:
+    """Per-user message counters, kept only for members who spoke recently"""
+
+    def __init__(self, idle_ttl: float = 120.0):
+        self.idle_ttl = idle_ttl
+        self._users: Dict[Tuple[int, int], UserActivity] = {}
+        self.stats = {"flood": 0, "duplicate": 0, "mentions": 0, "evicted": 0}
+
+    def check(self, guild_id: int, user_id: int, content: str, mentions: int,
+              config: Dict[str, Any], now: Optional[float] = None) -> Optional[str]:
+        """Record a message, returning the rule it broke, if any"""
+        now = time.monotonic() if now is None else now
+        if config["mentions"] and mentions >= config["mentions"]:
+            return self._tripped(guild_id, user_id, "mentions")
+
+        key = (guild_id, user_id)
+        activity = self._users.get(key)
+        if activity is None or activity.window.times.maxlen != config["messages"]:
+            activity = self._users[key] = UserActivity(config["messages"])
+
+        if activity.window.hit(now, config["seconds"]):
+            return self._tripped(guild_id, user_id, "flood")
+
+        content_hash = hash(content.strip().lower())
+        if content_hash == activity.last_hash and now - activity.repeat_started <= config["duplicate_seconds"]:
+            activity.repeats += 1
+            if activity.repeats >= config["duplicates"]:
+                return self._tripped(guild_id, user_id, "duplicate")
+        else:
+            activity.last_hash = content_hash
+            activity.repeats = 1
+            activity.repeat_started = now
+        return None
+
+    def _tripped(self, guild_id: int, user_id: int, rule: str) -> str:
+        # Start over so one burst triggers one action
+        self._users.pop((guild_id, user_id), None)
+        self.stats[rule] += 1
+        return rule
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Forget members who haven't spoken for idle_ttl seconds"""
+        now = time.monotonic() if now is None else now
+        idle = [key for key, activity in self._users.items() if now - activity.window.last > self.idle_ttl]
+        for key in idle:
+            del self._users[key]
+        self.stats["evicted"] += len(idle)
+        return len(idle)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"tracked": len(self._users), **self.stats}
+
+class RaidDetector:
+    """Per-guild join counters with a raid mode that lasts while channels are locked"""
+
+    def __init__(self, idle_ttl: float = 600.0):
+        self.idle_ttl = idle_ttl
+        self._joins: Dict[int, RateWindow] = {}
+        self._raid_until: Dict[int, float] = {}
+        self.stats = {"raids": 0, "evicted": 0}
+
+    def in_raid(self, guild_id: int, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return self._raid_until.get(guild_id, 0.0) > now
+
+    def check(self, guild_id: int, config: Dict[str, Any], now: Optional[float] = None) -> bool:
+        """Record a join, returning True when it starts a raid"""
+        now = time.monotonic() if now is None else now
+        window = self._joins.get(guild_id)
+        if window is None or window.times.maxlen != config["joins"]:
+            window = self._joins[guild_id] = RateWindow(config["joins"])
+
+        if not window.hit(now, config["seconds"]) or self.in_raid(guild_id, now):
+            return False
+        self._raid_until[guild_id] = now + config["lock_minutes"] * 60
+        self.stats["raids"] += 1
+        return True
+
+    def end_raid(self, guild_id: int):
+        self._raid_until.pop(guild_id, None)
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        idle = [
+            guild_id for guild_id, window in self._joins.items()
+            if now - window.last > self.idle_ttl and not self.in_raid(guild_id, now)
+        ]
+        for guild_id in idle:
+            del self._joins[guild_id]
+            self._raid_until.pop(guild_id, None)
+        self.stats["evicted"] += len(idle)
+        return len(idle)
+
+    def get_stats(self) -> Dict[str, int]:
+        raiding = sum(1 for guild_id in self._raid_until if self.in_raid(guild_id))
+        return {"tracked": len(self._joins), "raiding": raiding, **self.stats}
@@ -0,0 +1,145 @@
+"""Batched, write-behind command audit logging"""
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List
+
+from pymongo.errors import BulkWriteError
+
+from database import run_db
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+# Backpressure policies applied when the queue is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+BLOCK = "block"
+DROP_POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+class CommandLogWriter:
+    """Queue command log records in memory and write them with insert_many"""
+
+    def __init__(self, collection, max_queue: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 2.0, drop_policy: str = DROP_OLDEST,
+                 block_timeout: float = 1.0):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown drop policy: {drop_policy}")
+
+        self.collection = collection
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self.block_timeout = block_timeout
+
+        self._queue = deque()
+        self._batch_ready = asyncio.Event()
+        self._space_available = asyncio.Event()
+        self._space_available.set()
+        self._task = None
+        self._closed = False
+
+        self.counters = {"queued": 0, "flushed": 0, "dropped": 0, "batches": 0, "failed_batches": 0}
+
+    def start(self):
+        """Start the background flush task"""
+        if self._task is None:
+            self._closed = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, record: Dict[str, Any]) -> bool:
+        """Queue a record, applying the drop policy if the queue is full"""
+        if len(self._queue) >= self.max_queue:
+            if self.drop_policy == DROP_OLDEST:
+                self._queue.popleft()
+                self.counters["dropped"] += 1
+            elif self.drop_policy == DROP_NEWEST or not await self._wait_for_space():
+                self.counters["dropped"] += 1
+                return False
+
+        self._queue.append(record)
+        self.counters["queued"] += 1
+        if len(self._queue) >= self.max_queue:
+            self._space_available.clear()
+        if len(self._queue) >= self.batch_size:
+            self._batch_ready.set()
+        return True
+
+    async def _wait_for_space(self) -> bool:
+        """Wait for the flush task to free queue space"""
+        self._batch_ready.set()
+        try:
+            await asyncio.wait_for(self._space_available.wait(), self.block_timeout)
+        except asyncio.TimeoutError:
+            return False
+        return len(self._queue) < self.max_queue
+
+    async def _run(self):
+        """Flush when a batch fills up or the flush interval elapses"""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all queued records in batches.
+
+        insert_many gives each record an _id in place, so a batch retried after
+        a timeout or partial failure hits duplicate key errors for the records
+        that did get written; those count as written instead of failing again.
+        """
+        while self._queue:
+            batch = self._take_batch()
+            try:
+                await run_db(self.collection.insert_many(batch, ordered=False))
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                failed = [batch[error["index"]] for error in errors if error.get("code") != DUPLICATE_KEY]
+                self.counters["flushed"] += len(batch) - len(failed)
+                self.counters["batches"] += 1
+                if failed:
+                    self.counters["failed_batches"] += 1
+                    logger.error(f"Failed to write {len(failed)} of {len(batch)} command logs: {errors[0].get('errmsg')}")
+                    self._requeue(failed)
+                    return
+                continue
+            except Exception as e:
+                self.counters["failed_batches"] += 1
+                logger.error(f"Failed to write {len(batch)} command logs: {e}")
+                self._requeue(batch)
+                return
+
+            self.counters["flushed"] += len(batch)
+            self.counters["batches"] += 1
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        """Remove up to batch_size records from the front of the queue"""
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+        self._space_available.set()
+        return batch
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        """Put a failed batch back at the front of the queue, dropping what no longer fits"""
+        room = self.max_queue - len(self._queue)
+        if room < len(batch):
+            self.counters["dropped"] += len(batch) - room
+            batch = batch[len(batch) - room:] if room > 0 else []
+        self._queue.extendleft(reversed(batch))
+
+    async def close(self):
+        """Stop the flush task and write out everything still queued"""
+        self._closed = True
+        if self._task:
+            self._batch_ready.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Get queue size and counters"""
+        return {"pending": len(self._queue), **self.counters}
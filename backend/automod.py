@@ -0,0 +1,122 @@
+"""Automod rules compiled once per guild config into fast matchers"""
+import re
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Pattern, Tuple
+
+INVITE_PATTERN = re.compile(
+    r"(?:https?://)?(?:www\.)?(?:discord(?:app)?\.com/invite|discord\.gg|dsc\.gg)/[\w-]+",
+    re.IGNORECASE
+)
+LINK_PATTERN = re.compile(r"(?:https?://|www\.)([^\s/<>]+)", re.IGNORECASE)
+WORD_PATTERN = re.compile(r"\w+")
+
+# Longer terms are ignored; they'd only ever match pasted walls of text
+MAX_TERM_LENGTH = 100
+
+DEFAULT_CONFIG = {
+    "enabled": False,
+    "words": [],
+    "antiinvite": False,
+    "antilink": False,
+    "allowed_domains": [],
+    "anticaps": False,
+    "caps_min_length": 10,
+    "caps_ratio": 0.7
+}
+
+def _trie_pattern(trie: Dict[str, Any]) -> str:
+    """Turn a character trie into a regex that shares common prefixes.
+
+    Nodes are rendered children-first from an explicit stack, so a long
+    phrase can't run into the recursion limit.
+    """
+    patterns: Dict[int, str] = {}
+    stack = [(trie, False)]
+    while stack:
+        node, children_done = stack.pop()
+        if not children_done:
+            stack.append((node, True))
+            stack.extend((child, False) for char, child in node.items() if char)
+            continue
+
+        end = "" in node
+        branches = [re.escape(char) + patterns.pop(id(child)) for char, child in sorted(node.items()) if char]
+        if not branches:
+            pattern = ""
+        elif len(branches) == 1 and not end:
+            pattern = branches[0]
+        else:
+            pattern = "(?:" + "|".join(branches) + ")" + ("?" if end else "")
+        patterns[id(node)] = pattern
+    return patterns[id(trie)]
+
+def compile_word_list(words: Iterable[str]) -> Tuple[FrozenSet[str], Optional[Pattern]]:
+    """Compile banned terms for whole-word, case-insensitive matching.
+
+    Single-word terms go in a set checked against the message's tokens, which
+    costs the same for ten terms or ten thousand. Phrases and terms with
+    punctuation are combined into one regex built from a trie, so the engine
+    walks shared prefixes once instead of retrying every alternative.
+    """
+    terms = set()
+    trie: Dict[str, Any] = {}
+    for word in words:
+        word = word.strip().lower()
+        if not word or len(word) > MAX_TERM_LENGTH:
+            continue
+        if WORD_PATTERN.fullmatch(word):
+            terms.add(word)
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    phrases = re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)") if trie else None
+    return frozenset(terms), phrases
+
+class AutomodRules:
+    """One guild's automod settings, compiled"""
+    __slots__ = ("enabled", "terms", "phrases", "antiinvite", "antilink", "allowed_domains",
+                 "anticaps", "caps_min_length", "caps_ratio", "config")
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        self.terms, self.phrases = compile_word_list(self.config["words"])
+        self.antiinvite = bool(self.config["antiinvite"])
+        self.antilink = bool(self.config["antilink"])
+        self.allowed_domains = tuple(domain.lower().lstrip(".") for domain in self.config["allowed_domains"])
+        self.anticaps = bool(self.config["anticaps"])
+        self.caps_min_length = int(self.config["caps_min_length"])
+        self.caps_ratio = float(self.config["caps_ratio"])
+        self.enabled = bool(self.config["enabled"]) and bool(
+            self.terms or self.phrases or self.antiinvite or self.antilink or self.anticaps
+        )
+
+    def _allowed_host(self, host: str) -> bool:
+        host = host.lower().split(":", 1)[0]
+        return any(host == domain or host.endswith("." + domain) for domain in self.allowed_domains)
+
+    def check(self, content: str) -> Optional[str]:
+        """Get the name of the first rule the content breaks, if any"""
+        if not self.enabled or not content:
+            return None
+
+        lowered = content.lower()
+        if self.antiinvite and ("discord" in lowered or "dsc.gg" in lowered) and INVITE_PATTERN.search(content):
+            return "invite"
+        if self.antilink and ("http" in lowered or "www." in lowered):
+            for match in LINK_PATTERN.finditer(content):
+                if not self._allowed_host(match.group(1)):
+                    return "link"
+        if self.terms and not self.terms.isdisjoint(WORD_PATTERN.findall(lowered)):
+            return "word"
+        if self.phrases is not None and self.phrases.search(lowered):
+            return "word"
+        if self.anticaps and len(content) >= self.caps_min_length:
+            letters = sum(map(str.isalpha, content))
+            if letters >= self.caps_min_length and sum(map(str.isupper, content)) >= letters * self.caps_ratio:
+                return "caps"
+        return None
+
+# Shared by every guild without automod configured
+NO_RULES = AutomodRules()
@@ -1,18 +1,42 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 import asyncio
 import os
+import sys
+import signal
 import json
 from datetime import datetime, timedelta
 import uuid
-from pymongo import MongoClient
 import logging
 import re
 import random
+import math
+from collections import Counter
 from typing import Optional, List, Dict, Any
-import aiohttp
 import httpx
 import time
+from aiohttp import web
+from pymongo import ReturnDocument, UpdateOne
+from database import (
+    db, run_db, servers_collection, commands_collection, users_collection,
+    warnings_collection, economy_collection, bot_shards_collection, bulk_jobs_collection,
+    levels_collection, scheduled_jobs_collection
+)
+from audit_log import CommandLogWriter
+from indexes import ensure_indexes_async, index_ready
+from economy import ECONOMY_UNIQUE_INDEX, EconomyLedger, Leaderboard
+from leveling import LEVEL_THRESHOLDS, LEVELS_UNIQUE_INDEX, XPEngine, level_for_xp, resolve_levels
+from metrics import MetricsRegistry, command_spans, start_spans, timed_span
+from loop_monitor import LoopMonitor
+from purge import PurgeJob, message_filter
+from bulk_actions import BulkActionExecutor, moderatable_targets
+from scheduler import JobScheduler
+from cooldowns import CommandCooldowns, clean_overrides
+from automod import MAX_TERM_LENGTH, NO_RULES, AutomodRules
+from antispam import ANTIRAID_DEFAULTS, ANTISPAM_DEFAULTS, RaidDetector, SpamDetector, resolve_config
+from news import (
+    COUNTRY_MAP, CATEGORY_MAP, NewsAPIError, NewsCache, fetch_news_embed
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -23,48 +47,446 @@ TOKEN = os.environ.get('DISCORD_BOT_TOKEN', 'MTE2MjA1MzM3OTMxMzM4MTUyOA.Gqbogw.-
 APPLICATION_ID = os.environ.get('DISCORD_APP_ID', '1162053379313381528')
 NEWS_API_KEY = os.environ.get('NEWS_API_KEY', '8ebf508a6ce04f47821b7fd21e7ae5e4')
 
-# MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ.get('DB_NAME', 'discord_bot_db')
+# Sharding (set per worker by server.py's cluster launcher)
+WORKER_ID = int(os.environ.get('WORKER_ID', '0'))
+WORKER_COUNT = int(os.environ.get('WORKER_COUNT', '1'))
+SHARD_IDS = [int(shard_id) for shard_id in os.environ.get('SHARD_IDS', '').split(',') if shard_id]
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', '0')) or None
+SHARD_STATUS_INTERVAL = float(os.environ.get('SHARD_STATUS_INTERVAL', '15'))
+
+# Control messages from server.py on stdin (longest accepted line in bytes; config updates carry whole word lists)
+CONTROL_LINE_LIMIT = int(os.environ.get('CONTROL_LINE_LIMIT', str(16 * 1024 * 1024)))
+
+# Metrics endpoint (port 0 disables it)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9100'))
+
+# Event-loop lag sampling (stalls at or above the threshold are recorded)
+LOOP_LAG_INTERVAL = float(os.environ.get('LOOP_LAG_INTERVAL', '0.25'))
+LOOP_LAG_THRESHOLD = float(os.environ.get('LOOP_LAG_THRESHOLD', '0.5'))
+
+# Purges (requests per second per channel for bulk deletes and for deletes of messages older than 14 days)
+PURGE_MAX_SCAN = int(os.environ.get('PURGE_MAX_SCAN', '10000'))
+PURGE_BULK_RATE = float(os.environ.get('PURGE_BULK_RATE', '1'))
+PURGE_SINGLE_RATE = float(os.environ.get('PURGE_SINGLE_RATE', '1'))
+PURGE_PROGRESS_INTERVAL = float(os.environ.get('PURGE_PROGRESS_INTERVAL', '3'))
+
+# Mass moderation (massban, massrole, roleall, rolehumans); rates are requests per second per guild
+BULK_ACTION_CONCURRENCY = int(os.environ.get('BULK_ACTION_CONCURRENCY', '5'))
+BULK_BAN_RATE = float(os.environ.get('BULK_BAN_RATE', '1'))
+BULK_ROLE_RATE = float(os.environ.get('BULK_ROLE_RATE', '2'))
+BULK_CHECKPOINT_INTERVAL = float(os.environ.get('BULK_CHECKPOINT_INTERVAL', '5'))
+BULK_PROGRESS_INTERVAL = float(os.environ.get('BULK_PROGRESS_INTERVAL', '5'))
+
+# Scheduled jobs (reminders, timers, temporary bans); only jobs due within the horizon are kept in memory
+SCHEDULER_HORIZON = float(os.environ.get('SCHEDULER_HORIZON', '300'))
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', '500'))
+SCHEDULER_CONCURRENCY = int(os.environ.get('SCHEDULER_CONCURRENCY', '10'))
+SCHEDULER_MAX_ATTEMPTS = int(os.environ.get('SCHEDULER_MAX_ATTEMPTS', '5'))
+SCHEDULE_MAX_DAYS = int(os.environ.get('SCHEDULE_MAX_DAYS', '365'))
+
+# Command cooldowns: calls per window, per user and per guild, for each command
+COMMAND_USER_RATE = float(os.environ.get('COMMAND_USER_RATE', '5'))
+COMMAND_USER_PER = float(os.environ.get('COMMAND_USER_PER', '10'))
+COMMAND_GUILD_RATE = float(os.environ.get('COMMAND_GUILD_RATE', '30'))
+COMMAND_GUILD_PER = float(os.environ.get('COMMAND_GUILD_PER', '10'))
+
+# Overridden per guild by settings.cooldowns in the server config, e.g. {"news": {"user": {"rate": 1, "per": 60}}}
+DEFAULT_COOLDOWNS = {
+    "*": {
+        "user": {"rate": COMMAND_USER_RATE, "per": COMMAND_USER_PER},
+        "guild": {"rate": COMMAND_GUILD_RATE, "per": COMMAND_GUILD_PER}
+    },
+    "news": {"user": {"rate": 2, "per": 30}, "guild": {"rate": 10, "per": 60}}
+}
+
+# Command log batching
+COMMAND_LOG_QUEUE_SIZE = int(os.environ.get('COMMAND_LOG_QUEUE_SIZE', '10000'))
+COMMAND_LOG_BATCH_SIZE = int(os.environ.get('COMMAND_LOG_BATCH_SIZE', '500'))
+COMMAND_LOG_FLUSH_INTERVAL = float(os.environ.get('COMMAND_LOG_FLUSH_INTERVAL', '2'))
+COMMAND_LOG_DROP_POLICY = os.environ.get('COMMAND_LOG_DROP_POLICY', 'drop_oldest')
+
+# Outbound HTTP client
+HTTP_MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', '60'))
+HTTP_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '10'))
 
-client = MongoClient(MONGO_URL)
-db = client[DB_NAME]
+# News caching
+NEWS_CACHE_TTL = float(os.environ.get('NEWS_CACHE_TTL', '900'))
+NEWS_CACHE_STALE_TTL = float(os.environ.get('NEWS_CACHE_STALE_TTL', '1800'))
+NEWS_PREFETCH_INTERVAL = float(os.environ.get('NEWS_PREFETCH_INTERVAL', '600'))
+NEWS_PREFETCH_STAGGER = float(os.environ.get('NEWS_PREFETCH_STAGGER', '2'))
+# Prefetching refreshes only feeds requested within NEWS_PREFETCH_RECENT seconds, and spends at most
+# NEWS_PREFETCH_QUOTA_SHARE of the NewsAPI daily quota, split across the cluster's workers
+NEWS_DAILY_QUOTA = int(os.environ.get('NEWS_DAILY_QUOTA', '100'))
+NEWS_PREFETCH_QUOTA_SHARE = float(os.environ.get('NEWS_PREFETCH_QUOTA_SHARE', '0.5'))
+NEWS_PREFETCH_RECENT = float(os.environ.get('NEWS_PREFETCH_RECENT', '3600'))
 
-# Collections
-servers_collection = db.servers
-commands_collection = db.commands
-users_collection = db.users
-warnings_collection = db.warnings
-economy_collection = db.economy
+# Economy ledger (durability window in seconds, 0 writes every change immediately)
+ECONOMY_FLUSH_INTERVAL = float(os.environ.get('ECONOMY_FLUSH_INTERVAL', '5'))
+ECONOMY_FLUSH_BATCH_SIZE = int(os.environ.get('ECONOMY_FLUSH_BATCH_SIZE', '1000'))
+ECONOMY_IDLE_TTL = float(os.environ.get('ECONOMY_IDLE_TTL', '3600'))
+LEADERBOARD_IDLE_TTL = float(os.environ.get('LEADERBOARD_IDLE_TTL', '3600'))
+
+# Message XP (awarded at most once per cooldown, written back every flush interval)
+XP_FLUSH_INTERVAL = float(os.environ.get('XP_FLUSH_INTERVAL', '10'))
+XP_FLUSH_BATCH_SIZE = int(os.environ.get('XP_FLUSH_BATCH_SIZE', '1000'))
+XP_COOLDOWN = float(os.environ.get('XP_COOLDOWN', '60'))
+XP_PER_MESSAGE_MIN = int(os.environ.get('XP_PER_MESSAGE_MIN', '15'))
+XP_PER_MESSAGE_MAX = int(os.environ.get('XP_PER_MESSAGE_MAX', '25'))
+XP_IDLE_TTL = float(os.environ.get('XP_IDLE_TTL', '3600'))
+
+# Guild registration
+GUILD_SYNC_BATCH_SIZE = int(os.environ.get('GUILD_SYNC_BATCH_SIZE', '1000'))
+
+# Memory profile ("full" caches every member and presence, "low" only what commands need)
+BOT_MEMORY_PROFILE = os.environ.get('BOT_MEMORY_PROFILE', 'full').lower()
+LOW_MEMORY = BOT_MEMORY_PROFILE == 'low'
+
+def env_flag(name, default):
+    """Read a boolean environment variable"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+BOT_PRESENCES = env_flag('BOT_PRESENCES', not LOW_MEMORY)
+BOT_VOICE_STATES = env_flag('BOT_VOICE_STATES', not LOW_MEMORY)
+BOT_CHUNK_AT_STARTUP = env_flag('BOT_CHUNK_AT_STARTUP', not LOW_MEMORY)
+BOT_MEMBER_CACHE = os.environ.get('BOT_MEMBER_CACHE', 'none' if LOW_MEMORY else 'all').lower()
 
 # Bot intents
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 intents.guilds = True
-intents.voice_states = True
-intents.presences = True
+intents.voice_states = BOT_VOICE_STATES
+intents.presences = BOT_PRESENCES
+
+if BOT_MEMBER_CACHE == 'none':
+    member_cache_flags = discord.MemberCacheFlags.none()
+elif BOT_MEMBER_CACHE == 'joined':
+    member_cache_flags = discord.MemberCacheFlags(joined=True, voice=BOT_VOICE_STATES)
+else:
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
+# Guild config caches (prefix, cooldown overrides, compiled automod rules, anti-spam/raid thresholds, leveling)
+DEFAULT_PREFIX = "!"
+GUILD_CONFIG_PROJECTION = {
+    "server_id": 1, "prefix": 1, "settings.cooldowns": 1, "settings.automod": 1,
+    "settings.antispam": 1, "settings.antiraid": 1, "settings.levels": 1
+}
+prefix_cache: Dict[str, str] = {}
+prefix_cache_stats = {"hits": 0, "misses": 0}
+guild_cooldowns: Dict[str, Dict[str, Any]] = {}
+guild_automod: Dict[str, AutomodRules] = {}
+guild_antispam: Dict[str, Optional[Dict[str, Any]]] = {}
+guild_antiraid: Dict[str, Optional[Dict[str, Any]]] = {}
+guild_levels: Dict[str, Optional[Dict[str, Any]]] = {}
+
+CACHED_SETTINGS = ("cooldowns", "automod", "antispam", "antiraid", "levels")
+
+def set_config_field(server_id, field, value):
+    """Cache one config field; fields the bot doesn't use are ignored.
+
+    A field that fails to compile falls back to its default, so one bad
+    guild config can't break message handling or guild sync.
+    """
+    try:
+        if field == "prefix":
+            prefix_cache[server_id] = value or DEFAULT_PREFIX
+        elif field == "settings.cooldowns":
+            guild_cooldowns[server_id] = clean_overrides(value)
+        elif field == "settings.automod":
+            guild_automod[server_id] = AutomodRules(value) if value else NO_RULES
+        elif field == "settings.antispam":
+            guild_antispam[server_id] = resolve_config(ANTISPAM_DEFAULTS, value)
+        elif field == "settings.antiraid":
+            guild_antiraid[server_id] = resolve_config(ANTIRAID_DEFAULTS, value)
+        elif field == "settings.levels":
+            guild_levels[server_id] = resolve_levels(value)
+    except Exception as e:
+        if value is None:
+            raise
+        logger.error(f"Ignoring invalid {field} config for guild {server_id}: {e}")
+        set_config_field(server_id, field, None)
+
+def cache_guild_config(server_id, server_data):
+    """Store a guild's config, compiling its automod rules once"""
+    settings = server_data.get("settings") or {}
+    set_config_field(server_id, "prefix", server_data.get("prefix"))
+    for section in CACHED_SETTINGS:
+        set_config_field(server_id, f"settings.{section}", settings.get(section))
+
+def apply_config_changes(server_id, changes):
+    """Patch a cached guild config with changed fields, recompiling only those.
+
+    Guilds that aren't cached are left alone; their next lookup reads the
+    current document anyway.
+    """
+    if server_id not in prefix_cache:
+        return False
+    for field, value in changes.items():
+        set_config_field(server_id, field, value)
+    return True
+
+def drop_guild_config(server_id):
+    prefix_cache.pop(server_id, None)
+    guild_cooldowns.pop(server_id, None)
+    guild_automod.pop(server_id, None)
+    guild_antispam.pop(server_id, None)
+    guild_antiraid.pop(server_id, None)
+    guild_levels.pop(server_id, None)
+
+async def load_guild_config(server_id):
+    """Read a guild's config into the caches"""
+    server_data = await run_db(servers_collection.find_one({"server_id": server_id}, GUILD_CONFIG_PROJECTION))
+    cache_guild_config(server_id, server_data or {})
 
-def get_prefix(bot, message):
+async def get_prefix(bot, message):
     """Get server prefix"""
     if not message.guild:
-        return "!"
+        return DEFAULT_PREFIX
     
-    server_data = servers_collection.find_one({"server_id": str(message.guild.id)})
-    if server_data:
-        return server_data.get("prefix", "!")
-    return "!"
+    server_id = str(message.guild.id)
+    prefix = prefix_cache.get(server_id)
+    if prefix is not None:
+        prefix_cache_stats["hits"] += 1
+        return prefix
+    
+    prefix_cache_stats["misses"] += 1
+    await load_guild_config(server_id)
+    return prefix_cache[server_id]
+
+def get_prefix_cache_stats():
+    """Get prefix cache hit/miss counters"""
+    lookups = prefix_cache_stats["hits"] + prefix_cache_stats["misses"]
+    return {
+        "size": len(prefix_cache),
+        "hits": prefix_cache_stats["hits"],
+        "misses": prefix_cache_stats["misses"],
+        "hit_ratio": prefix_cache_stats["hits"] / lookups if lookups else 0.0
+    }
+
+# Guild registration
+synced_guild_names: Dict[str, str] = {}
+
+async def sync_guilds(guilds):
+    """Register guilds in bulk, writing only new or renamed ones"""
+    guilds = list(guilds)
+    
+    # Load stored names and configs for guilds this process hasn't seen yet
+    unknown_ids = [str(guild.id) for guild in guilds if str(guild.id) not in synced_guild_names]
+    for i in range(0, len(unknown_ids), GUILD_SYNC_BATCH_SIZE):
+        cursor = servers_collection.find(
+            {"server_id": {"$in": unknown_ids[i:i + GUILD_SYNC_BATCH_SIZE]}},
+            {**GUILD_CONFIG_PROJECTION, "server_name": 1}
+        )
+        for server_data in await run_db(cursor.to_list(length=None)):
+            synced_guild_names[server_data["server_id"]] = server_data.get("server_name")
+            cache_guild_config(server_data["server_id"], server_data)
+    
+    now = datetime.utcnow()
+    changed = []
+    operations = []
+    for guild in guilds:
+        server_id = str(guild.id)
+        if server_id in synced_guild_names and synced_guild_names[server_id] == guild.name:
+            continue
+        
+        if server_id not in prefix_cache:
+            cache_guild_config(server_id, {})
+        changed.append(guild)
+        operations.append(UpdateOne(
+            {"server_id": server_id},
+            {
+                "$set": {"server_name": guild.name, "updated_at": now},
+                "$setOnInsert": {"prefix": DEFAULT_PREFIX, "created_at": now}
+            },
+            upsert=True
+        ))
+    
+    for i in range(0, len(operations), GUILD_SYNC_BATCH_SIZE):
+        await run_db(servers_collection.bulk_write(operations[i:i + GUILD_SYNC_BATCH_SIZE], ordered=False))
+    
+    for guild in changed:
+        synced_guild_names[str(guild.id)] = guild.name
+    
+    logger.info(f"Guild sync: {len(changed)} written, {len(guilds) - len(changed)} unchanged")
 
 # Bot setup
-bot = commands.Bot(
+class DiscordBot(commands.AutoShardedBot):
+    """Bot that starts and stops background services with the connection"""
+
+    http_client: httpx.AsyncClient = None
+    metrics_runner: web.AppRunner = None
+
+    async def setup_hook(self):
+        """Start background tasks before connecting to Discord"""
+        # Shared client for external APIs, keeping connections alive between commands
+        self.http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=HTTP_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+            )
+        )
+        self.loop.add_signal_handler(signal.SIGTERM, lambda: self.loop.create_task(self.close()))
+        self.time_discord_requests()
+        loop_monitor.start()
+        if METRICS_PORT:
+            try:
+                self.metrics_runner = await start_metrics_server()
+            except OSError as e:
+                logger.error(f"Failed to start metrics server on port {METRICS_PORT}: {e}")
+        command_log_writer.start()
+        # Atomic daily claims and sequenced flushes rely on the unique indexes, so check them before anything writes
+        index_report = await ensure_indexes_async(db)
+        economy_ledger.unique_index = index_ready(index_report, ECONOMY_UNIQUE_INDEX)
+        if not economy_ledger.unique_index:
+            logger.error(f"Index {ECONOMY_UNIQUE_INDEX} is missing; daily claims and economy flushes are disabled")
+        xp_engine.unique_index = index_ready(index_report, LEVELS_UNIQUE_INDEX)
+        if not xp_engine.unique_index:
+            logger.error(f"Index {LEVELS_UNIQUE_INDEX} is missing; XP flushes are disabled")
+        economy_ledger.start()
+        xp_engine.start()
+        self.loop.create_task(listen_for_control_messages())
+        report_stats.start()
+        report_shard_status.start()
+        evict_idle_state.start()
+        if NEWS_PREFETCH_INTERVAL > 0:
+            prefetch_news.start()
+
+    async def close(self):
+        """Disconnect and flush pending writes"""
+        report_stats.cancel()
+        report_shard_status.cancel()
+        evict_idle_state.cancel()
+        prefetch_news.cancel()
+        loop_monitor.stop()
+        await bulk_executor.close()
+        await scheduler.close()
+        # Flush before disconnecting: once super().close() returns, bot.run() cancels
+        # every task still running, including this one
+        await economy_ledger.close()
+        await xp_engine.close()
+        await command_log_writer.close()
+        if self.http_client:
+            await self.http_client.aclose()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        await super().close()
+
+    def time_discord_requests(self):
+        """Count Discord API calls towards the running command's discord span"""
+        request = self.http.request
+        
+        async def timed_request(*args, **kwargs):
+            with timed_span("discord"):
+                return await request(*args, **kwargs)
+        
+        self.http.request = timed_request
+
+bot = DiscordBot(
     command_prefix=get_prefix,
     intents=intents,
+    member_cache_flags=member_cache_flags,
+    chunk_guilds_at_startup=BOT_CHUNK_AT_STARTUP,
     application_id=APPLICATION_ID,
-    help_command=None
+    help_command=None,
+    shard_ids=SHARD_IDS or None,
+    shard_count=SHARD_COUNT
+)
+
+# Metrics
+bot_metrics = MetricsRegistry(const_labels={"worker": str(WORKER_ID)})
+bot_metrics.describe("bot_command_duration_seconds", "Total command handler time")
+bot_metrics.describe("bot_command_db_seconds", "Time a command spent waiting on MongoDB")
+bot_metrics.describe("bot_command_discord_api_seconds", "Time a command spent waiting on the Discord API")
+bot_metrics.describe("bot_commands_total", "Commands invoked by outcome")
+bot_metrics.describe("bot_event_loop_lag_seconds", "Event loop scheduling delay")
+bot_metrics.describe("bot_event_loop_stalls_total", "Event loop stalls by blocking command or event")
+
+loop_monitor = LoopMonitor(interval=LOOP_LAG_INTERVAL, threshold=LOOP_LAG_THRESHOLD, metrics=bot_metrics)
+
+command_log_writer = CommandLogWriter(
+    commands_collection,
+    max_queue=COMMAND_LOG_QUEUE_SIZE,
+    batch_size=COMMAND_LOG_BATCH_SIZE,
+    flush_interval=COMMAND_LOG_FLUSH_INTERVAL,
+    drop_policy=COMMAND_LOG_DROP_POLICY
+)
+
+# Caches rendered embeds (or None when a feed has no articles)
+news_cache = NewsCache(
+    lambda country_code, category_code: fetch_news_embed(bot.http_client, NEWS_API_KEY, country_code, category_code),
+    ttl=NEWS_CACHE_TTL,
+    stale_ttl=NEWS_CACHE_STALE_TTL
+)
+
+economy_ledger = EconomyLedger(
+    economy_collection,
+    flush_interval=ECONOMY_FLUSH_INTERVAL,
+    batch_size=ECONOMY_FLUSH_BATCH_SIZE,
+    idle_ttl=ECONOMY_IDLE_TTL
+)
+leaderboard = Leaderboard(economy_collection, economy_ledger, idle_ttl=LEADERBOARD_IDLE_TTL)
+xp_engine = XPEngine(
+    levels_collection,
+    flush_interval=XP_FLUSH_INTERVAL,
+    batch_size=XP_FLUSH_BATCH_SIZE,
+    cooldown=XP_COOLDOWN,
+    xp_range=(XP_PER_MESSAGE_MIN, XP_PER_MESSAGE_MAX),
+    idle_ttl=XP_IDLE_TTL
+)
+command_cooldowns = CommandCooldowns(DEFAULT_COOLDOWNS)
+spam_detector = SpamDetector()
+raid_detector = RaidDetector()
+
+BULK_ACTION_LABELS = {"ban": "Mass ban", "add_role": "Adding role", "remove_role": "Removing role"}
+
+async def report_bulk_progress(job, progress):
+    """Edit a bulk job's status message with its progress"""
+    channel = bot.get_channel(job["channel_id"])
+    if channel is None:
+        return
+    
+    label = BULK_ACTION_LABELS[job["action"]]
+    percent = progress["finished"] * 100 // max(progress["total"], 1)
+    if progress["status"] == "completed":
+        content = f"✅ {label} complete: {progress['finished']}/{progress['total']} processed"
+    else:
+        eta = format_time(progress["eta"]) if progress["eta"] is not None else "unknown"
+        content = (
+            f"⚙️ {label}: {progress['finished']}/{progress['total']} ({percent}%) · "
+            f"{progress['per_second']}/s · ETA {eta}"
+        )
+    if progress["failed"]:
+        content += f" · {progress['failed']} failed"
+    await channel.get_partial_message(job["status_message_id"]).edit(content=content)
+
+bulk_executor = BulkActionExecutor(
+    bulk_jobs_collection,
+    concurrency=BULK_ACTION_CONCURRENCY,
+    rates={"ban": BULK_BAN_RATE, "add_role": BULK_ROLE_RATE, "remove_role": BULK_ROLE_RATE},
+    checkpoint_interval=BULK_CHECKPOINT_INTERVAL,
+    progress_interval=BULK_PROGRESS_INTERVAL,
+    reporter=report_bulk_progress
+)
+scheduler = JobScheduler(
+    scheduled_jobs_collection,
+    owns=lambda server_id: bot.get_guild(int(server_id)) is not None,
+    horizon=SCHEDULER_HORIZON,
+    batch_size=SCHEDULER_BATCH_SIZE,
+    concurrency=SCHEDULER_CONCURRENCY,
+    max_attempts=SCHEDULER_MAX_ATTEMPTS
 )
 
 async def log_command(ctx, command_name, success=True, error=None):
-    """Log command execution"""
+    """Queue a command execution log record"""
     log_data = {
         "command_id": str(uuid.uuid4()),
         "server_id": str(ctx.guild.id) if ctx.guild else None,
@@ -76,7 +498,190 @@ async def log_command(ctx, command_name, success=True, error=None):
         "error_message": str(error) if error else None
     }
     
-    commands_collection.insert_one(log_data)
+    await command_log_writer.submit(log_data)
+
+def collect_bot_stats():
+    """Expose subsystem counters as metrics samples"""
+    yield "bot_guilds", "gauge", {}, len(bot.guilds)
+    yield "bot_prefix_cache_size", "gauge", {}, len(prefix_cache)
+    for result, count in prefix_cache_stats.items():
+        yield "bot_prefix_cache_lookups_total", "counter", {"result": result}, count
+    for name, count in command_log_writer.stats().items():
+        yield "bot_command_log_records", "gauge", {"counter": name}, count
+    for name, count in news_cache.stats.items():
+        yield "bot_news_cache_events_total", "counter", {"event": name}, count
+    for name, count in economy_ledger.get_stats().items():
+        yield "bot_economy_ledger", "gauge", {"counter": name}, count
+    for name, count in leaderboard.get_stats().items():
+        yield "bot_leaderboard", "gauge", {"counter": name}, count
+    for name, count in xp_engine.get_stats().items():
+        yield "bot_xp", "gauge", {"counter": name}, count
+    for name, count in scheduler.get_stats().items():
+        yield "bot_scheduler", "gauge", {"counter": name}, count
+    for name, count in bulk_executor.get_stats().items():
+        yield "bot_bulk_actions", "gauge", {"counter": name}, count
+    yield "bot_cooldown_buckets", "gauge", {}, command_cooldowns.get_stats()["buckets"]
+    for rule, count in automod_actions.items():
+        yield "bot_automod_actions_total", "counter", {"rule": rule}, count
+    for name, count in spam_detector.get_stats().items():
+        yield "bot_antispam", "gauge", {"counter": name}, count
+    for name, count in raid_detector.get_stats().items():
+        yield "bot_antiraid", "gauge", {"counter": name}, count
+    for (command, scope), count in command_cooldowns.rejections.items():
+        yield "bot_command_rejections_total", "counter", {"command": command, "scope": scope}, count
+    for shard_id, shard in bot.shards.items():
+        if math.isfinite(shard.latency):
+            yield "bot_gateway_latency_seconds", "gauge", {"shard": str(shard_id)}, shard.latency
+    yield "bot_resident_memory_bytes", "gauge", {}, get_rss_bytes()
+
+bot_metrics.add_collector(collect_bot_stats)
+
+async def handle_metrics(request):
+    """Serve metrics in the Prometheus text format"""
+    return web.Response(
+        body=bot_metrics.render().encode(),
+        headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+    )
+
+async def handle_health(request):
+    """Serve loop lag and gateway latency for /api/bot/status"""
+    return web.json_response({
+        "worker_id": WORKER_ID,
+        "shards": sorted(bot.shards),
+        "ready": bot.is_ready(),
+        **loop_monitor.get_health()
+    })
+
+async def start_metrics_server():
+    """Serve /metrics and /health over HTTP for Prometheus and the management server"""
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    app.router.add_get("/health", handle_health)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, METRICS_HOST, METRICS_PORT).start()
+    logger.info(f"Metrics available on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    return runner
+
+# Control channel
+def handle_control_message(message):
+    """Apply a control message sent by server.py"""
+    message_type = message.get("type")
+    
+    if message_type == "config_update":
+        server_id = str(message.get("server_id"))
+        if apply_config_changes(server_id, message.get("changes") or {}):
+            logger.info(f"Applied config changes for {server_id}: {', '.join(message['changes'])}")
+    else:
+        logger.warning(f"Unknown control message: {message_type}")
+
+async def listen_for_control_messages():
+    """Read newline-delimited JSON control messages from stdin"""
+    if sys.stdin is None:
+        return
+    
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=CONTROL_LINE_LIMIT)
+    try:
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    except (ValueError, OSError) as e:
+        logger.warning(f"Control channel unavailable: {e}")
+        return
+    
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except (ValueError, asyncio.LimitOverrunError) as e:
+                # readline() discards the oversized line, so the next one still parses
+                logger.warning(f"Dropped control message over {CONTROL_LINE_LIMIT} bytes: {e}")
+                continue
+            if not line:
+                break
+            
+            try:
+                handle_control_message(json.loads(line))
+            except (json.JSONDecodeError, AttributeError) as e:
+                logger.warning(f"Invalid control message: {e}")
+            except Exception:
+                logger.exception("Failed to apply control message")
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.exception("Control channel listener crashed; dashboard updates will not reach this worker")
+        return
+    logger.warning("Control channel closed; dashboard updates will not reach this worker")
+
+@tasks.loop(minutes=10)
+async def report_stats():
+    """Periodically log cache and command log counters"""
+    logger.info(f"Prefix cache stats: {get_prefix_cache_stats()}")
+    logger.info(f"Command log stats: {command_log_writer.stats()}")
+    logger.info(f"News cache stats: {news_cache.stats}")
+    logger.info(f"Economy ledger stats: {economy_ledger.get_stats()}")
+    logger.info(f"Leaderboard stats: {leaderboard.get_stats()}")
+    logger.info(f"XP stats: {xp_engine.get_stats()}")
+    logger.info(f"Scheduler stats: {scheduler.get_stats()}")
+    logger.info(f"Bulk action stats: {bulk_executor.get_stats()}")
+    logger.info(f"Cooldown stats: {command_cooldowns.get_stats()}")
+    logger.info(f"Automod actions: {dict(automod_actions)}")
+    logger.info(f"Anti-spam stats: {spam_detector.get_stats()}, anti-raid stats: {raid_detector.get_stats()}")
+    logger.info(f"Memory report: {get_memory_report()}")
+    logger.info(f"Command latency: {bot_metrics.summary('bot_command_duration_seconds')}")
+
+async def publish_shard_status():
+    """Store per-shard connection state for /api/bot/status"""
+    guild_counts = Counter(guild.shard_id for guild in bot.guilds)
+    now = datetime.utcnow()
+    operations = [
+        UpdateOne(
+            {"shard_id": shard_id},
+            {"$set": {
+                "worker_id": WORKER_ID,
+                "pid": os.getpid(),
+                "status": "disconnected" if shard.is_closed() else "connected",
+                "latency": shard.latency if math.isfinite(shard.latency) else None,
+                "guilds": guild_counts[shard_id],
+                "updated_at": now
+            }},
+            upsert=True
+        )
+        for shard_id, shard in bot.shards.items()
+    ]
+    if operations:
+        await run_db(bot_shards_collection.bulk_write(operations, ordered=False))
+
+@tasks.loop(seconds=SHARD_STATUS_INTERVAL)
+async def report_shard_status():
+    """Periodically publish shard state"""
+    loop_monitor.record_latency({shard_id: shard.latency for shard_id, shard in bot.shards.items()})
+    try:
+        await publish_shard_status()
+    except Exception as e:
+        logger.error(f"Failed to publish shard status: {e}")
+
+@tasks.loop(minutes=5)
+async def evict_idle_state():
+    """Drop in-memory state that hasn't been used recently"""
+    leaderboard.evict_idle()
+    command_cooldowns.evict_idle()
+    spam_detector.evict_idle()
+    raid_detector.evict_idle()
+
+def news_prefetch_interval(key_count):
+    """Get the prefetch interval that keeps this worker within its share of the daily quota"""
+    daily_budget = NEWS_DAILY_QUOTA * NEWS_PREFETCH_QUOTA_SHARE / max(WORKER_COUNT, 1)
+    if daily_budget <= 0:
+        return 86400
+    return max(NEWS_PREFETCH_INTERVAL, 86400 * max(key_count, 1) / daily_budget)
+
+@tasks.loop(seconds=NEWS_PREFETCH_INTERVAL)
+async def prefetch_news():
+    """Refresh recently requested feeds so news replies come from memory"""
+    keys = news_cache.recent_keys(NEWS_PREFETCH_RECENT)
+    if keys:
+        await news_cache.prefetch(keys, stagger=NEWS_PREFETCH_STAGGER)
+    prefetch_news.change_interval(seconds=news_prefetch_interval(len(keys)))
 
 # Events
 @bot.event
@@ -84,25 +689,37 @@ async def on_ready():
     """Bot ready event"""
     logger.info(f'{bot.user} has connected to Discord!')
     logger.info(f'Bot is in {len(bot.guilds)} guilds')
+    logger.info(f'Memory report: {get_memory_report()}')
     
     # Set bot status
     activity = discord.Activity(type=discord.ActivityType.watching, name="your server | !help")
     await bot.change_presence(activity=activity)
     
     # Initialize server data
-    for guild in bot.guilds:
-        server_data = {
-            "server_id": str(guild.id),
-            "server_name": guild.name,
-            "prefix": "!",
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-        servers_collection.update_one(
-            {"server_id": str(guild.id)},
-            {"$set": server_data},
-            upsert=True
-        )
+    await sync_guilds(bot.guilds)
+    
+    # Pick up mass moderation jobs interrupted by a restart
+    try:
+        resumed = await bulk_executor.resume(bot.guilds)
+        if resumed:
+            logger.info(f"Resumed {resumed} bulk action jobs")
+    except Exception as e:
+        logger.error(f"Failed to resume bulk action jobs: {e}")
+    
+    # Guilds are cached now, so the scheduler can tell which jobs are ours
+    scheduler.start()
+
+@bot.event
+async def on_shard_ready(shard_id):
+    """Shard finished connecting"""
+    logger.info(f'Shard {shard_id} is ready')
+    report_shard_status.restart()
+
+@bot.event
+async def on_shard_disconnect(shard_id):
+    """Shard lost its gateway connection"""
+    logger.warning(f'Shard {shard_id} disconnected')
+    report_shard_status.restart()
 
 @bot.event
 async def on_guild_join(guild):
@@ -110,27 +727,233 @@ async def on_guild_join(guild):
     logger.info(f'Joined guild: {guild.name} (ID: {guild.id})')
     
     # Initialize server data
-    server_data = {
-        "server_id": str(guild.id),
-        "server_name": guild.name,
-        "prefix": "!",
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
-    servers_collection.update_one(
-        {"server_id": str(guild.id)},
-        {"$set": server_data},
-        upsert=True
-    )
+    await sync_guilds([guild])
+
+@bot.event
+async def on_guild_available(guild):
+    """Guild came back from an outage"""
+    # Pick up jobs the scheduler skipped while the guild was missing
+    scheduler.recheck()
 
 @bot.event
 async def on_guild_remove(guild):
     """Bot leaves a guild"""
     logger.info(f'Left guild: {guild.name} (ID: {guild.id})')
+    drop_guild_config(str(guild.id))
+    synced_guild_names.pop(str(guild.id), None)
+    try:
+        await scheduler.drop_guild(str(guild.id))
+    except Exception as e:
+        logger.error(f"Failed to drop scheduled jobs for {guild.id}: {e}")
+
+automod_actions = Counter()
+AUTOMOD_REASONS = {
+    "word": "blocked word",
+    "invite": "invite links aren't allowed",
+    "link": "links aren't allowed",
+    "caps": "too many capitals"
+}
+
+async def enforce_automod(message, rule):
+    """Delete a message that broke an automod rule and warn its author"""
+    automod_actions[rule] += 1
+    try:
+        await message.delete()
+        await message.channel.send(
+            f"⚠️ {message.author.mention}, your message was removed: {AUTOMOD_REASONS[rule]}.",
+            delete_after=5
+        )
+    except discord.NotFound:
+        pass
+    except discord.HTTPException as e:
+        logger.warning(f"Automod failed to act on message {message.id}: {e}")
+
+SPAM_REASONS = {
+    "flood": "sending messages too fast",
+    "duplicate": "repeating the same message",
+    "mentions": "mass mentions"
+}
+
+async def record_auto_action(guild, user_id, reason):
+    """Store an automatic moderation action as a warning"""
+    await run_db(warnings_collection.insert_one({
+        "warning_id": str(uuid.uuid4()),
+        "server_id": str(guild.id),
+        "user_id": str(user_id),
+        "moderator_id": str(bot.user.id),
+        "reason": f"Auto: {reason}",
+        "timestamp": datetime.utcnow()
+    }))
+
+async def enforce_antispam(message, rule, config):
+    """Time out a member who tripped an anti-spam rule"""
+    reason = SPAM_REASONS[rule]
+    try:
+        await message.author.timeout(timedelta(minutes=config["timeout_minutes"]), reason=f"Anti-spam: {reason}")
+        await message.channel.send(
+            f"🔇 {message.author.mention} has been timed out for {config['timeout_minutes']} minutes: {reason}.",
+            delete_after=10
+        )
+        await record_auto_action(message.guild, message.author.id, reason)
+    except discord.HTTPException as e:
+        logger.warning(f"Anti-spam failed to time out {message.author.id} in {message.guild.id}: {e}")
+    except Exception as e:
+        logger.error(f"Failed to record anti-spam action: {e}")
+
+@bot.event
+async def on_message(message):
+    """Run automod and anti-spam, award XP, then hand the message to the command processor"""
+    if message.guild and not message.author.bot:
+        server_id = str(message.guild.id)
+        rules = guild_automod.get(server_id)
+        if rules is None:
+            await load_guild_config(server_id)
+            rules = guild_automod[server_id]
+        
+        spam_config = guild_antispam[server_id]
+        if (rules.enabled or spam_config) and not message.author.guild_permissions.manage_messages:
+            rule = rules.check(message.content)
+            if rule:
+                await enforce_automod(message, rule)
+                return
+            
+            if spam_config:
+                rule = spam_detector.check(
+                    message.guild.id, message.author.id, message.content,
+                    len(message.raw_mentions), spam_config
+                )
+                if rule:
+                    await enforce_antispam(message, rule, spam_config)
+                    return
+        
+        levels_config = guild_levels[server_id]
+        if levels_config and not message.content.startswith(prefix_cache.get(server_id, DEFAULT_PREFIX)):
+            await award_xp(message, levels_config)
+    
+    await bot.process_commands(message)
+
+async def award_xp(message, config):
+    """Give XP for a chat message and announce level-ups"""
+    try:
+        level = await xp_engine.award_message(str(message.guild.id), str(message.author.id))
+    except Exception as e:
+        logger.error(f"Failed to award XP in {message.guild.id}: {e}")
+        return
+    if level is not None and config["announce"]:
+        channel = message.channel
+        if config["announce_channel"]:
+            channel = message.guild.get_channel(int(config["announce_channel"])) or channel
+        try:
+            await channel.send(f"🎉 {message.author.mention} reached level **{level}**!")
+        except discord.HTTPException:
+            pass
+
+async def set_channel_lock(channel, locked, reason=None):
+    """Allow or deny @everyone sending messages in a channel"""
+    overwrite = channel.overwrites_for(channel.guild.default_role)
+    overwrite.send_messages = not locked
+    await channel.set_permissions(channel.guild.default_role, overwrite=overwrite, reason=reason)
+
+def raid_channels(guild, config):
+    """Get the channels to lock during a raid"""
+    channels = [guild.get_channel(int(channel_id)) for channel_id in config["channels"]]
+    if not config["channels"]:
+        channels = [guild.system_channel]
+    return [channel for channel in channels if channel is not None]
+
+async def start_raid_lockdown(guild, config):
+    """Lock the raid channels and schedule unlocking them"""
+    logger.warning(f"Raid detected in {guild.name} ({guild.id}), locking for {config['lock_minutes']} minutes")
+    channels = raid_channels(guild, config)
+    for channel in channels:
+        try:
+            await set_channel_lock(channel, True, reason="Anti-raid: join burst")
+            await channel.send(
+                f"🚨 Raid detected. This channel is locked for {config['lock_minutes']} minutes "
+                "and new members are being timed out."
+            )
+        except discord.HTTPException as e:
+            logger.warning(f"Anti-raid failed to lock {channel.id}: {e}")
+    
+    try:
+        await scheduler.schedule(
+            "raid_unlock", str(guild.id),
+            datetime.utcnow() + timedelta(minutes=config["lock_minutes"]),
+            channel_ids=[str(channel.id) for channel in channels]
+        )
+    except Exception as e:
+        logger.error(f"Anti-raid failed to schedule unlocking {guild.id}: {e}")
+
+@scheduler.handler("raid_unlock")
+async def end_raid_lockdown(job):
+    """Unlock the channels locked by a raid"""
+    guild = bot.get_guild(int(job["server_id"]))
+    if guild is None:
+        return
+    raid_detector.end_raid(guild.id)
+    for channel_id in job["payload"]["channel_ids"]:
+        channel = guild.get_channel(int(channel_id))
+        if channel is None:
+            continue
+        try:
+            await set_channel_lock(channel, False, reason="Anti-raid: lockdown over")
+            await channel.send("🔓 Raid lockdown lifted.")
+        except discord.HTTPException as e:
+            logger.warning(f"Anti-raid failed to unlock {channel.id}: {e}")
+
+@scheduler.handler("reminder")
+@scheduler.handler("timer")
+async def send_reminder(job):
+    """Deliver a reminder or timer to the channel it was set in"""
+    channel = bot.get_channel(int(job["payload"]["channel_id"]))
+    if channel is None:
+        return
+    try:
+        await channel.send(job["payload"]["content"], allowed_mentions=discord.AllowedMentions(everyone=False, roles=False))
+    except (discord.Forbidden, discord.NotFound):
+        pass
+
+@scheduler.handler("unban")
+async def end_tempban(job):
+    """Lift a temporary ban"""
+    guild = bot.get_guild(int(job["server_id"]))
+    if guild is None:
+        return
+    try:
+        await guild.unban(discord.Object(id=int(job["payload"]["user_id"])), reason="Temporary ban expired")
+    except discord.NotFound:
+        pass
+
+@bot.event
+async def on_member_join(member):
+    """Watch for join bursts and time out members who join during a raid"""
+    server_id = str(member.guild.id)
+    if server_id not in guild_antiraid:
+        await load_guild_config(server_id)
+    config = guild_antiraid[server_id]
+    if not config or member.bot:
+        return
+    
+    if raid_detector.check(member.guild.id, config):
+        await start_raid_lockdown(member.guild, config)
+    if raid_detector.in_raid(member.guild.id):
+        try:
+            await member.timeout(timedelta(minutes=config["lock_minutes"]), reason="Anti-raid: joined during a raid")
+        except discord.HTTPException as e:
+            logger.warning(f"Anti-raid failed to time out {member.id}: {e}")
 
 @bot.event
 async def on_command_error(ctx, error):
     """Handle command errors"""
+    # Cooldown rejections are counted by command_cooldowns, not logged
+    if isinstance(error, commands.CommandOnCooldown):
+        if command_cooldowns.should_warn(ctx.guild.id if ctx.guild else 0, ctx.author.id):
+            await ctx.send(
+                f"⏳ Slow down! Try `{ctx.command.name}` again in {error.retry_after:.1f}s.",
+                delete_after=max(error.retry_after, 3)
+            )
+        return
+    
     await log_command(ctx, ctx.command.name if ctx.command else "unknown", False, error)
     
     if isinstance(error, commands.CommandNotFound):
@@ -145,6 +968,41 @@ async def on_command_error(ctx, error):
         await ctx.send(f"❌ An error occurred: {str(error)}")
         logger.error(f"Command error: {error}")
 
+@bot.check
+async def apply_cooldowns(ctx):
+    """Reject commands over their user or guild rate"""
+    guild_id = ctx.guild.id if ctx.guild else 0
+    command = ctx.command.qualified_name
+    overrides = guild_cooldowns.get(str(guild_id))
+    retry_after, scope = command_cooldowns.check(guild_id, ctx.author.id, command, overrides)
+    if retry_after:
+        limit = command_cooldowns.limits(command, overrides)[scope]
+        bucket_type = commands.BucketType.guild if scope == "guild" else commands.BucketType.user
+        raise commands.CommandOnCooldown(commands.Cooldown(limit["rate"], limit["per"]), retry_after, bucket_type)
+    return True
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    """Start timing a command and its sub-spans"""
+    ctx.command_started = time.perf_counter()
+    ctx.command_spans = start_spans()
+    loop_monitor.label_current_task(f"command {ctx.command.qualified_name}")
+
+@bot.after_invoke
+async def record_command_timing(ctx):
+    """Record command latency histograms"""
+    started = getattr(ctx, "command_started", None)
+    if started is None:
+        return
+    
+    command = ctx.command.qualified_name
+    spans = ctx.command_spans
+    bot_metrics.observe("bot_command_duration_seconds", time.perf_counter() - started, command=command)
+    bot_metrics.observe("bot_command_db_seconds", spans.get("db", 0.0), command=command)
+    bot_metrics.observe("bot_command_discord_api_seconds", spans.get("discord", 0.0), command=command)
+    bot_metrics.inc("bot_commands_total", command=command, status="error" if ctx.command_failed else "ok")
+    command_spans.set(None)
+
 # Helper functions
 def has_permission(permission):
     """Check if user has permission"""
@@ -154,6 +1012,41 @@ def has_permission(permission):
         raise commands.MissingPermissions([permission])
     return commands.check(predicate)
 
+async def ensure_chunked(guild):
+    """Load a guild's full member list on demand when it wasn't chunked at startup"""
+    if not guild.chunked:
+        await guild.chunk(cache=True)
+
+def get_rss_bytes():
+    """Get the resident memory of this process"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def get_memory_report():
+    """Get resident memory and cache sizes normalised per 1k guilds.
+
+    Comparing the reports of two profiles on the same guilds gives the memory
+    saved per 1k guilds.
+    """
+    guild_count = len(bot.guilds)
+    cached_members = sum(len(guild.members) for guild in bot.guilds)
+    rss_mb = get_rss_bytes() / (1024 * 1024)
+    per_1k = 1000 / guild_count if guild_count else 0
+    return {
+        "profile": BOT_MEMORY_PROFILE,
+        "presences": BOT_PRESENCES,
+        "member_cache": BOT_MEMBER_CACHE,
+        "guilds": guild_count,
+        "rss_mb": round(rss_mb, 1),
+        "rss_mb_per_1k_guilds": round(rss_mb * per_1k, 1),
+        "cached_members": cached_members,
+        "cached_members_per_1k_guilds": round(cached_members * per_1k)
+    }
+
 def format_time(seconds):
     """Format time duration"""
     if seconds < 60:
@@ -165,6 +1058,20 @@ def format_time(seconds):
     else:
         return f"{seconds//86400}d {(seconds%86400)//3600}h"
 
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+DURATION_PATTERN = re.compile(r"(\d+)([smhdw])")
+
+def parse_duration(text):
+    """Parse durations like 30m, 2h30m or 7d into seconds"""
+    text = text.lower()
+    parts = DURATION_PATTERN.findall(text)
+    if not parts or "".join(amount + unit for amount, unit in parts) != text:
+        raise commands.BadArgument("Use a duration like `30m`, `2h30m` or `7d`.")
+    seconds = sum(int(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+    if not 0 < seconds <= SCHEDULE_MAX_DAYS * 86400:
+        raise commands.BadArgument(f"Durations must be between 1 second and {SCHEDULE_MAX_DAYS} days.")
+    return seconds
+
 # MODERATION COMMANDS
 @bot.command(name='ban')
 @has_permission('ban_members')
@@ -178,6 +1085,75 @@ async def ban_user(ctx, user: discord.Member, *, reason="No reason provided"):
         await ctx.send(f"❌ Failed to ban user: {str(e)}")
         await log_command(ctx, "ban", False, e)
 
+@bot.command(name='tempban')
+@has_permission('ban_members')
+async def tempban_user(ctx, user: discord.Member, duration: str, *, reason="No reason provided"):
+    """Ban a user and unban them after a duration, e.g. !tempban @user 7d spamming"""
+    try:
+        seconds = parse_duration(duration)
+        await user.ban(reason=f"{reason} (temporary, {format_time(seconds)})")
+        await scheduler.schedule(
+            "unban", str(ctx.guild.id), datetime.utcnow() + timedelta(seconds=seconds),
+            user_id=str(user.id)
+        )
+        await ctx.send(f"✅ {user.mention} has been banned for {format_time(seconds)}. Reason: {reason}")
+        await log_command(ctx, "tempban", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to tempban user: {str(e)}")
+        await log_command(ctx, "tempban", False, e)
+
+async def start_bulk_job(ctx, action, targets, role=None, reason=None):
+    """Queue a mass moderation job and report its progress in one status message"""
+    if not targets:
+        await ctx.send("❌ Nobody to process.")
+        return None
+    # Reserve the guild before the first await so concurrent commands can't both start a job
+    if not bulk_executor.reserve(ctx.guild.id):
+        await ctx.send("❌ A mass action is already running in this server.")
+        return None
+    
+    try:
+        status = await ctx.send(f"⚙️ {BULK_ACTION_LABELS[action]}: queued {len(targets)} members...")
+        job = await bulk_executor.create_job(
+            ctx.guild, action, targets,
+            requested_by=ctx.author.id,
+            channel_id=ctx.channel.id,
+            status_message_id=status.id,
+            role_id=role.id if role else None,
+            reason=f"{reason or 'Mass action'} (by {ctx.author})"
+        )
+    except BaseException:
+        bulk_executor.release(ctx.guild.id)
+        raise
+    bulk_executor.start(job, ctx.guild)
+    return job
+
+def can_manage_role(ctx, role):
+    """Check that both the bot and the invoker are above a role"""
+    if role.managed or role >= ctx.guild.me.top_role:
+        return False
+    return ctx.author.id == ctx.guild.owner_id or role < ctx.author.top_role
+
+@bot.command(name='massban')
+@has_permission('ban_members')
+async def mass_ban(ctx, users: commands.Greedy[discord.Object], *, reason="No reason provided"):
+    """Ban many users by mention or ID"""
+    try:
+        protected = {ctx.author.id, ctx.guild.owner_id, bot.user.id}
+        if not ctx.guild.chunked:
+            await ctx.guild.chunk(cache=True)
+        
+        targets, outranked = moderatable_targets(
+            ctx.guild, ctx.author, [user.id for user in users if user.id not in protected]
+        )
+        if outranked:
+            await ctx.send(f"⚠️ Skipping {outranked} members ranked at or above you or me.")
+        if await start_bulk_job(ctx, "ban", targets, reason=reason):
+            await log_command(ctx, "massban", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to start mass ban: {str(e)}")
+        await log_command(ctx, "massban", False, e)
+
 @bot.command(name='kick')
 @has_permission('kick_members')
 async def kick_user(ctx, user: discord.Member, *, reason="No reason provided"):
@@ -217,13 +1193,13 @@ async def warn_user(ctx, user: discord.Member, *, reason="No reason provided"):
             "timestamp": datetime.utcnow()
         }
         
-        warnings_collection.insert_one(warning_data)
+        await run_db(warnings_collection.insert_one(warning_data))
         
         # Count warnings
-        warning_count = warnings_collection.count_documents({
+        warning_count = await run_db(warnings_collection.count_documents({
             "server_id": str(ctx.guild.id),
             "user_id": str(user.id)
-        })
+        }))
         
         await ctx.send(f"⚠️ {user.mention} has been warned. Reason: {reason}\nTotal warnings: {warning_count}")
         await log_command(ctx, "warn", True)
@@ -231,21 +1207,73 @@ async def warn_user(ctx, user: discord.Member, *, reason="No reason provided"):
         await ctx.send(f"❌ Failed to warn user: {str(e)}")
         await log_command(ctx, "warn", False, e)
 
+async def run_purge(ctx, amount, check=None):
+    """Purge up to `amount` messages above the command, reporting progress in one status message"""
+    amount = max(1, min(amount, PURGE_MAX_SCAN))
+    status = await ctx.send(f"🧹 Purging up to {amount} messages...")
+    
+    async def report(stats):
+        await status.edit(content=(
+            f"🧹 Purging... {stats['deleted']}/{amount} deleted, {stats['scanned']} scanned"
+        ))
+    
+    job = PurgeJob(
+        ctx.channel, amount, check,
+        before=ctx.message,
+        max_scan=amount if check is None else PURGE_MAX_SCAN,
+        on_progress=report,
+        progress_interval=PURGE_PROGRESS_INTERVAL,
+        bulk_rate=PURGE_BULK_RATE,
+        single_rate=PURGE_SINGLE_RATE
+    )
+    try:
+        stats = await job.run()
+    except Exception:
+        await status.delete()
+        raise
+    
+    try:
+        await ctx.message.delete()
+    except discord.NotFound:
+        pass
+    summary = f"✅ Cleared {stats['deleted']} messages."
+    if stats["failed"]:
+        summary += f" {stats['failed']} could not be deleted."
+    await status.edit(content=summary, delete_after=5)
+    return stats
+
 @bot.command(name='clear')
 @has_permission('manage_messages')
 async def clear_messages(ctx, amount: int = 10):
     """Clear messages"""
     try:
-        if amount > 100:
-            amount = 100
-        
-        deleted = await ctx.channel.purge(limit=amount + 1)
-        await ctx.send(f"✅ Cleared {len(deleted) - 1} messages.", delete_after=5)
+        await run_purge(ctx, amount)
         await log_command(ctx, "clear", True)
     except Exception as e:
         await ctx.send(f"❌ Failed to clear messages: {str(e)}")
         await log_command(ctx, "clear", False, e)
 
+class PurgeFlags(commands.FlagConverter):
+    user: Optional[discord.User] = None
+    contains: Optional[str] = None
+    attachments: bool = False
+
+@bot.command(name='purge')
+@has_permission('manage_messages')
+async def purge_messages(ctx, amount: int, *, flags: PurgeFlags):
+    """Purge messages matching filters, e.g. !purge 500 user: @someone contains: spam attachments: yes"""
+    try:
+        check = message_filter(
+            user_ids=[flags.user.id] if flags.user else [],
+            contains=flags.contains,
+            attachments=flags.attachments
+        )
+        await run_purge(ctx, amount, check)
+        await log_command(ctx, "purge", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to purge messages: {str(e)}")
+        await log_command(ctx, "purge", False, e)
+
 @bot.command(name='slowmode')
 @has_permission('manage_channels')
 async def set_slowmode(ctx, seconds: int = 0):
@@ -266,9 +1294,7 @@ async def set_slowmode(ctx, seconds: int = 0):
 async def lock_channel(ctx):
     """Lock a channel"""
     try:
-        overwrite = ctx.channel.overwrites_for(ctx.guild.default_role)
-        overwrite.send_messages = False
-        await ctx.channel.set_permissions(ctx.guild.default_role, overwrite=overwrite)
+        await set_channel_lock(ctx.channel, True)
         await ctx.send("🔒 Channel locked.")
         await log_command(ctx, "lock", True)
     except Exception as e:
@@ -280,9 +1306,7 @@ async def lock_channel(ctx):
 async def unlock_channel(ctx):
     """Unlock a channel"""
     try:
-        overwrite = ctx.channel.overwrites_for(ctx.guild.default_role)
-        overwrite.send_messages = True
-        await ctx.channel.set_permissions(ctx.guild.default_role, overwrite=overwrite)
+        await set_channel_lock(ctx.channel, False)
         await ctx.send("🔓 Channel unlocked.")
         await log_command(ctx, "unlock", True)
     except Exception as e:
@@ -304,7 +1328,7 @@ async def server_info(ctx):
         
         embed.set_thumbnail(url=guild.icon.url if guild.icon else None)
         embed.add_field(name="Server ID", value=guild.id, inline=True)
-        embed.add_field(name="Owner", value=guild.owner.mention, inline=True)
+        embed.add_field(name="Owner", value=f"<@{guild.owner_id}>", inline=True)
         embed.add_field(name="Created", value=guild.created_at.strftime("%Y-%m-%d"), inline=True)
         embed.add_field(name="Members", value=guild.member_count, inline=True)
         embed.add_field(name="Channels", value=len(guild.channels), inline=True)
@@ -323,11 +1347,12 @@ async def server_info(ctx):
 async def set_prefix(ctx, new_prefix: str):
     """Set bot prefix"""
     try:
-        servers_collection.update_one(
+        await run_db(servers_collection.update_one(
             {"server_id": str(ctx.guild.id)},
             {"$set": {"prefix": new_prefix, "updated_at": datetime.utcnow()}},
             upsert=True
-        )
+        ))
+        prefix_cache[str(ctx.guild.id)] = new_prefix
         await ctx.send(f"✅ Prefix changed to `{new_prefix}`")
         await log_command(ctx, "prefix", True)
     except Exception as e:
@@ -371,6 +1396,59 @@ async def remove_role(ctx, user: discord.Member, *, role: discord.Role):
         await ctx.send(f"❌ Failed to remove role: {str(e)}")
         await log_command(ctx, "removerole", False, e)
 
+@bot.command(name='massrole')
+@has_permission('manage_roles')
+async def mass_role(ctx, action: str, role: discord.Role, members: commands.Greedy[discord.Member]):
+    """Add or remove a role for many members, e.g. !massrole add @Role @a @b"""
+    try:
+        if action.lower() not in ("add", "remove"):
+            await ctx.send("❌ Action must be `add` or `remove`.")
+            return
+        if not can_manage_role(ctx, role):
+            await ctx.send(f"❌ I can't manage {role.name}.")
+            return
+        
+        job_action = "add_role" if action.lower() == "add" else "remove_role"
+        if await start_bulk_job(ctx, job_action, [member.id for member in members], role=role):
+            await log_command(ctx, "massrole", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to start mass role: {str(e)}")
+        await log_command(ctx, "massrole", False, e)
+
+@bot.command(name='roleall')
+@has_permission('manage_roles')
+async def role_all(ctx, *, role: discord.Role):
+    """Give a role to every member"""
+    try:
+        if not can_manage_role(ctx, role):
+            await ctx.send(f"❌ I can't manage {role.name}.")
+            return
+        
+        await ensure_chunked(ctx.guild)
+        targets = [member.id for member in ctx.guild.members if role not in member.roles]
+        if await start_bulk_job(ctx, "add_role", targets, role=role):
+            await log_command(ctx, "roleall", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to start role all: {str(e)}")
+        await log_command(ctx, "roleall", False, e)
+
+@bot.command(name='rolehumans')
+@has_permission('manage_roles')
+async def role_humans(ctx, *, role: discord.Role):
+    """Give a role to every member who isn't a bot"""
+    try:
+        if not can_manage_role(ctx, role):
+            await ctx.send(f"❌ I can't manage {role.name}.")
+            return
+        
+        await ensure_chunked(ctx.guild)
+        targets = [member.id for member in ctx.guild.members if not member.bot and role not in member.roles]
+        if await start_bulk_job(ctx, "add_role", targets, role=role):
+            await log_command(ctx, "rolehumans", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to start role humans: {str(e)}")
+        await log_command(ctx, "rolehumans", False, e)
+
 # CHANNEL MANAGEMENT COMMANDS
 @bot.command(name='createchannel')
 @has_permission('manage_channels')
@@ -399,6 +1477,10 @@ async def user_info(ctx, user: discord.Member = None):
         if user is None:
             user = ctx.author
         
+        # Members built from partial payloads lack join dates and roles
+        if user.joined_at is None:
+            user = await ctx.guild.fetch_member(user.id)
+        
         embed = discord.Embed(
             title=f"User Information - {user.display_name}",
             color=user.color,
@@ -408,7 +1490,7 @@ async def user_info(ctx, user: discord.Member = None):
         embed.set_thumbnail(url=user.avatar.url if user.avatar else None)
         embed.add_field(name="Username", value=f"{user.name}#{user.discriminator}", inline=True)
         embed.add_field(name="ID", value=user.id, inline=True)
-        embed.add_field(name="Status", value=str(user.status), inline=True)
+        embed.add_field(name="Status", value=str(user.status) if BOT_PRESENCES else "Unavailable", inline=True)
         embed.add_field(name="Joined Server", value=user.joined_at.strftime("%Y-%m-%d"), inline=True)
         embed.add_field(name="Account Created", value=user.created_at.strftime("%Y-%m-%d"), inline=True)
         embed.add_field(name="Roles", value=len(user.roles) - 1, inline=True)
@@ -434,7 +1516,294 @@ async def change_nickname(ctx, user: discord.Member, *, nickname: str = None):
         await ctx.send(f"❌ Failed to change nickname: {str(e)}")
         await log_command(ctx, "nickname", False, e)
 
+# AUTOMOD COMMANDS
+async def update_guild_settings(ctx, update):
+    """Apply an update to the guild's config document and refresh the cached copy"""
+    server_id = str(ctx.guild.id)
+    server_data = await run_db(servers_collection.find_one_and_update(
+        {"server_id": server_id},
+        update,
+        projection=GUILD_CONFIG_PROJECTION,
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    ))
+    cache_guild_config(server_id, server_data)
+    return server_id
+
+async def update_automod(ctx, update):
+    """Apply an update to the guild's automod settings and recompile them"""
+    return guild_automod[await update_guild_settings(ctx, update)]
+
+def parse_toggle(setting):
+    """Parse on/off arguments"""
+    setting = setting.lower()
+    if setting in ("on", "enable", "enabled", "true", "yes"):
+        return True
+    if setting in ("off", "disable", "disabled", "false", "no"):
+        return False
+    raise commands.BadArgument("Use `on` or `off`.")
+
+@bot.command(name='automod')
+@has_permission('manage_guild')
+async def automod_settings(ctx, setting: str = None):
+    """Show automod settings or turn automod on/off"""
+    try:
+        if setting is None:
+            rules = guild_automod.get(str(ctx.guild.id))
+            if rules is None:
+                await load_guild_config(str(ctx.guild.id))
+                rules = guild_automod[str(ctx.guild.id)]
+            config = rules.config
+            
+            embed = discord.Embed(title="🛡️ Automod", color=discord.Color.blue())
+            embed.add_field(name="Enabled", value="Yes" if config["enabled"] else "No", inline=True)
+            embed.add_field(name="Word Filter", value=f"{len(config['words'])} terms", inline=True)
+            embed.add_field(name="Anti-Invite", value="On" if config["antiinvite"] else "Off", inline=True)
+            embed.add_field(name="Anti-Link", value="On" if config["antilink"] else "Off", inline=True)
+            embed.add_field(name="Allowed Domains", value=", ".join(config["allowed_domains"]) or "None", inline=True)
+            embed.add_field(name="Anti-Caps", value="On" if config["anticaps"] else "Off", inline=True)
+            await ctx.send(embed=embed)
+        else:
+            enabled = parse_toggle(setting)
+            await update_automod(ctx, {"$set": {"settings.automod.enabled": enabled}})
+            await ctx.send(f"✅ Automod {'enabled' if enabled else 'disabled'}.")
+        await log_command(ctx, "automod", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update automod: {str(e)}")
+        await log_command(ctx, "automod", False, e)
+
+@bot.command(name='wordfilter')
+@has_permission('manage_guild')
+async def word_filter(ctx, action: str = "list", *, words: str = ""):
+    """Manage blocked words, e.g. !wordfilter add word, another phrase"""
+    try:
+        terms = [word.strip().lower() for word in words.split(",") if word.strip()]
+        action = action.lower()
+        
+        if action == "add" and terms:
+            too_long = [term for term in terms if len(term) > MAX_TERM_LENGTH]
+            if too_long:
+                await ctx.send(f"❌ Terms can be at most {MAX_TERM_LENGTH} characters.")
+                return
+            
+            # Compile the new list before saving it, so a term that breaks the filter is never stored
+            server_id = str(ctx.guild.id)
+            if server_id not in guild_automod:
+                await load_guild_config(server_id)
+            current = guild_automod[server_id].config
+            AutomodRules({**current, "words": current["words"] + terms, "enabled": True})
+            
+            rules = await update_automod(ctx, {
+                "$addToSet": {"settings.automod.words": {"$each": terms}},
+                "$set": {"settings.automod.enabled": True}
+            })
+            await ctx.send(f"✅ Added {len(terms)} terms. The filter now has {len(rules.config['words'])} terms.")
+        elif action == "remove" and terms:
+            rules = await update_automod(ctx, {"$pullAll": {"settings.automod.words": terms}})
+            await ctx.send(f"✅ Removed terms. The filter now has {len(rules.config['words'])} terms.")
+        elif action == "clear":
+            await update_automod(ctx, {"$set": {"settings.automod.words": []}})
+            await ctx.send("✅ Word filter cleared.")
+        elif action == "list":
+            rules = guild_automod.get(str(ctx.guild.id))
+            if rules is None:
+                await load_guild_config(str(ctx.guild.id))
+                rules = guild_automod[str(ctx.guild.id)]
+            listed = ", ".join(f"||{word}||" for word in rules.config["words"][:50]) or "No blocked words."
+            await ctx.send(f"🚫 Blocked words ({len(rules.config['words'])}): {listed}"[:2000])
+        else:
+            await ctx.send("❌ Usage: `!wordfilter add|remove <word, phrase, ...>`, `!wordfilter list` or `!wordfilter clear`")
+            return
+        await log_command(ctx, "wordfilter", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update word filter: {str(e)}")
+        await log_command(ctx, "wordfilter", False, e)
+
+@bot.command(name='antiinvite')
+@has_permission('manage_guild')
+async def anti_invite(ctx, setting: str):
+    """Block Discord invite links"""
+    try:
+        enabled = parse_toggle(setting)
+        update = {"settings.automod.antiinvite": enabled}
+        if enabled:
+            update["settings.automod.enabled"] = True
+        await update_automod(ctx, {"$set": update})
+        await ctx.send(f"✅ Invite blocking {'enabled' if enabled else 'disabled'}.")
+        await log_command(ctx, "antiinvite", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update invite blocking: {str(e)}")
+        await log_command(ctx, "antiinvite", False, e)
+
+@bot.command(name='antilink')
+@has_permission('manage_guild')
+async def anti_link(ctx, setting: str, domain: str = None):
+    """Block links, e.g. !antilink on, !antilink allow youtube.com"""
+    try:
+        if setting.lower() in ("allow", "disallow"):
+            if not domain:
+                await ctx.send("❌ Give a domain, e.g. `!antilink allow youtube.com`")
+                return
+            operator = "$addToSet" if setting.lower() == "allow" else "$pull"
+            rules = await update_automod(ctx, {operator: {"settings.automod.allowed_domains": domain.lower()}})
+            await ctx.send(f"✅ Allowed domains: {', '.join(rules.config['allowed_domains']) or 'None'}")
+        else:
+            enabled = parse_toggle(setting)
+            update = {"settings.automod.antilink": enabled}
+            if enabled:
+                update["settings.automod.enabled"] = True
+            await update_automod(ctx, {"$set": update})
+            await ctx.send(f"✅ Link blocking {'enabled' if enabled else 'disabled'}.")
+        await log_command(ctx, "antilink", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update link blocking: {str(e)}")
+        await log_command(ctx, "antilink", False, e)
+
+@bot.command(name='anticaps')
+@has_permission('manage_guild')
+async def anti_caps(ctx, setting: str):
+    """Remove messages that are mostly capitals"""
+    try:
+        enabled = parse_toggle(setting)
+        update = {"settings.automod.anticaps": enabled}
+        if enabled:
+            update["settings.automod.enabled"] = True
+        await update_automod(ctx, {"$set": update})
+        await ctx.send(f"✅ Caps filter {'enabled' if enabled else 'disabled'}.")
+        await log_command(ctx, "anticaps", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update caps filter: {str(e)}")
+        await log_command(ctx, "anticaps", False, e)
+
+@bot.command(name='antispam')
+@has_permission('manage_guild')
+async def anti_spam(ctx, setting: str, messages: int = None, seconds: int = None):
+    """Time out members who flood or repeat messages, e.g. !antispam on 6 5"""
+    try:
+        enabled = parse_toggle(setting)
+        update = {"settings.antispam.enabled": enabled}
+        if messages:
+            update["settings.antispam.messages"] = max(2, messages)
+        if seconds:
+            update["settings.antispam.seconds"] = seconds
+        server_id = await update_guild_settings(ctx, {"$set": update})
+        
+        config = guild_antispam[server_id]
+        if config:
+            await ctx.send(f"✅ Anti-spam enabled: {config['messages']} messages in {config['seconds']}s or {config['duplicates']} repeats means a {config['timeout_minutes']} minute timeout.")
+        else:
+            await ctx.send("✅ Anti-spam disabled.")
+        await log_command(ctx, "antispam", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update anti-spam: {str(e)}")
+        await log_command(ctx, "antispam", False, e)
+
+@bot.command(name='antimention')
+@has_permission('manage_guild')
+async def anti_mention(ctx, limit: str):
+    """Time out members who mention too many users in one message, e.g. !antimention 5"""
+    try:
+        if limit.lower() in ("off", "disable", "0"):
+            await update_guild_settings(ctx, {"$set": {"settings.antispam.mentions": 0}})
+            await ctx.send("✅ Mass mention protection disabled.")
+        else:
+            mentions = max(2, int(limit))
+            await update_guild_settings(ctx, {"$set": {
+                "settings.antispam.mentions": mentions,
+                "settings.antispam.enabled": True
+            }})
+            await ctx.send(f"✅ Messages mentioning {mentions} or more users will get their author timed out.")
+        await log_command(ctx, "antimention", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update mass mention protection: {str(e)}")
+        await log_command(ctx, "antimention", False, e)
+
+@bot.command(name='antiraid')
+@has_permission('manage_guild')
+async def anti_raid(ctx, setting: str, joins: int = None, seconds: int = None):
+    """Lock down when many members join at once, e.g. !antiraid on 10 10"""
+    try:
+        enabled = parse_toggle(setting)
+        update = {"settings.antiraid.enabled": enabled}
+        if joins:
+            update["settings.antiraid.joins"] = max(2, joins)
+        if seconds:
+            update["settings.antiraid.seconds"] = seconds
+        server_id = await update_guild_settings(ctx, {"$set": update})
+        
+        config = guild_antiraid[server_id]
+        if config:
+            channels = ", ".join(channel.mention for channel in raid_channels(ctx.guild, config)) or "no channels"
+            await ctx.send(f"✅ Anti-raid enabled: {config['joins']} joins in {config['seconds']}s locks {channels} for {config['lock_minutes']} minutes.")
+        else:
+            await ctx.send("✅ Anti-raid disabled.")
+        await log_command(ctx, "antiraid", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update anti-raid: {str(e)}")
+        await log_command(ctx, "antiraid", False, e)
+
+@bot.command(name='leveling')
+@has_permission('manage_guild')
+async def leveling_settings(ctx, setting: str, channel: discord.TextChannel = None):
+    """Turn message XP on, off or on without level-up messages (quiet), e.g. !leveling on #levels"""
+    try:
+        if setting.lower() == "quiet":
+            update = {"settings.levels.enabled": True, "settings.levels.announce": False}
+        else:
+            update = {"settings.levels.enabled": parse_toggle(setting)}
+            if update["settings.levels.enabled"]:
+                update["settings.levels.announce"] = True
+        if channel:
+            update["settings.levels.announce_channel"] = str(channel.id)
+        server_id = await update_guild_settings(ctx, {"$set": update})
+        
+        config = guild_levels[server_id]
+        if not config:
+            await ctx.send("✅ Leveling disabled.")
+        elif not config["announce"]:
+            await ctx.send("✅ Leveling enabled without level-up messages.")
+        else:
+            where = f"<#{config['announce_channel']}>" if config["announce_channel"] else "the channel they happen in"
+            await ctx.send(f"✅ Leveling enabled. Level-ups are announced in {where}.")
+        await log_command(ctx, "leveling", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to update leveling: {str(e)}")
+        await log_command(ctx, "leveling", False, e)
+
 # UTILITY COMMANDS
+@bot.command(name='remind')
+async def remind(ctx, duration: str, *, text: str):
+    """Set a reminder, e.g. !remind 2h30m check the oven"""
+    try:
+        seconds = parse_duration(duration)
+        await scheduler.schedule(
+            "reminder", str(ctx.guild.id), datetime.utcnow() + timedelta(seconds=seconds),
+            channel_id=str(ctx.channel.id),
+            content=f"⏰ {ctx.author.mention}, reminder: {text}"
+        )
+        await ctx.send(f"✅ I'll remind you in {format_time(seconds)}.")
+        await log_command(ctx, "remind", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to set reminder: {str(e)}")
+        await log_command(ctx, "remind", False, e)
+
+@bot.command(name='timer')
+async def timer(ctx, duration: str, *, label: str = None):
+    """Start a timer, e.g. !timer 10m tea"""
+    try:
+        seconds = parse_duration(duration)
+        name = f"**{label}** timer" if label else "timer"
+        await scheduler.schedule(
+            "timer", str(ctx.guild.id), datetime.utcnow() + timedelta(seconds=seconds),
+            channel_id=str(ctx.channel.id),
+            content=f"⏰ {ctx.author.mention}, your {format_time(seconds)} {name} is up!"
+        )
+        await ctx.send(f"⏱️ Timer set for {format_time(seconds)}.")
+        await log_command(ctx, "timer", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to set timer: {str(e)}")
+        await log_command(ctx, "timer", False, e)
+
 @bot.command(name='poll')
 async def create_poll(ctx, *, question: str):
     """Create a poll"""
@@ -528,15 +1897,7 @@ async def check_balance(ctx, user: discord.Member = None):
         if user is None:
             user = ctx.author
         
-        user_data = economy_collection.find_one({
-            "server_id": str(ctx.guild.id),
-            "user_id": str(user.id)
-        })
-        
-        if not user_data:
-            balance = 0
-        else:
-            balance = user_data.get("balance", 0)
+        balance = await economy_ledger.get_balance(str(ctx.guild.id), str(user.id))
         
         embed = discord.Embed(
             title=f"💰 {user.display_name}'s Balance",
@@ -554,150 +1915,134 @@ async def check_balance(ctx, user: discord.Member = None):
 async def daily_reward(ctx):
     """Get daily reward"""
     try:
-        user_data = economy_collection.find_one({
-            "server_id": str(ctx.guild.id),
-            "user_id": str(ctx.author.id)
-        })
-        
         now = datetime.utcnow()
-        
-        if user_data and user_data.get("last_daily"):
-            last_daily = user_data["last_daily"]
-            if (now - last_daily).days < 1:
-                time_left = 24 - (now - last_daily).seconds // 3600
-                await ctx.send(f"❌ You can claim your daily reward in {time_left} hours!")
-                return
-        
         reward = random.randint(100, 500)
         
-        economy_collection.update_one(
-            {"server_id": str(ctx.guild.id), "user_id": str(ctx.author.id)},
-            {
-                "$inc": {"balance": reward},
-                "$set": {"last_daily": now}
-            },
-            upsert=True
+        claimed, balance, last_daily = await economy_ledger.claim_daily(
+            str(ctx.guild.id), str(ctx.author.id), reward, now
         )
         
-        await ctx.send(f"✅ You claimed your daily reward of **{reward:,}** coins!")
+        if not claimed:
+            time_left = 24 - (now - last_daily).seconds // 3600 if last_daily else 24
+            await ctx.send(f"❌ You can claim your daily reward in {time_left} hours!")
+            return
+        
+        await ctx.send(f"✅ You claimed your daily reward of **{reward:,}** coins! Balance: **{balance:,}**")
         await log_command(ctx, "daily", True)
     except Exception as e:
         await ctx.send(f"❌ Failed to claim daily reward: {str(e)}")
         await log_command(ctx, "daily", False, e)
 
+@bot.command(name='leaderboard')
+async def show_leaderboard(ctx, limit: int = 10):
+    """Show the richest users in the server"""
+    try:
+        limit = max(1, min(limit, 25))
+        server_id = str(ctx.guild.id)
+        
+        top_users = await leaderboard.top(server_id, limit)
+        rank, total = await leaderboard.rank(server_id, str(ctx.author.id))
+        
+        embed = discord.Embed(
+            title=f"🏆 {ctx.guild.name} Leaderboard",
+            color=discord.Color.gold()
+        )
+        
+        if top_users:
+            embed.description = "\n".join(
+                f"**{i}.** <@{user_id}> — {balance:,} coins"
+                for i, (user_id, balance) in enumerate(top_users, 1)
+            )
+        else:
+            embed.description = "Nobody has any coins yet!"
+        
+        embed.set_footer(text=f"Your rank: #{rank} of {total}" if rank else "You're not ranked yet")
+        
+        await ctx.send(embed=embed)
+        await log_command(ctx, "leaderboard", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to show leaderboard: {str(e)}")
+        await log_command(ctx, "leaderboard", False, e)
+
+# LEVELING COMMANDS
+@bot.command(name='rank')
+async def show_rank(ctx, member: discord.Member = None):
+    """Show a member's level and XP rank"""
+    try:
+        member = member or ctx.author
+        xp, level, rank, total = await xp_engine.get_rank(str(ctx.guild.id), str(member.id))
+        level_start = LEVEL_THRESHOLDS[level]
+        level_xp = LEVEL_THRESHOLDS[level + 1] - level_start
+        
+        embed = discord.Embed(title=f"📈 {member.display_name}'s Rank", color=discord.Color.blue())
+        embed.add_field(name="Level", value=str(level))
+        embed.add_field(name="Rank", value=f"#{rank} of {total}" if rank else "Unranked")
+        embed.add_field(name="XP", value=f"{xp - level_start:,} / {level_xp:,} ({xp:,} total)")
+        embed.set_thumbnail(url=member.display_avatar.url)
+        
+        await ctx.send(embed=embed)
+        await log_command(ctx, "rank", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to show rank: {str(e)}")
+        await log_command(ctx, "rank", False, e)
+
+@bot.command(name='levels')
+async def show_levels(ctx, limit: int = 10):
+    """Show the most active members in the server"""
+    try:
+        limit = max(1, min(limit, 25))
+        server_id = str(ctx.guild.id)
+        
+        top_users = await xp_engine.top(server_id, limit)
+        _, _, rank, total = await xp_engine.get_rank(server_id, str(ctx.author.id))
+        
+        embed = discord.Embed(
+            title=f"📈 {ctx.guild.name} Levels",
+            color=discord.Color.blue()
+        )
+        
+        if top_users:
+            embed.description = "\n".join(
+                f"**{i}.** <@{user_id}> — level {level_for_xp(xp)} ({xp:,} XP)"
+                for i, (user_id, xp) in enumerate(top_users, 1)
+            )
+        else:
+            embed.description = "Nobody has any XP yet!"
+        
+        embed.set_footer(text=f"Your rank: #{rank} of {total}" if rank else "You're not ranked yet")
+        
+        await ctx.send(embed=embed)
+        await log_command(ctx, "levels", True)
+    except Exception as e:
+        await ctx.send(f"❌ Failed to show levels: {str(e)}")
+        await log_command(ctx, "levels", False, e)
+
 # NEWS COMMAND
 @bot.command(name='news')
 async def get_news(ctx, country: str = "us", category: str = "general"):
     """Get news from US, UK, or India"""
     try:
-        # Map country codes
-        country_map = {
-            "us": "us",
-            "usa": "us",
-            "united states": "us",
-            "america": "us",
-            "uk": "gb",
-            "britain": "gb",
-            "england": "gb",
-            "united kingdom": "gb",
-            "india": "in",
-            "ind": "in"
-        }
-        
-        # Map categories
-        category_map = {
-            "general": "general",
-            "business": "business",
-            "tech": "technology",
-            "technology": "technology",
-            "sports": "sports",
-            "health": "health",
-            "entertainment": "entertainment",
-            "science": "science"
-        }
-        
         # Validate country
-        country_code = country_map.get(country.lower())
+        country_code = COUNTRY_MAP.get(country.lower())
         if not country_code:
             await ctx.send("❌ Invalid country! Use: `us`, `uk`, or `india`")
             return
         
         # Validate category
-        category_code = category_map.get(category.lower(), "general")
-        
-        # Country names for display
-        country_names = {
-            "us": "🇺🇸 United States",
-            "gb": "🇬🇧 United Kingdom", 
-            "in": "🇮🇳 India"
-        }
+        category_code = CATEGORY_MAP.get(category.lower(), "general")
         
-        # Category emojis
-        category_emojis = {
-            "general": "📰",
-            "business": "💼",
-            "technology": "💻",
-            "sports": "⚽",
-            "health": "🏥",
-            "entertainment": "🎬",
-            "science": "🔬"
-        }
+        embed = await news_cache.get((country_code, category_code))
         
-        # Fetch news from API
-        url = f"https://newsapi.org/v2/top-headlines"
-        params = {
-            "country": country_code,
-            "category": category_code,
-            "pageSize": 5,
-            "apiKey": NEWS_API_KEY
-        }
+        if embed is None:
+            await ctx.send("❌ No news articles found!")
+            return
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10.0)
-            
-            if response.status_code != 200:
-                await ctx.send(f"❌ Error fetching news: {response.status_code}")
-                return
-            
-            data = response.json()
-            
-            if not data.get("articles"):
-                await ctx.send("❌ No news articles found!")
-                return
-            
-            articles = data["articles"][:5]  # Limit to 5 articles
-            
-            # Create embed
-            embed = discord.Embed(
-                title=f"{category_emojis.get(category_code, '📰')} {category_code.title()} News",
-                description=f"Latest headlines from {country_names.get(country_code, country_code.upper())}",
-                color=discord.Color.blue(),
-                timestamp=datetime.utcnow()
-            )
-            
-            for i, article in enumerate(articles, 1):
-                title = article.get("title", "No title")
-                description = article.get("description", "No description available")
-                url = article.get("url", "")
-                source = article.get("source", {}).get("name", "Unknown")
-                
-                # Truncate title and description to fit embed limits
-                if len(title) > 100:
-                    title = title[:97] + "..."
-                if len(description) > 200:
-                    description = description[:197] + "..."
-                
-                embed.add_field(
-                    name=f"{i}. {title}",
-                    value=f"{description}\n🔗 [Read more]({url}) | 📰 {source}",
-                    inline=False
-                )
-            
-            embed.set_footer(text=f"Powered by NewsAPI | Total articles: {data.get('totalResults', 0)}")
-            
-            await ctx.send(embed=embed)
-            await log_command(ctx, "news", True)
+        await ctx.send(embed=embed)
+        await log_command(ctx, "news", True)
             
+    except NewsAPIError as e:
+        await ctx.send(f"❌ Error fetching news: {e.status_code}")
+        await log_command(ctx, "news", False, e)
     except httpx.TimeoutException:
         await ctx.send("❌ Request timed out. Please try again later.")
         await log_command(ctx, "news", False, "Timeout")
@@ -729,6 +2074,8 @@ async def help_command(ctx, category: str = None):
                 "utility": "Utility commands",
                 "fun": "Fun commands",
                 "economy": "Economy commands",
+                "levels": "Leveling commands (rank, levels)",
+                "automod": "Auto moderation commands",
                 "news": "News commands (US, UK, India news)"
             }
             
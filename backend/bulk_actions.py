@@ -0,0 +1,320 @@
+"""Checkpointed executor for mass moderation actions (massban, massrole, roleall)"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+from database import run_db
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+ACTIONS = ("ban", "add_role", "remove_role")
+
+# Per-target outcomes
+PENDING, DONE, FAILED, SKIPPED = 0, 1, 2, 3
+OUTCOME_NAMES = {DONE: "done", FAILED: "failed", SKIPPED: "skipped"}
+
+ProgressReporter = Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+def moderatable_targets(guild, moderator, user_ids: Iterable[int]) -> Tuple[List[int], int]:
+    """Drop cached members ranked at or above the moderator (unless they own the guild) or the bot.
+
+    Returns (user_ids to act on, number skipped); users who aren't members
+    have no roles and are kept.
+    """
+    targets, skipped = [], 0
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member is not None and (
+            member.top_role >= guild.me.top_role
+            or (moderator.id != guild.owner_id and member.top_role >= moderator.top_role)
+        ):
+            skipped += 1
+            continue
+        targets.append(user_id)
+    return targets, skipped
+
+class BulkActionExecutor:
+    """Run thousands of per-member actions with bounded concurrency.
+
+    Each action kind is paced per guild by a token bucket sized to its route's
+    rate limit, 429s and 5xx responses are retried with backoff, and progress
+    is checkpointed to MongoDB as a watermark: every target before `cursor` has
+    finished. Jobs still marked running are resumed from their watermark after
+    a restart; actions between the watermark and the crash point are repeated,
+    which is safe because bans and role changes are idempotent.
+    """
+
+    def __init__(self, collection, concurrency: int = 5, rates: Optional[Dict[str, float]] = None,
+                 max_retries: int = 5, checkpoint_interval: float = 5.0, progress_interval: float = 5.0,
+                 reporter: Optional[ProgressReporter] = None):
+        self.collection = collection
+        self.concurrency = concurrency
+        self.rates = rates or {"ban": 1.0, "add_role": 2.0, "remove_role": 2.0}
+        self.max_retries = max_retries
+        self.checkpoint_interval = checkpoint_interval
+        self.progress_interval = progress_interval
+        self.reporter = reporter
+
+        self._running: Dict[str, asyncio.Task] = {}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._reserved = set()
+        self._pacers: Dict[Tuple[int, str], TokenBucket] = {}
+        self.stats = {"jobs": 0, "resumed": 0, "done": 0, "failed": 0, "skipped": 0, "retries": 0}
+
+    def is_busy(self, guild_id: int) -> bool:
+        """Check whether a guild already has a job running or being created"""
+        return str(guild_id) in self._reserved or any(job["server_id"] == str(guild_id) for job in self._jobs.values())
+
+    def reserve(self, guild_id: int) -> bool:
+        """Claim a guild for a new job before any await; False if it's busy.
+
+        The reservation ends when the job is started or release() is called.
+        """
+        if self.is_busy(guild_id):
+            return False
+        self._reserved.add(str(guild_id))
+        return True
+
+    def release(self, guild_id: int):
+        self._reserved.discard(str(guild_id))
+
+    async def create_job(self, guild, action: str, targets: Iterable[int], requested_by: int,
+                         channel_id: int, status_message_id: int, role_id: Optional[int] = None,
+                         reason: Optional[str] = None) -> Dict[str, Any]:
+        """Store a new job; start it with start()"""
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown bulk action: {action}")
+
+        now = datetime.utcnow()
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "server_id": str(guild.id),
+            "action": action,
+            "role_id": role_id,
+            "reason": reason,
+            "targets": [str(target) for target in dict.fromkeys(targets)],
+            "cursor": 0,
+            "done": 0,
+            "failed": 0,
+            "skipped": 0,
+            "status": "running",
+            "requested_by": str(requested_by),
+            "channel_id": channel_id,
+            "status_message_id": status_message_id,
+            "created_at": now,
+            "updated_at": now
+        }
+        await run_db(self.collection.insert_one(dict(job)))
+        return job
+
+    def start(self, job: Dict[str, Any], guild) -> asyncio.Task:
+        """Run a job in the background"""
+        task = self._running.get(job["job_id"])
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._run(job, guild))
+            self._running[job["job_id"]] = task
+            self._jobs[job["job_id"]] = job
+            self._reserved.discard(job["server_id"])
+            task.add_done_callback(lambda _: self._forget(job["job_id"]))
+        return task
+
+    def _forget(self, job_id: str):
+        self._running.pop(job_id, None)
+        self._jobs.pop(job_id, None)
+
+    async def resume(self, guilds) -> int:
+        """Restart interrupted jobs for the given guilds"""
+        guilds_by_id = {str(guild.id): guild for guild in guilds}
+        jobs = await run_db(self.collection.find(
+            {"status": "running", "server_id": {"$in": list(guilds_by_id)}},
+            {"_id": 0}
+        ).to_list(length=None))
+
+        resumed = 0
+        for job in jobs:
+            if job["job_id"] in self._running:
+                continue
+            logger.info(f"Resuming bulk {job['action']} job {job['job_id']} at {job['cursor']}/{len(job['targets'])}")
+            self.start(job, guilds_by_id[job["server_id"]])
+            resumed += 1
+        self.stats["resumed"] += resumed
+        return resumed
+
+    async def close(self):
+        """Stop running jobs, checkpointing them so they resume on the next start"""
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _pacer(self, guild_id: int, action: str) -> TokenBucket:
+        pacer = self._pacers.get((guild_id, action))
+        if pacer is None:
+            pacer = self._pacers[(guild_id, action)] = TokenBucket(self.rates[action], self.concurrency)
+        return pacer
+
+    async def _perform(self, guild, job: Dict[str, Any], role, user_id: int) -> int:
+        """Apply the job's action to one user"""
+        if job["action"] == "ban":
+            await guild.ban(discord.Object(id=user_id), reason=job["reason"], delete_message_seconds=0)
+            return DONE
+
+        member = guild.get_member(user_id)
+        if member is None:
+            return SKIPPED
+        if job["action"] == "add_role":
+            if role in member.roles:
+                return SKIPPED
+            await member.add_roles(role, reason=job["reason"])
+        else:
+            if role not in member.roles:
+                return SKIPPED
+            await member.remove_roles(role, reason=job["reason"])
+        return DONE
+
+    async def _attempt(self, guild, job: Dict[str, Any], role, user_id: int) -> int:
+        """Perform one action, retrying rate limits and server errors with backoff"""
+        pacer = self._pacer(guild.id, job["action"])
+        for attempt in range(self.max_retries + 1):
+            await pacer.acquire()
+            try:
+                return await self._perform(guild, job, role, user_id)
+            except discord.NotFound:
+                return SKIPPED
+            except discord.RateLimited as e:
+                retry_after = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    logger.warning(f"Bulk {job['action']} failed for {user_id} in {guild.id}: {e}")
+                    return FAILED
+                retry_after = min(2 ** attempt, 60)
+            self.stats["retries"] += 1
+            await asyncio.sleep(retry_after)
+        return FAILED
+
+    async def _run(self, job: Dict[str, Any], guild):
+        try:
+            await self._process(job, guild)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception(f"Bulk {job['action']} job {job['job_id']} failed")
+            try:
+                await self._finish(job, "failed")
+            except Exception as e:
+                logger.error(f"Failed to mark bulk job {job['job_id']} failed: {e}")
+
+    async def _process(self, job: Dict[str, Any], guild):
+        targets = job["targets"]
+        role = None
+        if job["action"] != "ban":
+            role = guild.get_role(job["role_id"])
+            if role is None:
+                await self._finish(job, "failed")
+                return
+            if not guild.chunked:
+                await guild.chunk(cache=True)
+
+        self.stats["jobs"] += 1
+        results = bytearray(len(targets))
+        state = {"next": job["cursor"], "started": time.monotonic(), "started_at": job["cursor"],
+                 "failed_before": job["failed"], "live": {"done": 0, "failed": 0, "skipped": 0}}
+
+        async def worker():
+            while state["next"] < len(targets):
+                index = state["next"]
+                state["next"] += 1
+                outcome = await self._attempt(guild, job, role, int(targets[index]))
+                results[index] = outcome
+                state["live"][OUTCOME_NAMES[outcome]] += 1
+                self.stats[OUTCOME_NAMES[outcome]] += 1
+
+        async def checkpoint_loop():
+            last_report = 0.0
+            while True:
+                await asyncio.sleep(self.checkpoint_interval)
+                await self._checkpoint(job, results)
+                now = time.monotonic()
+                if now - last_report >= self.progress_interval:
+                    last_report = now
+                    await self._report(job, state)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.concurrency, len(targets)) or 1)]
+        checkpointer = asyncio.create_task(checkpoint_loop())
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            # Cancelled (resumed later from the checkpoint) or failed (marked failed by _run)
+            for task in workers:
+                task.cancel()
+            await self._checkpoint(job, results)
+            raise
+        finally:
+            checkpointer.cancel()
+
+        await self._checkpoint(job, results)
+        await self._finish(job, "completed")
+        await self._report(job, state)
+
+    def _advance(self, job: Dict[str, Any], results: bytearray):
+        """Move the watermark past every finished target, counting their outcomes"""
+        cursor = job["cursor"]
+        while cursor < len(results) and results[cursor] != PENDING:
+            job[OUTCOME_NAMES[results[cursor]]] += 1
+            cursor += 1
+        job["cursor"] = cursor
+
+    async def _checkpoint(self, job: Dict[str, Any], results: bytearray):
+        self._advance(job, results)
+        try:
+            await run_db(self.collection.update_one(
+                {"job_id": job["job_id"]},
+                {"$set": {
+                    "cursor": job["cursor"],
+                    "done": job["done"],
+                    "failed": job["failed"],
+                    "skipped": job["skipped"],
+                    "updated_at": datetime.utcnow()
+                }}
+            ))
+        except Exception as e:
+            logger.error(f"Failed to checkpoint bulk job {job['job_id']}: {e}")
+
+    async def _finish(self, job: Dict[str, Any], status: str):
+        job["status"] = status
+        await run_db(self.collection.update_one(
+            {"job_id": job["job_id"]},
+            {"$set": {"status": status, "updated_at": datetime.utcnow()}}
+        ))
+
+    def progress(self, job: Dict[str, Any], state: Dict[str, Any]) -> Dict[str, Any]:
+        """Get completion, throughput and ETA for a job"""
+        total = len(job["targets"])
+        finished = state["started_at"] + sum(state["live"].values())
+        elapsed = time.monotonic() - state["started"]
+        rate = (finished - state["started_at"]) / elapsed if elapsed > 0 else 0.0
+        return {
+            "status": job["status"],
+            "total": total,
+            "finished": finished,
+            "failed": state["failed_before"] + state["live"]["failed"],
+            "per_second": round(rate, 2),
+            "eta": int((total - finished) / rate) if rate > 0 else None
+        }
+
+    async def _report(self, job: Dict[str, Any], state: Dict[str, Any]):
+        if self.reporter is None:
+            return
+        try:
+            await self.reporter(job, self.progress(job, state))
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to report bulk job progress: {e}")
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"running": len(self._running), **self.stats}
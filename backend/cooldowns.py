@@ -0,0 +1,135 @@
+"""Per-user and per-guild token-bucket cooldowns for commands"""
+import time
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from ratelimit import TokenBucket
+
+# A limit is {"rate": calls, "per": seconds}; None or a rate of 0 disables that scope
+Limits = Dict[str, Optional[Dict[str, float]]]
+SCOPES = ("guild", "user")
+LIMIT_FIELDS = ("rate", "per")
+
+def clean_overrides(overrides: Any) -> Dict[str, Limits]:
+    """Validate a guild's settings.cooldowns, dropping anything malformed.
+
+    Keeps numeric, non-negative rate/per fields (per must be positive, and a
+    non-zero rate at least one call, or the bucket could never hold a token)
+    and None for scopes that are switched off; partial limits are kept and
+    filled from the defaults by limits().
+    """
+    cleaned: Dict[str, Limits] = {}
+    for command, scopes in (overrides or {}).items():
+        if not isinstance(scopes, dict):
+            continue
+        for scope, limit in scopes.items():
+            if scope not in SCOPES:
+                continue
+            if limit is None:
+                cleaned.setdefault(command, {})[scope] = None
+                continue
+            if not isinstance(limit, dict):
+                continue
+            fields = {}
+            for field in LIMIT_FIELDS:
+                value = limit.get(field)
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+                    fields[field] = float(value)
+            if fields.get("per") == 0:
+                del fields["per"]
+            if 0 < fields.get("rate", 0) < 1:
+                del fields["rate"]
+            if fields:
+                cleaned.setdefault(command, {})[scope] = fields
+    return cleaned
+
+class CommandCooldowns:
+    """Token buckets keyed by (scope, guild, [user,] command).
+
+    Limits are resolved per call from the built-in defaults and the guild's
+    `settings.cooldowns` overrides, each keyed by command name with "*" as the
+    fallback. A call must fit in both the guild and the user bucket and only
+    takes a token from either when it fits in both. Buckets that have
+    refilled completely carry no state and are dropped by evict_idle().
+    """
+
+    def __init__(self, defaults: Dict[str, Limits]):
+        self.defaults = defaults
+        self._buckets: Dict[Tuple, TokenBucket] = {}
+        self._warned = set()
+        self.rejections: Counter = Counter()
+        self.stats = {"allowed": 0, "rejected": 0, "evicted": 0}
+
+    def limits(self, command: str, overrides: Optional[Dict[str, Limits]] = None) -> Limits:
+        """Resolve the guild and user limits for a command, merging field by field"""
+        resolved: Limits = {}
+        for source in (self.defaults, overrides or {}):
+            for key in ("*", command):
+                for scope, limit in (source.get(key) or {}).items():
+                    if limit is None or resolved.get(scope) is None:
+                        resolved[scope] = dict(limit) if limit else limit
+                    else:
+                        resolved[scope] = {**resolved[scope], **limit}
+        return resolved
+
+    def _bucket(self, key: Tuple, limit: Dict[str, float], now: float) -> TokenBucket:
+        rate = limit["rate"] / limit["per"]
+        # A capacity below one token would reject every call
+        capacity = max(1.0, limit["rate"])
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, capacity)
+            bucket.updated = now
+        else:
+            # Pick up limit changes without resetting the bucket
+            bucket.rate, bucket.capacity = rate, capacity
+        return bucket
+
+    def check(self, guild_id: int, user_id: int, command: str,
+              overrides: Optional[Dict[str, Limits]] = None,
+              now: Optional[float] = None) -> Tuple[float, Optional[str]]:
+        """Take a token for a call.
+
+        Returns (0, None) when allowed, otherwise (retry_after, scope) naming
+        the scope that rejected it.
+        """
+        now = time.monotonic() if now is None else now
+        buckets = []
+        for scope, limit in self.limits(command, overrides).items():
+            if scope not in SCOPES or not limit or not limit.get("rate") or not limit.get("per"):
+                continue
+            key = (scope, guild_id, command) if scope == "guild" else (scope, guild_id, user_id, command)
+            bucket = self._bucket(key, limit, now)
+            retry_after = bucket.retry_after(now)
+            if retry_after:
+                self.stats["rejected"] += 1
+                self.rejections[(command, scope)] += 1
+                return retry_after, scope
+            buckets.append(bucket)
+
+        for bucket in buckets:
+            bucket.tokens -= 1
+        self.stats["allowed"] += 1
+        self._warned.discard((guild_id, user_id))
+        return 0.0, None
+
+    def should_warn(self, guild_id: int, user_id: int) -> bool:
+        """Reply to the first rejection of a streak only, so spam doesn't turn into bot replies"""
+        key = (guild_id, user_id)
+        if key in self._warned:
+            return False
+        self._warned.add(key)
+        return True
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop buckets that have refilled completely"""
+        now = time.monotonic() if now is None else now
+        idle = [key for key, bucket in self._buckets.items() if bucket.is_full(now)]
+        for key in idle:
+            del self._buckets[key]
+        self._warned.clear()
+        self.stats["evicted"] += len(idle)
+        return len(idle)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"buckets": len(self._buckets), **self.stats}
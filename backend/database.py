@@ -0,0 +1,47 @@
+"""Async MongoDB data layer for the bot process"""
+import asyncio
+import os
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from metrics import timed_span
+
+# MongoDB connection
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'discord_bot_db')
+
+# Pool and timeout settings
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_OP_TIMEOUT = float(os.environ.get('MONGO_OP_TIMEOUT', '5'))
+
+client = AsyncIOMotorClient(
+    MONGO_URL,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    minPoolSize=MONGO_MIN_POOL_SIZE,
+    serverSelectionTimeoutMS=int(MONGO_OP_TIMEOUT * 1000),
+    timeoutMS=int(MONGO_OP_TIMEOUT * 1000)
+)
+db = client[DB_NAME]
+
+# Collections
+servers_collection = db.servers
+commands_collection = db.commands
+users_collection = db.users
+warnings_collection = db.warnings
+economy_collection = db.economy
+bot_shards_collection = db.bot_shards
+bulk_jobs_collection = db.bulk_jobs
+levels_collection = db.levels
+scheduled_jobs_collection = db.scheduled_jobs
+
+class DatabaseTimeout(Exception):
+    """Raised when a database operation exceeds its timeout"""
+
+async def run_db(operation, timeout: float = None):
+    """Await a database operation, giving up after the per-operation timeout"""
+    timeout = MONGO_OP_TIMEOUT if timeout is None else timeout
+    try:
+        with timed_span("db"):
+            return await asyncio.wait_for(operation, timeout)
+    except asyncio.TimeoutError:
+        raise DatabaseTimeout(f"Database operation timed out after {timeout}s")
@@ -0,0 +1,431 @@
+"""Economy persistence: atomic claims and the write-behind balance ledger"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from database import run_db
+from ranking import RankIndex
+
+logger = logging.getLogger(__name__)
+
+DAILY_COOLDOWN = timedelta(days=1)
+DUPLICATE_KEY = 11000
+ECONOMY_UNIQUE_INDEX = "economy.server_id_user_id_unique"
+
+class MissingIndex(Exception):
+    """Raised when a write that relies on the unique (server_id, user_id) index can't be made safely"""
+
+def sequenced_update(key_filter: Dict, seq: int, update: Dict) -> UpdateOne:
+    """Build an upsert that applies at most once per flush sequence number.
+
+    Once the document's flush_seq has reached seq, the filter no longer
+    matches and the upsert collides with the unique (server_id, user_id)
+    index instead, so a retried delta fails with a duplicate key error
+    rather than being applied twice.
+    """
+    return UpdateOne(
+        {**key_filter, "flush_seq": {"$not": {"$gte": seq}}},
+        {**update, "$set": {**update.get("$set", {}), "flush_seq": seq}},
+        upsert=True
+    )
+
+def failed_writes(error: BulkWriteError) -> set:
+    """Get the indexes of bulk writes that failed, counting duplicate keys as already applied"""
+    return {
+        write_error["index"] for write_error in error.details.get("writeErrors", [])
+        if write_error.get("code") != DUPLICATE_KEY
+    }
+
+async def claim_daily(collection, server_id: str, user_id: str, reward: int,
+                      now: Optional[datetime] = None) -> Tuple[bool, Optional[int], Optional[datetime]]:
+    """Pay the daily reward in one conditional upsert.
+
+    Returns (claimed, new_balance, last_daily). When the cooldown is still
+    running, claimed is False and last_daily is the previous claim time.
+    Relies on the unique (server_id, user_id) index: an upsert that fails the
+    cooldown filter collides with the existing document instead of inserting
+    a duplicate.
+    """
+    now = now or datetime.utcnow()
+    try:
+        user_data = await collection.find_one_and_update(
+            {
+                "server_id": server_id,
+                "user_id": user_id,
+                "$or": [
+                    {"last_daily": None},
+                    {"last_daily": {"$lte": now - DAILY_COOLDOWN}}
+                ]
+            },
+            {
+                "$inc": {"balance": reward},
+                "$set": {"last_daily": now}
+            },
+            projection={"balance": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return True, user_data["balance"], now
+    except DuplicateKeyError:
+        user_data = await collection.find_one(
+            {"server_id": server_id, "user_id": user_id},
+            {"last_daily": 1}
+        )
+        return False, None, user_data.get("last_daily") if user_data else None
+
+class Account:
+    """In-memory balance with changes not yet written to MongoDB.
+
+    seq is the last flush sequence number known to be applied; inflight is
+    the delta sent as seq + 1 whose outcome isn't known yet, and is resent
+    with the same number until a flush confirms it.
+    """
+    __slots__ = ("balance", "last_daily", "pending", "daily_dirty", "touched", "seq", "inflight")
+
+    def __init__(self, balance: int = 0, last_daily: Optional[datetime] = None, seq: int = 0):
+        self.balance = balance
+        self.last_daily = last_daily
+        self.pending = 0
+        self.daily_dirty = False
+        self.touched = time.monotonic()
+        self.seq = seq
+        self.inflight: Optional[int] = None
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.pending) or self.daily_dirty or self.inflight is not None
+
+class EconomyLedger:
+    """Per-guild balances served from memory and flushed as batched $inc deltas.
+
+    flush_interval is the durability window: changes reach MongoDB within that
+    many seconds. With flush_interval <= 0 every call goes straight to MongoDB.
+    unique_index says whether the unique (server_id, user_id) index has been
+    verified; direct daily claims refuse to run without it, and flushes are
+    held back, since sequenced_update can't dedupe a resend without it.
+    """
+
+    def __init__(self, collection, flush_interval: float = 5.0, batch_size: int = 1000,
+                 idle_ttl: float = 3600.0, unique_index: bool = False):
+        self.collection = collection
+        self.unique_index = unique_index
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.idle_ttl = idle_ttl
+
+        self._accounts: Dict[Tuple[str, str], Account] = {}
+        self._loading: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._task = None
+        self.listeners: List[Callable[[str, str, int], None]] = []
+
+        self.stats = {"hits": 0, "loads": 0, "flushes": 0, "flushed_ops": 0, "failed_ops": 0,
+                      "held_flushes": 0, "evicted": 0}
+
+    @property
+    def write_behind(self) -> bool:
+        return self.flush_interval > 0
+
+    def start(self):
+        """Start the periodic flush task"""
+        if self.write_behind and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        """Stop the flush task and write out all pending changes"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if not self.unique_index:
+            dirty = sum(1 for account in self._accounts.values() if account.dirty)
+            if dirty:
+                logger.error(f"Discarding {dirty} unflushed economy accounts: {ECONOMY_UNIQUE_INDEX} is missing")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            self._evict_idle()
+
+    def _changed(self, server_id: str, user_id: str, balance: int):
+        """Tell listeners about a new balance"""
+        for listener in self.listeners:
+            listener(server_id, user_id, balance)
+
+    def hot_balances(self, server_id: str) -> Iterator[Tuple[str, int]]:
+        """Yield (user_id, balance) for the guild's accounts held in memory"""
+        for (account_server_id, user_id), account in list(self._accounts.items()):
+            if account_server_id == server_id:
+                yield user_id, account.balance
+
+    async def _account(self, server_id: str, user_id: str) -> Account:
+        """Get a hot account, loading it from MongoDB on first use"""
+        key = (server_id, user_id)
+        account = self._accounts.get(key)
+        if account is not None:
+            self.stats["hits"] += 1
+            account.touched = time.monotonic()
+            return account
+
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(key))
+            self._loading[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Tuple[str, str]) -> Account:
+        self.stats["loads"] += 1
+        try:
+            user_data = await run_db(self.collection.find_one(
+                {"server_id": key[0], "user_id": key[1]},
+                {"balance": 1, "last_daily": 1, "flush_seq": 1}
+            ))
+        finally:
+            self._loading.pop(key, None)
+
+        user_data = user_data or {}
+        account = Account(user_data.get("balance", 0), user_data.get("last_daily"), user_data.get("flush_seq", 0))
+        self._accounts[key] = account
+        return account
+
+    async def get_balance(self, server_id: str, user_id: str) -> int:
+        """Get a user's balance"""
+        if not self.write_behind:
+            user_data = await run_db(self.collection.find_one(
+                {"server_id": server_id, "user_id": user_id},
+                {"balance": 1}
+            ))
+            return user_data.get("balance", 0) if user_data else 0
+
+        return (await self._account(server_id, user_id)).balance
+
+    async def add(self, server_id: str, user_id: str, amount: int) -> int:
+        """Add (or with a negative amount, remove) coins, returning the new balance"""
+        if not self.write_behind:
+            user_data = await run_db(self.collection.find_one_and_update(
+                {"server_id": server_id, "user_id": user_id},
+                {"$inc": {"balance": amount}},
+                projection={"balance": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            ))
+            self._changed(server_id, user_id, user_data["balance"])
+            return user_data["balance"]
+
+        account = await self._account(server_id, user_id)
+        account.balance += amount
+        account.pending += amount
+        self._changed(server_id, user_id, account.balance)
+        return account.balance
+
+    async def transfer(self, server_id: str, from_user_id: str, to_user_id: str, amount: int) -> bool:
+        """Move coins between users if the sender can cover the amount"""
+        if not self.write_behind:
+            sender_data = await run_db(self.collection.find_one_and_update(
+                {"server_id": server_id, "user_id": from_user_id, "balance": {"$gte": amount}},
+                {"$inc": {"balance": -amount}},
+                projection={"balance": 1},
+                return_document=ReturnDocument.AFTER
+            ))
+            if sender_data is None:
+                return False
+            self._changed(server_id, from_user_id, sender_data["balance"])
+            await self.add(server_id, to_user_id, amount)
+            return True
+
+        sender = await self._account(server_id, from_user_id)
+        receiver = await self._account(server_id, to_user_id)
+        if sender.balance < amount:
+            return False
+
+        sender.balance -= amount
+        sender.pending -= amount
+        receiver.balance += amount
+        receiver.pending += amount
+        self._changed(server_id, from_user_id, sender.balance)
+        self._changed(server_id, to_user_id, receiver.balance)
+        return True
+
+    async def claim_daily(self, server_id: str, user_id: str, reward: int,
+                          now: Optional[datetime] = None) -> Tuple[bool, Optional[int], Optional[datetime]]:
+        """Pay the daily reward if the cooldown has passed (see claim_daily)"""
+        now = now or datetime.utcnow()
+        if not self.write_behind:
+            if not self.unique_index:
+                # Without the index a claim on cooldown would insert a second document and pay again
+                raise MissingIndex("Daily rewards are unavailable until the economy index is in place")
+            claimed, balance, last_daily = await run_db(claim_daily(self.collection, server_id, user_id, reward, now))
+            if claimed:
+                self._changed(server_id, user_id, balance)
+            return claimed, balance, last_daily
+
+        account = await self._account(server_id, user_id)
+        if account.last_daily and now - account.last_daily < DAILY_COOLDOWN:
+            return False, None, account.last_daily
+
+        account.last_daily = now
+        account.daily_dirty = True
+        account.balance += reward
+        account.pending += reward
+        self._changed(server_id, user_id, account.balance)
+        return True, account.balance, now
+
+    async def flush(self):
+        """Write pending changes for all dirty accounts in unordered bulk batches.
+
+        Each account's delta carries a flush sequence number, so a batch that
+        timed out after reaching MongoDB can be resent without paying twice.
+        """
+        if not self.unique_index:
+            # A resend would upsert a duplicate document instead of failing; keep the changes in memory
+            self.stats["held_flushes"] += 1
+            return
+
+        snapshot = []
+        for key, account in self._accounts.items():
+            if not account.dirty:
+                continue
+            if account.inflight is None:
+                account.inflight, account.pending = account.pending, 0
+            snapshot.append((key, account, account.seq + 1, account.last_daily))
+
+        for i in range(0, len(snapshot), self.batch_size):
+            batch = snapshot[i:i + self.batch_size]
+            operations = []
+            for (server_id, user_id), account, seq, last_daily in batch:
+                update = {"$inc": {"balance": account.inflight}}
+                if account.daily_dirty:
+                    update["$max"] = {"last_daily": last_daily}
+                operations.append(sequenced_update({"server_id": server_id, "user_id": user_id}, seq, update))
+
+            failed = set()
+            try:
+                await run_db(self.collection.bulk_write(operations, ordered=False))
+            except BulkWriteError as e:
+                failed = failed_writes(e)
+                if failed:
+                    logger.error(f"Failed to flush {len(failed)} economy updates: {e}")
+            except Exception as e:
+                # The writes may still land; they're resent with the same sequence numbers
+                logger.error(f"Failed to flush {len(operations)} economy updates: {e}")
+                self.stats["failed_ops"] += len(operations)
+                continue
+
+            self.stats["flushes"] += 1
+            self.stats["failed_ops"] += len(failed)
+            self.stats["flushed_ops"] += len(operations) - len(failed)
+            for index, (_, account, seq, last_daily) in enumerate(batch):
+                if index in failed:
+                    continue
+                account.seq = seq
+                account.inflight = None
+                if account.last_daily == last_daily:
+                    account.daily_dirty = False
+
+    def _evict_idle(self):
+        """Drop clean accounts that haven't been used within idle_ttl"""
+        cutoff = time.monotonic() - self.idle_ttl
+        idle = [key for key, account in self._accounts.items() if not account.dirty and account.touched < cutoff]
+        for key in idle:
+            del self._accounts[key]
+        self.stats["evicted"] += len(idle)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get ledger size and counters"""
+        return {
+            "accounts": len(self._accounts),
+            "dirty": sum(1 for account in self._accounts.values() if account.dirty),
+            **self.stats
+        }
+
+class Leaderboard:
+    """Per-guild balance rankings kept current by ledger updates.
+
+    A guild's ranking is loaded once through the (server_id, balance) index,
+    overlaid with balances still pending in the ledger, and then maintained
+    in memory.
+    """
+
+    def __init__(self, collection, ledger: EconomyLedger, idle_ttl: float = 3600.0,
+                 load_timeout: float = 30.0):
+        self.collection = collection
+        self.ledger = ledger
+        self.idle_ttl = idle_ttl
+        self.load_timeout = load_timeout
+
+        self._guilds: Dict[str, RankIndex] = {}
+        self._last_used: Dict[str, float] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+
+        self.stats = {"hits": 0, "loads": 0, "evicted": 0}
+        ledger.listeners.append(self.update)
+
+    def update(self, server_id: str, user_id: str, balance: int):
+        """Apply a balance change to a loaded guild ranking"""
+        index = self._guilds.get(server_id)
+        if index is not None:
+            index.update(user_id, balance)
+
+    async def _index(self, server_id: str) -> RankIndex:
+        self._last_used[server_id] = time.monotonic()
+        index = self._guilds.get(server_id)
+        if index is not None:
+            self.stats["hits"] += 1
+            return index
+
+        task = self._loading.get(server_id)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(server_id))
+            self._loading[server_id] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, server_id: str) -> RankIndex:
+        self.stats["loads"] += 1
+        try:
+            cursor = self.collection.find(
+                {"server_id": server_id, "balance": {"$exists": True}},
+                {"_id": 0, "user_id": 1, "balance": 1}
+            ).sort("balance", -1)
+            users = await run_db(cursor.to_list(length=None), timeout=self.load_timeout)
+        finally:
+            self._loading.pop(server_id, None)
+
+        index = RankIndex()
+        for user_data in users:
+            index.update(user_data["user_id"], user_data["balance"])
+        for user_id, balance in self.ledger.hot_balances(server_id):
+            index.update(user_id, balance)
+
+        self._guilds[server_id] = index
+        return index
+
+    async def top(self, server_id: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """Get the richest users in a guild as (user_id, balance) pairs"""
+        return (await self._index(server_id)).top(limit)
+
+    async def rank(self, server_id: str, user_id: str) -> Tuple[Optional[int], int]:
+        """Get a user's 1-based rank (None if unranked) and the number of ranked users"""
+        index = await self._index(server_id)
+        return index.rank(user_id), len(index)
+
+    def evict_idle(self):
+        """Drop rankings for guilds that haven't been queried within idle_ttl"""
+        cutoff = time.monotonic() - self.idle_ttl
+        idle = [server_id for server_id, last_used in self._last_used.items() if last_used < cutoff]
+        for server_id in idle:
+            self._guilds.pop(server_id, None)
+            del self._last_used[server_id]
+        self.stats["evicted"] += len(idle)
+
+    def get_stats(self) -> Dict[str, int]:
+        """Get loaded guild count and counters"""
+        return {"guilds": len(self._guilds), **self.stats}
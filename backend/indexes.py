@@ -0,0 +1,139 @@
+"""Index declarations and startup bootstrapper for the bot collections"""
+import logging
+import os
+from typing import Any, Dict, List
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Command logs older than this are expired by MongoDB (0 keeps them forever)
+COMMAND_LOG_TTL_DAYS = int(os.environ.get('COMMAND_LOG_TTL_DAYS', '0'))
+MONGO_INDEX_TIMEOUT = float(os.environ.get('MONGO_INDEX_TIMEOUT', '600'))
+
+def index_specs() -> Dict[str, List[Dict[str, Any]]]:
+    """Get the indexes every collection should have"""
+    timestamp_options = {"expireAfterSeconds": COMMAND_LOG_TTL_DAYS * 86400} if COMMAND_LOG_TTL_DAYS else {}
+
+    return {
+        "servers": [
+            {"name": "server_id_unique", "keys": [("server_id", 1)], "options": {"unique": True}},
+        ],
+        "commands": [
+            {"name": "server_id_timestamp", "keys": [("server_id", 1), ("timestamp", -1)], "options": {}},
+            {"name": "timestamp", "keys": [("timestamp", 1)], "options": timestamp_options},
+        ],
+        "warnings": [
+            {"name": "server_id_user_id", "keys": [("server_id", 1), ("user_id", 1)], "options": {}},
+        ],
+        "economy": [
+            {"name": "server_id_user_id_unique", "keys": [("server_id", 1), ("user_id", 1)], "options": {"unique": True}},
+            {"name": "server_id_balance", "keys": [("server_id", 1), ("balance", -1)], "options": {}},
+        ],
+        "levels": [
+            {"name": "server_id_user_id_unique", "keys": [("server_id", 1), ("user_id", 1)], "options": {"unique": True}},
+            {"name": "server_id_xp", "keys": [("server_id", 1), ("xp", -1)], "options": {}},
+        ],
+        "scheduled_jobs": [
+            {"name": "job_id_unique", "keys": [("job_id", 1)], "options": {"unique": True}},
+            {"name": "due_at_job_id", "keys": [("due_at", 1), ("job_id", 1)], "options": {}},
+            {"name": "server_id", "keys": [("server_id", 1)], "options": {}},
+        ],
+        "bulk_jobs": [
+            {"name": "job_id_unique", "keys": [("job_id", 1)], "options": {"unique": True}},
+            {"name": "status_server_id", "keys": [("status", 1), ("server_id", 1)], "options": {}},
+        ],
+    }
+
+def _matches(spec: Dict[str, Any], info: Dict[str, Any]) -> bool:
+    """Check whether an existing index has the spec's keys and options"""
+    if [tuple(key) for key in info["key"]] != [tuple(key) for key in spec["keys"]]:
+        return False
+    if bool(info.get("unique")) != bool(spec["options"].get("unique")):
+        return False
+    return info.get("expireAfterSeconds") == spec["options"].get("expireAfterSeconds")
+
+def _plan(collection_name: str, specs: List[Dict[str, Any]], existing: Dict[str, Any], report: Dict[str, List[str]]):
+    """Sort specs into existing and conflicting ones, returning those still to create"""
+    to_create = []
+    for spec in specs:
+        label = f"{collection_name}.{spec['name']}"
+        same_keys = [
+            info for name, info in existing.items()
+            if name == spec["name"] or [tuple(key) for key in info["key"]] == spec["keys"]
+        ]
+        if not same_keys:
+            to_create.append(spec)
+        elif any(_matches(spec, info) for info in same_keys):
+            report["existing"].append(label)
+        else:
+            report["conflicts"].append(label)
+    return to_create
+
+def _new_report() -> Dict[str, List[str]]:
+    return {"created": [], "existing": [], "conflicts": [], "failed": []}
+
+def _log_report(report: Dict[str, List[str]]):
+    logger.info(
+        f"Indexes: {len(report['created'])} created, {len(report['existing'])} existing, "
+        f"{len(report['conflicts'])} conflicting, {len(report['failed'])} failed"
+    )
+    for label in report["conflicts"]:
+        logger.warning(f"Index {label} exists with different keys or options; drop it to rebuild")
+    for label in report["failed"]:
+        logger.error(f"Index {label} is missing")
+
+def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create missing indexes using a synchronous pymongo database"""
+    report = _new_report()
+    for collection_name, specs in index_specs().items():
+        collection = db[collection_name]
+        try:
+            to_create = _plan(collection_name, specs, collection.index_information(), report)
+        except PyMongoError as e:
+            logger.error(f"Failed to read indexes for {collection_name}: {e}")
+            report["failed"].extend(f"{collection_name}.{spec['name']}" for spec in specs)
+            continue
+
+        for spec in to_create:
+            label = f"{collection_name}.{spec['name']}"
+            try:
+                with pymongo.timeout(MONGO_INDEX_TIMEOUT):
+                    collection.create_index(spec["keys"], name=spec["name"], **spec["options"])
+                report["created"].append(label)
+            except PyMongoError as e:
+                logger.error(f"Failed to create index {label}: {e}")
+                report["failed"].append(label)
+
+    _log_report(report)
+    return report
+
+def index_ready(report: Dict[str, List[str]], label: str) -> bool:
+    """Check whether a report shows an index, e.g. "economy.server_id_user_id_unique", in place"""
+    return label in report["created"] or label in report["existing"]
+
+async def ensure_indexes_async(db) -> Dict[str, List[str]]:
+    """Create missing indexes using a Motor database"""
+    report = _new_report()
+    for collection_name, specs in index_specs().items():
+        collection = db[collection_name]
+        try:
+            to_create = _plan(collection_name, specs, await collection.index_information(), report)
+        except PyMongoError as e:
+            logger.error(f"Failed to read indexes for {collection_name}: {e}")
+            report["failed"].extend(f"{collection_name}.{spec['name']}" for spec in specs)
+            continue
+
+        for spec in to_create:
+            label = f"{collection_name}.{spec['name']}"
+            try:
+                with pymongo.timeout(MONGO_INDEX_TIMEOUT):
+                    await collection.create_index(spec["keys"], name=spec["name"], **spec["options"])
+                report["created"].append(label)
+            except PyMongoError as e:
+                logger.error(f"Failed to create index {label}: {e}")
+                report["failed"].append(label)
+
+    _log_report(report)
+    return report
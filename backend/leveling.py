@@ -0,0 +1,254 @@
+"""Message XP and levels: accumulated in memory, ranked in memory, flushed in bulk"""
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+from database import run_db
+from economy import failed_writes, sequenced_update
+from ranking import RankIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_LEVEL = 1000
+LEVELS_UNIQUE_INDEX = "levels.server_id_user_id_unique"
+
+LEVELS_DEFAULTS = {
+    "enabled": False,
+    "announce": True,           # post level-ups...
+    "announce_channel": None    # ...in this channel, or where the message was sent
+}
+
+def resolve_levels(config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Merge a guild's settings.levels over the defaults, or None when XP is off"""
+    resolved = {**LEVELS_DEFAULTS, **(config or {})}
+    if resolved["enabled"] is not True:
+        return None
+    resolved["announce"] = resolved["announce"] is not False
+    channel = resolved["announce_channel"]
+    resolved["announce_channel"] = str(channel) if isinstance(channel, (str, int)) and str(channel).isdigit() else None
+    return resolved
+
+def xp_to_next_level(level: int) -> int:
+    """XP needed to go from `level` to `level + 1`"""
+    return 5 * level ** 2 + 50 * level + 100
+
+# Total XP needed to reach each level
+LEVEL_THRESHOLDS = [0]
+for _level in range(MAX_LEVEL):
+    LEVEL_THRESHOLDS.append(LEVEL_THRESHOLDS[-1] + xp_to_next_level(_level))
+
+def level_for_xp(xp: int) -> int:
+    return min(bisect_right(LEVEL_THRESHOLDS, xp) - 1, MAX_LEVEL - 1)
+
+class GuildLevels:
+    """A guild's XP ranking plus XP and cooldowns not yet written to MongoDB.
+
+    seqs and inflight track flush sequence numbers per user, as in Account.
+    """
+    __slots__ = ("ranking", "pending", "inflight", "seqs", "last_award", "touched")
+
+    def __init__(self, ranking: RankIndex, seqs: Dict[str, int]):
+        self.ranking = ranking
+        self.pending: Dict[str, int] = {}
+        self.inflight: Dict[str, int] = {}
+        self.seqs = seqs
+        self.last_award: Dict[str, float] = {}
+        self.touched = time.monotonic()
+
+class XPEngine:
+    """Award message XP without touching MongoDB on the message path.
+
+    A guild's XP totals are loaded once through the (server_id, xp) index
+    into a RankIndex, which then answers both "how much XP" and "what rank".
+    Awards update the index and a per-user pending delta; flush() writes the
+    deltas as unordered bulk $inc upserts every flush_interval seconds, once
+    unique_index confirms the unique (server_id, user_id) index exists.
+    """
+
+    def __init__(self, collection, flush_interval: float = 10.0, batch_size: int = 1000,
+                 cooldown: float = 60.0, xp_range: Tuple[int, int] = (15, 25),
+                 idle_ttl: float = 3600.0, load_timeout: float = 30.0, unique_index: bool = False):
+        self.collection = collection
+        self.unique_index = unique_index
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.cooldown = cooldown
+        self.xp_range = xp_range
+        self.idle_ttl = idle_ttl
+        self.load_timeout = load_timeout
+
+        self._guilds: Dict[str, GuildLevels] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._task = None
+
+        self.stats = {"awards": 0, "cooldown_skips": 0, "level_ups": 0, "loads": 0,
+                      "flushes": 0, "flushed_ops": 0, "failed_ops": 0, "held_flushes": 0, "evicted": 0}
+
+    def start(self):
+        """Start the periodic flush task"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        """Stop the flush task and write out all pending XP"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if not self.unique_index:
+            pending = sum(len(guild.pending) + len(guild.inflight) for guild in self._guilds.values())
+            if pending:
+                logger.error(f"Discarding unflushed XP for {pending} users: {LEVELS_UNIQUE_INDEX} is missing")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            self._evict_idle()
+
+    async def _guild(self, server_id: str) -> GuildLevels:
+        guild = self._guilds.get(server_id)
+        if guild is not None:
+            guild.touched = time.monotonic()
+            return guild
+
+        task = self._loading.get(server_id)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._load(server_id))
+            self._loading[server_id] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, server_id: str) -> GuildLevels:
+        self.stats["loads"] += 1
+        try:
+            cursor = self.collection.find(
+                {"server_id": server_id},
+                {"_id": 0, "user_id": 1, "xp": 1, "flush_seq": 1}
+            ).sort("xp", -1)
+            users = await run_db(cursor.to_list(length=None), timeout=self.load_timeout)
+        finally:
+            self._loading.pop(server_id, None)
+
+        ranking = RankIndex()
+        seqs = {}
+        for user_data in users:
+            ranking.update(user_data["user_id"], user_data.get("xp", 0))
+            if user_data.get("flush_seq"):
+                seqs[user_data["user_id"]] = user_data["flush_seq"]
+        guild = self._guilds[server_id] = GuildLevels(ranking, seqs)
+        return guild
+
+    async def award_message(self, server_id: str, user_id: str,
+                            now: Optional[float] = None) -> Optional[int]:
+        """Give XP for a message unless the user is on cooldown.
+
+        Returns the new level when the award crosses a level boundary.
+        """
+        guild = await self._guild(server_id)
+        now = time.monotonic() if now is None else now
+        if now - guild.last_award.get(user_id, float("-inf")) < self.cooldown:
+            self.stats["cooldown_skips"] += 1
+            return None
+        guild.last_award[user_id] = now
+
+        amount = random.randint(*self.xp_range)
+        old_xp = guild.ranking.score(user_id) or 0
+        guild.ranking.update(user_id, old_xp + amount)
+        guild.pending[user_id] = guild.pending.get(user_id, 0) + amount
+        self.stats["awards"] += 1
+
+        new_level = level_for_xp(old_xp + amount)
+        if new_level > level_for_xp(old_xp):
+            self.stats["level_ups"] += 1
+            return new_level
+        return None
+
+    async def get_rank(self, server_id: str, user_id: str) -> Tuple[int, int, Optional[int], int]:
+        """Get a user's (xp, level, rank, ranked users); rank is None without XP"""
+        guild = await self._guild(server_id)
+        xp = guild.ranking.score(user_id) or 0
+        return xp, level_for_xp(xp), guild.ranking.rank(user_id), len(guild.ranking)
+
+    async def top(self, server_id: str, limit: int = 10, offset: int = 0) -> List[Tuple[str, int]]:
+        """Get (user_id, xp) pairs for a page of the guild's ranking"""
+        return (await self._guild(server_id)).ranking.top(limit, offset)
+
+    async def flush(self):
+        """Write pending XP as unordered bulk $inc upserts.
+
+        Deltas carry per-user flush sequence numbers (see sequenced_update), so
+        resending one after a timeout can't award the XP twice.
+        """
+        if not self.unique_index:
+            # A resend would upsert a duplicate document instead of failing; keep the XP in memory
+            self.stats["held_flushes"] += 1
+            return
+
+        snapshot = []
+        for server_id, guild in self._guilds.items():
+            for user_id in [user_id for user_id in guild.pending if user_id not in guild.inflight]:
+                guild.inflight[user_id] = guild.pending.pop(user_id)
+            snapshot.extend((server_id, guild, user_id, guild.seqs.get(user_id, 0) + 1) for user_id in guild.inflight)
+
+        for i in range(0, len(snapshot), self.batch_size):
+            batch = snapshot[i:i + self.batch_size]
+            operations = [
+                sequenced_update(
+                    {"server_id": server_id, "user_id": user_id}, seq,
+                    {"$inc": {"xp": guild.inflight[user_id]}}
+                )
+                for server_id, guild, user_id, seq in batch
+            ]
+
+            failed = set()
+            try:
+                await run_db(self.collection.bulk_write(operations, ordered=False))
+            except BulkWriteError as e:
+                failed = failed_writes(e)
+                if failed:
+                    logger.error(f"Failed to flush {len(failed)} XP updates: {e}")
+            except Exception as e:
+                # The writes may still land; they're resent with the same sequence numbers
+                logger.error(f"Failed to flush {len(operations)} XP updates: {e}")
+                self.stats["failed_ops"] += len(operations)
+                continue
+
+            self.stats["flushes"] += 1
+            self.stats["failed_ops"] += len(failed)
+            self.stats["flushed_ops"] += len(operations) - len(failed)
+            for index, (_, guild, user_id, seq) in enumerate(batch):
+                if index in failed:
+                    continue
+                guild.seqs[user_id] = seq
+                del guild.inflight[user_id]
+
+    def _evict_idle(self):
+        """Forget expired cooldowns, and guilds with nothing pending that went quiet"""
+        now = time.monotonic()
+        idle = []
+        for server_id, guild in self._guilds.items():
+            if not guild.pending and not guild.inflight and now - guild.touched > self.idle_ttl:
+                idle.append(server_id)
+                continue
+            expired = [user_id for user_id, awarded in guild.last_award.items() if now - awarded >= self.cooldown]
+            for user_id in expired:
+                del guild.last_award[user_id]
+        for server_id in idle:
+            del self._guilds[server_id]
+        self.stats["evicted"] += len(idle)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "guilds": len(self._guilds),
+            "pending": sum(len(guild.pending) + len(guild.inflight) for guild in self._guilds.values()),
+            **self.stats
+        }
@@ -0,0 +1,151 @@
+"""Event-loop lag sampler and gateway latency history"""
+import asyncio
+import logging
+import math
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Optional
+from weakref import WeakKeyDictionary
+
+logger = logging.getLogger(__name__)
+
+class LoopMonitor:
+    """Measure event-loop scheduling delay and attribute stalls to the blocking task.
+
+    A sampler coroutine sleeps for `interval` and records how late it woke up.
+    A watchdog thread notices when the sampler stops ticking and, while the
+    loop is still blocked, captures the running task and the loop thread's
+    stack, so the stall can be blamed on the command or event that caused it.
+    """
+
+    def __init__(self, interval: float = 0.25, threshold: float = 0.5, history: int = 240, metrics=None):
+        self.interval = interval
+        self.threshold = threshold
+        self.metrics = metrics
+        self.lag: Deque[float] = deque(maxlen=history)
+        self.stalls: Deque[Dict[str, Any]] = deque(maxlen=20)
+        self.latency: Dict[int, Deque[float]] = {}
+        self.history = history
+        self.stats = {"samples": 0, "stalls": 0, "max_lag": 0.0}
+        self._labels: "WeakKeyDictionary[asyncio.Task, str]" = WeakKeyDictionary()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_tick = 0.0
+        self._blocked: Optional[Dict[str, str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Start the sampler and watchdog (call from within the event loop)"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._task = self._loop.create_task(self._sample())
+        threading.Thread(target=self._watch, name="loop-monitor", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def label_current_task(self, label: str):
+        """Name the work running in the current task, e.g. the command being invoked"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._labels[task] = label
+
+    def _describe(self, task: Optional[asyncio.Task]) -> str:
+        if task is None:
+            return "event loop callback"
+        return self._labels.get(task) or task.get_name()
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._last_tick = time.monotonic()
+            self._record(lag)
+
+    def _record(self, lag: float):
+        self.lag.append(lag)
+        self.stats["samples"] += 1
+        self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+        if self.metrics is not None:
+            self.metrics.observe("bot_event_loop_lag_seconds", lag)
+
+        blocked, self._blocked = self._blocked, None
+        if lag < self.threshold:
+            return
+
+        stall = {
+            "at": datetime.utcnow().isoformat(),
+            "lag": round(lag, 3),
+            "task": blocked["task"] if blocked else "unknown",
+            "where": blocked["where"] if blocked else ""
+        }
+        self.stalls.append(stall)
+        self.stats["stalls"] += 1
+        if self.metrics is not None:
+            self.metrics.inc("bot_event_loop_stalls_total", task=stall["task"])
+        logger.warning(f"Event loop blocked for {lag:.3f}s by {stall['task']} {stall['where']}".rstrip())
+
+    def _watch(self):
+        """Watchdog thread: snapshot what the loop is running while it is blocked"""
+        poll = max(self.threshold / 2, 0.05)
+        while not self._stopped.wait(poll):
+            blocked_for = time.monotonic() - self._last_tick - self.interval
+            if blocked_for < self.threshold or self._blocked is not None:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread)
+            where = ""
+            if frame is not None:
+                where = " <- ".join(
+                    f"{entry.filename.rsplit('/', 1)[-1]}:{entry.lineno} {entry.name}"
+                    for entry in reversed(traceback.extract_stack(frame)[-3:])
+                )
+            self._blocked = {"task": self._describe(asyncio.current_task(self._loop)), "where": where}
+
+    def record_latency(self, latencies: Dict[int, float]):
+        """Add a gateway heartbeat latency sample for each shard"""
+        for shard_id, latency in latencies.items():
+            if math.isfinite(latency):
+                self.latency.setdefault(shard_id, deque(maxlen=self.history)).append(latency)
+
+    def lag_percentile(self, q: float) -> float:
+        if not self.lag:
+            return 0.0
+        ordered = sorted(self.lag)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def get_health(self) -> Dict[str, Any]:
+        """Get loop lag, recent stalls and gateway latency history"""
+        return {
+            "loop_lag": {
+                "current": round(self.lag[-1], 4) if self.lag else 0.0,
+                "p50": round(self.lag_percentile(0.5), 4),
+                "p99": round(self.lag_percentile(0.99), 4),
+                "max": round(self.stats["max_lag"], 4),
+                "threshold": self.threshold,
+                "stalls": self.stats["stalls"]
+            },
+            "recent_stalls": list(self.stalls),
+            "gateway_latency": {
+                str(shard_id): {
+                    "current": round(samples[-1], 4),
+                    "avg": round(sum(samples) / len(samples), 4),
+                    "max": round(max(samples), 4),
+                    "history": [round(sample, 4) for sample in samples]
+                }
+                for shard_id, samples in self.latency.items() if samples
+            }
+        }
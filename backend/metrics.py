@@ -0,0 +1,162 @@
+"""In-process metrics: latency histograms, counters and Prometheus text output"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Latency buckets in seconds, from 1ms to 30s
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0
+)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Time spent in sub-spans (db, discord) by the command running in the current task
+command_spans: ContextVar[Optional[Dict[str, float]]] = ContextVar("command_spans", default=None)
+
+def start_spans() -> Dict[str, float]:
+    """Begin collecting sub-span timings for the current task"""
+    spans = {}
+    command_spans.set(spans)
+    return spans
+
+def add_span_time(span: str, seconds: float):
+    """Add time to a sub-span of the command running in the current task, if any"""
+    spans = command_spans.get()
+    if spans is not None:
+        spans[span] = spans.get(span, 0.0) + seconds
+
+@contextmanager
+def timed_span(span: str):
+    """Time a block as a sub-span of the current command"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span_time(span, time.perf_counter() - started)
+
+class Histogram:
+    """Fixed-bucket histogram with interpolated quantile estimates"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the bucket it falls in"""
+        if not self.count:
+            return 0.0
+
+        target = q * self.count
+        cumulative = 0
+        for i, bucket_count in enumerate(self.counts):
+            if cumulative + bucket_count >= target and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (target - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+LabelKey = Tuple[Tuple[str, str], ...]
+Collector = Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    pairs = list(labels) + sorted((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+class MetricsRegistry:
+    """Named histograms and counters with labels, plus callback-based collectors"""
+
+    def __init__(self, const_labels: Optional[Dict[str, str]] = None):
+        self.const_labels = tuple(sorted((const_labels or {}).items()))
+        self._help: Dict[str, str] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._collectors: List[Collector] = []
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return self.const_labels + tuple(sorted(labels.items()))
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def observe(self, name: str, value: float, **labels: str):
+        """Record a value in a histogram"""
+        series = self._histograms.setdefault(name, {})
+        key = self._key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        """Increment a counter"""
+        series = self._counters.setdefault(name, {})
+        key = self._key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def add_collector(self, collector: Collector):
+        """Register a callback yielding (name, type, labels, value) samples at render time"""
+        self._collectors.append(collector)
+
+    def summary(self, name: str) -> Dict[str, Dict[str, float]]:
+        """Get count and p50/p95/p99 for every series of a histogram"""
+        result = {}
+        for key, histogram in self._histograms.get(name, {}).items():
+            label = ",".join(f"{k}={v}" for k, v in key[len(self.const_labels):]) or name
+            result[label] = {"count": histogram.count, **{f"p{int(q * 100)}": histogram.quantile(q) for q in QUANTILES}}
+        return result
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines = []
+
+        for name, series in self._histograms.items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in series.items():
+                cumulative = 0
+                for bucket, bucket_count in zip(histogram.buckets, histogram.counts):
+                    cumulative += bucket_count
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': repr(bucket)})} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {histogram.count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+
+            quantile_name = f"{name}_quantile"
+            lines.append(f"# HELP {quantile_name} In-process quantile estimates of {name}")
+            lines.append(f"# TYPE {quantile_name} gauge")
+            for key, histogram in series.items():
+                for q in QUANTILES:
+                    lines.append(f"{quantile_name}{_format_labels(key, {'quantile': str(q)})} {histogram.quantile(q)}")
+
+        for name, series in self._counters.items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+
+        collected: Dict[str, Tuple[str, List[str]]] = {}
+        for collector in self._collectors:
+            for name, kind, labels, value in collector():
+                _, samples = collected.setdefault(name, (kind, []))
+                samples.append(f"{name}{_format_labels(self._key(labels))} {value}")
+        for name, (kind, samples) in collected.items():
+            lines.append(f"# HELP {name} {self._help.get(name, name)}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,204 @@
+"""NewsAPI headlines: lookups, caching and embed rendering"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+NEWS_API_URL = "https://newsapi.org/v2/top-headlines"
+
+# Map country codes
+COUNTRY_MAP = {
+    "us": "us",
+    "usa": "us",
+    "united states": "us",
+    "america": "us",
+    "uk": "gb",
+    "britain": "gb",
+    "england": "gb",
+    "united kingdom": "gb",
+    "india": "in",
+    "ind": "in"
+}
+
+# Map categories
+CATEGORY_MAP = {
+    "general": "general",
+    "business": "business",
+    "tech": "technology",
+    "technology": "technology",
+    "sports": "sports",
+    "health": "health",
+    "entertainment": "entertainment",
+    "science": "science"
+}
+
+# Country names for display
+COUNTRY_NAMES = {
+    "us": "🇺🇸 United States",
+    "gb": "🇬🇧 United Kingdom",
+    "in": "🇮🇳 India"
+}
+
+# Category emojis
+CATEGORY_EMOJIS = {
+    "general": "📰",
+    "business": "💼",
+    "technology": "💻",
+    "sports": "⚽",
+    "health": "🏥",
+    "entertainment": "🎬",
+    "science": "🔬"
+}
+
+NewsKey = Tuple[str, str]
+
+class NewsAPIError(Exception):
+    """Raised when NewsAPI answers with a non-200 status"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"NewsAPI returned {status_code}")
+        self.status_code = status_code
+
+async def fetch_headlines(http_client, api_key: str, country_code: str, category_code: str) -> Dict[str, Any]:
+    """Fetch top headlines for a country and category"""
+    params = {
+        "country": country_code,
+        "category": category_code,
+        "pageSize": 5,
+        "apiKey": api_key
+    }
+
+    response = await http_client.get(NEWS_API_URL, params=params)
+    if response.status_code != 200:
+        raise NewsAPIError(response.status_code)
+    return response.json()
+
+def build_news_embed(country_code: str, category_code: str, data: Dict[str, Any]) -> discord.Embed:
+    """Build the headlines embed for a NewsAPI response"""
+    articles = data["articles"][:5]  # Limit to 5 articles
+
+    embed = discord.Embed(
+        title=f"{CATEGORY_EMOJIS.get(category_code, '📰')} {category_code.title()} News",
+        description=f"Latest headlines from {COUNTRY_NAMES.get(country_code, country_code.upper())}",
+        color=discord.Color.blue(),
+        timestamp=datetime.utcnow()
+    )
+
+    for i, article in enumerate(articles, 1):
+        title = article.get("title") or "No title"
+        description = article.get("description") or "No description available"
+        url = article.get("url", "")
+        source = (article.get("source") or {}).get("name", "Unknown")
+
+        # Truncate title and description to fit embed limits
+        if len(title) > 100:
+            title = title[:97] + "..."
+        if len(description) > 200:
+            description = description[:197] + "..."
+
+        embed.add_field(
+            name=f"{i}. {title}",
+            value=f"{description}\n🔗 [Read more]({url}) | 📰 {source}",
+            inline=False
+        )
+
+    embed.set_footer(text=f"Powered by NewsAPI | Total articles: {data.get('totalResults', 0)}")
+    return embed
+
+async def fetch_news_embed(http_client, api_key: str, country_code: str, category_code: str) -> Optional[discord.Embed]:
+    """Fetch headlines and render them, returning None when there are no articles"""
+    data = await fetch_headlines(http_client, api_key, country_code, category_code)
+    if not data.get("articles"):
+        return None
+    return build_news_embed(country_code, category_code, data)
+
+class NewsCache:
+    """TTL cache with stale-while-revalidate and coalesced upstream requests"""
+
+    def __init__(self, fetch: Callable[[str, str], Awaitable[Any]],
+                 ttl: float = 300, stale_ttl: float = 1800):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: Dict[NewsKey, Tuple[Any, float]] = {}
+        self._inflight: Dict[NewsKey, asyncio.Task] = {}
+        self._requested: Dict[NewsKey, float] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "fetches": 0, "errors": 0}
+
+    async def get(self, key: NewsKey) -> Any:
+        """Get the cached value for a key, fetching only when nothing usable is cached"""
+        self._requested[key] = time.monotonic()
+        entry = self._entries.get(key)
+        if entry:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.stats["hits"] += 1
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stats["stale_hits"] += 1
+                self.refresh(key)
+                return value
+
+        self.stats["misses"] += 1
+        return await asyncio.shield(self.refresh(key))
+
+    def refresh(self, key: NewsKey) -> asyncio.Task:
+        """Start a fetch for a key, joining the one already in flight if any"""
+        task = self._inflight.get(key)
+        if task:
+            self.stats["coalesced"] += 1
+            return task
+
+        task = asyncio.get_running_loop().create_task(self._load(key))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def _load(self, key: NewsKey) -> Any:
+        self.stats["fetches"] += 1
+        try:
+            value = await self.fetch(*key)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.warning(f"News fetch failed for {key}: {e}")
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        self._entries[key] = (value, time.monotonic())
+        return value
+
+    def recent_keys(self, window: float) -> List[NewsKey]:
+        """Get the keys requested within the last `window` seconds, forgetting older ones"""
+        cutoff = time.monotonic() - window
+        for key in [key for key, requested in self._requested.items() if requested < cutoff]:
+            del self._requested[key]
+        return sorted(self._requested)
+
+    async def prefetch(self, keys: Iterable[NewsKey], stagger: float = 2.0):
+        """Refresh keys one at a time, stopping early if NewsAPI rate limits us"""
+        started = time.monotonic()
+        refreshed = 0
+        failed = 0
+
+        for i, key in enumerate(keys):
+            if i:
+                await asyncio.sleep(stagger)
+            try:
+                await asyncio.shield(self.refresh(key))
+                refreshed += 1
+            except NewsAPIError as e:
+                failed += 1
+                if e.status_code == 429:
+                    logger.warning("News prefetch rate limited by NewsAPI, skipping the rest of this cycle")
+                    break
+            except Exception:
+                failed += 1
+
+        logger.info(f"News prefetch: {refreshed} refreshed, {failed} failed in {time.monotonic() - started:.1f}s")
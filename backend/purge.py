@@ -0,0 +1,159 @@
+"""Paced bulk message purges that go beyond Discord's 100-message limit"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import discord
+
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+BULK_DELETE_LIMIT = 100
+# Discord rejects bulk deletes containing messages older than 14 days; keep a margin
+# so messages don't cross the line between being scanned and being deleted
+BULK_DELETE_MAX_AGE = timedelta(days=14) - timedelta(minutes=5)
+
+MessageCheck = Callable[[discord.Message], bool]
+
+class PurgeInProgress(Exception):
+    """Raised when a channel is already being purged"""
+
+def message_filter(user_ids: Iterable[int] = (), contains: Optional[str] = None,
+                   attachments: bool = False) -> MessageCheck:
+    """Build a check matching messages by author, content and attachments"""
+    user_ids = set(user_ids)
+    contains = contains.lower() if contains else None
+
+    def check(message: discord.Message) -> bool:
+        if user_ids and message.author.id not in user_ids:
+            return False
+        if contains and contains not in message.content.lower():
+            return False
+        if attachments and not message.attachments:
+            return False
+        return True
+
+    return check
+
+# Discord rate-limits deletes per channel, so only one purge runs in a channel at a time
+_active_channels: Set[int] = set()
+
+class PurgeJob:
+    """Delete up to `limit` matching messages from a channel.
+
+    History is paged by a producer task while the consumer deletes, so fetches
+    and deletes (separate rate-limit buckets) overlap. Messages newer than 14
+    days are bulk-deleted 100 at a time; older ones need one request each and
+    are paced more slowly. discord.py still handles any 429 that slips through.
+    """
+
+    def __init__(self, channel, limit: int, check: Optional[MessageCheck] = None,
+                 before: Optional[discord.abc.Snowflake] = None, max_scan: Optional[int] = None,
+                 on_progress: Optional[Callable[[Dict[str, int]], Awaitable[None]]] = None,
+                 progress_interval: float = 3.0, bulk_rate: float = 1.0, single_rate: float = 1.0):
+        self.channel = channel
+        self.limit = limit
+        self.check = check or (lambda message: True)
+        self.before = before
+        self.max_scan = max_scan
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.bulk_pacer = TokenBucket(bulk_rate, 1)
+        self.single_pacer = TokenBucket(single_rate, 5)
+        self.stats = {"scanned": 0, "matched": 0, "deleted": 0, "bulk_requests": 0, "single_deletes": 0, "failed": 0}
+        self._last_report = 0.0
+
+    async def run(self) -> Dict[str, int]:
+        """Run the purge, returning its counters"""
+        if self.channel.id in _active_channels:
+            raise PurgeInProgress(f"#{self.channel} is already being purged")
+        _active_channels.add(self.channel.id)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2)
+        producer = asyncio.create_task(self._scan(queue))
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    break
+                bulk, messages = batch
+                if bulk and len(messages) > 1:
+                    await self._bulk_delete(messages)
+                else:
+                    await self._single_delete(messages)
+                await self._report()
+            await producer
+        finally:
+            producer.cancel()
+            _active_channels.discard(self.channel.id)
+        return self.stats
+
+    async def _scan(self, queue: asyncio.Queue):
+        """Page through history, queueing matches in bulk-deletable and single batches"""
+        try:
+            cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+            batch: List[discord.Message] = []
+            bulk = True
+            async for message in self.channel.history(limit=self.max_scan, before=self.before):
+                self.stats["scanned"] += 1
+                if not self.check(message):
+                    continue
+
+                # History runs newest first, so once messages are too old they all are
+                if bulk and message.created_at < cutoff:
+                    if batch:
+                        await queue.put((True, batch))
+                    batch, bulk = [], False
+
+                batch.append(message)
+                self.stats["matched"] += 1
+                if len(batch) == BULK_DELETE_LIMIT:
+                    await queue.put((bulk, batch))
+                    batch = []
+                if self.stats["matched"] >= self.limit:
+                    break
+            if batch:
+                await queue.put((bulk, batch))
+        except Exception:
+            # Let the consumer stop; run() re-raises when it awaits this task
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _bulk_delete(self, messages: List[discord.Message]):
+        await self.bulk_pacer.acquire()
+        try:
+            await self.channel.delete_messages(messages)
+            self.stats["bulk_requests"] += 1
+            self.stats["deleted"] += len(messages)
+        except discord.HTTPException as e:
+            logger.warning(f"Bulk delete of {len(messages)} messages in {self.channel.id} failed, deleting singly: {e}")
+            await self._single_delete(messages)
+
+    async def _single_delete(self, messages: List[discord.Message]):
+        for message in messages:
+            await self.single_pacer.acquire()
+            try:
+                await message.delete()
+                self.stats["single_deletes"] += 1
+                self.stats["deleted"] += 1
+            except discord.NotFound:
+                pass
+            except discord.HTTPException as e:
+                logger.warning(f"Failed to delete message {message.id}: {e}")
+                self.stats["failed"] += 1
+            await self._report()
+
+    async def _report(self):
+        """Call on_progress at most once per progress_interval"""
+        now = time.monotonic()
+        if self.on_progress is None or now - self._last_report < self.progress_interval:
+            return
+        self._last_report = now
+        try:
+            await self.on_progress(dict(self.stats))
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to report purge progress: {e}")
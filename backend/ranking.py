@@ -0,0 +1,41 @@
+"""Sorted score index for per-guild rankings"""
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+class RankIndex:
+    """Users ordered by descending score, ties broken by user id.
+
+    Lookups and rank queries are binary searches. Updates are a binary search
+    plus a list insert/delete, which is a memmove even for large guilds.
+    """
+
+    def __init__(self):
+        self._entries: List[Tuple[int, str]] = []
+        self._scores: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def update(self, user_id: str, score: int):
+        """Set a user's score"""
+        old_score = self._scores.get(user_id)
+        if old_score == score:
+            return
+        if old_score is not None:
+            del self._entries[bisect_left(self._entries, (-old_score, user_id))]
+        self._scores[user_id] = score
+        insort(self._entries, (-score, user_id))
+
+    def score(self, user_id: str) -> Optional[int]:
+        return self._scores.get(user_id)
+
+    def rank(self, user_id: str) -> Optional[int]:
+        """Get a user's 1-based rank, or None if they aren't ranked"""
+        score = self._scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._entries, (-score, user_id)) + 1
+
+    def top(self, limit: int = 10, offset: int = 0) -> List[Tuple[str, int]]:
+        """Get (user_id, score) pairs for a page of the ranking"""
+        return [(user_id, -score) for score, user_id in self._entries[offset:offset + limit]]
@@ -0,0 +1,47 @@
+"""Token buckets for pacing outgoing requests"""
+import asyncio
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Allow `rate` actions per second on average, with bursts up to `capacity`"""
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def retry_after(self, now: Optional[float] = None) -> float:
+        """Get the seconds until a token is available, without taking it"""
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def try_acquire(self, now: Optional[float] = None) -> float:
+        """Take a token if one is available.
+
+        Returns 0 on success, otherwise the seconds until a token is available.
+        """
+        retry_after = self.retry_after(now)
+        if not retry_after:
+            self.tokens -= 1
+        return retry_after
+
+    def is_full(self, now: float) -> bool:
+        """Check whether the bucket has refilled completely, i.e. it's no different from a new one"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            retry_after = self.try_acquire()
+            if not retry_after:
+                return
+            await asyncio.sleep(retry_after)
@@ -0,0 +1,288 @@
+"""Durable delayed jobs (reminders, temporary bans, lockdown ends) driven by one heap"""
+import asyncio
+import heapq
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from database import run_db
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Awaitable[None]]
+
+def to_timestamp(when: datetime) -> float:
+    """Convert a naive UTC datetime, as stored in MongoDB, to a Unix timestamp"""
+    return when.replace(tzinfo=timezone.utc).timestamp()
+
+def from_timestamp(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+class JobScheduler:
+    """Run jobs at their due time from a single task.
+
+    Every job is a document in MongoDB; memory only holds a (due, job_id)
+    heap entry for jobs due within the next `horizon` seconds. The window is
+    read through the due_at index and extended every horizon/2 seconds, and
+    the first read also picks up everything that fell due while the bot was
+    down. Due jobs are fetched, run and deleted in batches, so a backlog is
+    cleared with a handful of queries rather than one per job.
+
+    Jobs for guilds that owns() rejects are skipped, but the earliest skipped
+    due time per guild is remembered, and that guild's part of the loaded
+    window is read again once owns() accepts it (e.g. after an outage).
+
+    Jobs run at least once: a job is deleted only after its handler returns,
+    and a failing handler is retried with backoff up to max_attempts.
+    Handlers should swallow errors that retrying can't fix.
+    """
+
+    def __init__(self, collection, owns: Callable[[str], bool], horizon: float = 300.0,
+                 batch_size: int = 500, concurrency: int = 10, max_attempts: int = 5,
+                 retry_delay: float = 30.0):
+        self.collection = collection
+        self.owns = owns
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.handlers: Dict[str, Handler] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self._queued = set()
+        self._loaded_until: Optional[float] = None
+        self._deferred: Dict[str, float] = {}
+        self._next_load = 0.0
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        self.stats = {"scheduled": 0, "completed": 0, "retried": 0, "failed": 0,
+                      "cancelled": 0, "loaded": 0, "dispatch_batches": 0}
+
+    def handler(self, kind: str):
+        """Register the coroutine that runs jobs of a kind"""
+        def register(func: Handler) -> Handler:
+            self.handlers[kind] = func
+            return func
+        return register
+
+    def start(self):
+        """Load pending jobs and start dispatching; safe to call more than once"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self):
+        """Stop dispatching; unfinished jobs stay in MongoDB for the next start"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def schedule(self, kind: str, server_id: str, due_at: datetime, **payload) -> str:
+        """Persist a job and queue it if it falls in the loaded window"""
+        job = {
+            "job_id": str(uuid.uuid4()),
+            "kind": kind,
+            "server_id": server_id,
+            "due_at": due_at,
+            "created_at": datetime.utcnow(),
+            "attempts": 0,
+            "payload": payload
+        }
+        await run_db(self.collection.insert_one(job))
+        self.stats["scheduled"] += 1
+        self._push(to_timestamp(due_at), job["job_id"])
+        return job["job_id"]
+
+    async def cancel(self, job_id: str) -> bool:
+        """Delete a job; its heap entry is skipped when it comes due"""
+        result = await run_db(self.collection.delete_one({"job_id": job_id}))
+        self.stats["cancelled"] += result.deleted_count
+        return bool(result.deleted_count)
+
+    async def drop_guild(self, server_id: str) -> int:
+        """Delete every job for a guild the bot has left"""
+        self._deferred.pop(server_id, None)
+        result = await run_db(self.collection.delete_many({"server_id": server_id}))
+        self.stats["cancelled"] += result.deleted_count
+        return result.deleted_count
+
+    def recheck(self):
+        """Load skipped jobs for guilds owns() now accepts without waiting for the next load"""
+        if any(self.owns(server_id) for server_id in self._deferred):
+            self._next_load = 0.0
+            self._wakeup.set()
+
+    def _push(self, due: float, job_id: str):
+        # Jobs past the loaded window are read from MongoDB when the window reaches them
+        if self._loaded_until is None or due > self._loaded_until or job_id in self._queued:
+            return
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (due, job_id))
+        self._queued.add(job_id)
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            if now >= self._next_load:
+                await self._extend_window(now + self.horizon)
+
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                entry = heapq.heappop(self._heap)
+                self._queued.discard(entry[1])
+                due.append(entry)
+            if due:
+                await self._dispatch(due)
+                continue
+
+            next_due = self._heap[0][0] if self._heap else float("inf")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, min(next_due, self._next_load) - now))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _extend_window(self, until: float):
+        """Queue jobs due up to `until` that aren't queued yet"""
+        query = {"due_at": {"$lte": from_timestamp(until)}}
+        if self._loaded_until is not None:
+            query["due_at"]["$gt"] = from_timestamp(self._loaded_until)
+
+        try:
+            await self._recover_deferred()
+            await self._load(query)
+        except Exception as e:
+            logger.error(f"Failed to load scheduled jobs: {e}")
+            self._next_load = time.time() + self.retry_delay
+            return
+
+        self._loaded_until = until
+        self._next_load = until - self.horizon / 2
+
+    async def _recover_deferred(self):
+        """Queue the already loaded part of the window for guilds owns() now accepts"""
+        if self._loaded_until is None:
+            # Nothing loaded yet, so the window query reads these jobs anyway
+            return
+        for server_id in [server_id for server_id in self._deferred if self.owns(server_id)]:
+            since = self._deferred.pop(server_id)
+            try:
+                await self._load({"server_id": server_id, "due_at": {
+                    "$gte": from_timestamp(since), "$lte": from_timestamp(self._loaded_until)
+                }})
+            except Exception:
+                self._defer(server_id, since)
+                raise
+
+    def _defer(self, server_id: str, due: float):
+        if due < self._deferred.get(server_id, float("inf")):
+            self._deferred[server_id] = due
+
+    async def _load(self, query: Dict[str, Any]):
+        """Queue the jobs matching a query, remembering the ones owns() rejects"""
+        last = None
+        while True:
+            # Page by (due_at, job_id) so a large backlog never becomes one giant result
+            page_query = query if last is None else {"$and": [query, {"$or": [
+                {"due_at": {"$gt": last[0]}},
+                {"due_at": last[0], "job_id": {"$gt": last[1]}}
+            ]}]}
+            cursor = self.collection.find(
+                page_query, {"_id": 0, "job_id": 1, "server_id": 1, "due_at": 1}
+            ).sort([("due_at", 1), ("job_id", 1)]).limit(self.batch_size)
+            jobs = await run_db(cursor.to_list(length=None))
+
+            for job in jobs:
+                due = to_timestamp(job["due_at"])
+                if not self.owns(job["server_id"]):
+                    self._defer(job["server_id"], due)
+                elif job["job_id"] not in self._queued:
+                    heapq.heappush(self._heap, (due, job["job_id"]))
+                    self._queued.add(job["job_id"])
+                    self.stats["loaded"] += 1
+            if len(jobs) < self.batch_size:
+                break
+            last = (jobs[-1]["due_at"], jobs[-1]["job_id"])
+
+    async def _dispatch(self, entries: List[Tuple[float, str]]):
+        """Run a batch of due jobs and delete the ones that finished"""
+        try:
+            jobs = await run_db(self.collection.find(
+                {"job_id": {"$in": [job_id for _, job_id in entries]}}, {"_id": 0}
+            ).to_list(length=None))
+        except Exception as e:
+            logger.error(f"Failed to fetch {len(entries)} due jobs: {e}")
+            retry_at = time.time() + self.retry_delay
+            for _, job_id in entries:
+                self._push(retry_at, job_id)
+            return
+        self.stats["dispatch_batches"] += 1
+
+        now = time.time()
+        runnable = []
+        for job in jobs:
+            due = to_timestamp(job["due_at"])
+            if due > now:
+                # Rescheduled since it was queued
+                self._push(due, job["job_id"])
+            else:
+                runnable.append(job)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def execute(job):
+            async with semaphore:
+                return await self._execute(job)
+
+        results = await asyncio.gather(*(execute(job) for job in runnable))
+        finished = [job["job_id"] for job, done in zip(runnable, results) if done]
+        if finished:
+            try:
+                await run_db(self.collection.delete_many({"job_id": {"$in": finished}}))
+            except Exception as e:
+                # They'll run again on the next start
+                logger.error(f"Failed to delete {len(finished)} finished jobs: {e}")
+
+    async def _execute(self, job: Dict[str, Any]) -> bool:
+        """Run one job, returning True when it should be deleted"""
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            logger.error(f"No handler for scheduled {job['kind']} job {job['job_id']}")
+            self.stats["failed"] += 1
+            return True
+
+        try:
+            await handler(job)
+        except Exception as e:
+            attempts = job.get("attempts", 0) + 1
+            if attempts >= self.max_attempts:
+                logger.error(f"Scheduled {job['kind']} job {job['job_id']} failed {attempts} times, giving up: {e}")
+                self.stats["failed"] += 1
+                return True
+
+            retry_at = time.time() + self.retry_delay * 2 ** (attempts - 1)
+            logger.warning(f"Scheduled {job['kind']} job {job['job_id']} failed, retrying: {e}")
+            try:
+                await run_db(self.collection.update_one(
+                    {"job_id": job["job_id"]},
+                    {"$set": {"due_at": from_timestamp(retry_at), "attempts": attempts}}
+                ))
+            except Exception as update_error:
+                logger.error(f"Failed to reschedule job {job['job_id']}: {update_error}")
+            self._push(retry_at, job["job_id"])
+            self.stats["retried"] += 1
+            return False
+
+        self.stats["completed"] += 1
+        return True
+
+    def get_stats(self) -> Dict[str, int]:
+        return {"queued": len(self._heap), "deferred_guilds": len(self._deferred), **self.stats}
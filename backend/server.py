@@ -1,11 +1,13 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pymongo import MongoClient
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pymongo import MongoClient, ReturnDocument
+from pydantic import BaseModel, field_validator
 from typing import Optional, List, Dict, Any
 import os
-from datetime import datetime
+import json
+import hashlib
+from datetime import datetime, timedelta
 import uuid
 import uvicorn
 from contextlib import asynccontextmanager
@@ -13,9 +15,15 @@ import asyncio
 import subprocess
 import signal
 import sys
+import time
+import httpx
+from indexes import ensure_indexes
 
-# Bot process variable
-bot_process = None
+# Bot worker processes, keyed by worker id
+bot_workers: Dict[int, Dict[str, Any]] = {}
+bot_shard_count = 0
+# Held while starting or stopping workers, so overlapping requests can't spawn a second cluster
+bot_control_lock = asyncio.Lock()
 
 # Environment variables
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
@@ -29,39 +37,345 @@ db = client[DB_NAME]
 servers_collection = db.servers
 commands_collection = db.commands
 logs_collection = db.logs
+bot_shards_collection = db.bot_shards
 
 # Bot credentials
 DISCORD_BOT_TOKEN = os.environ.get('DISCORD_BOT_TOKEN', 'MTE2MjA1MzM3OTMxMzM4MTUyOA.Gqbogw.-VgCiUDpRBRHYRj6LOON2HIRcDfXKu7CorjqYw')
 DISCORD_APP_ID = os.environ.get('DISCORD_APP_ID', '1162053379313381528')
 
-def start_discord_bot():
-    """Start the Discord bot as a subprocess"""
-    global bot_process
+# Cluster settings (0 processes means one per CPU, 0 shards asks Discord)
+BOT_CLUSTER_PROCESSES = int(os.environ.get('BOT_CLUSTER_PROCESSES', '1'))
+BOT_SHARD_COUNT = int(os.environ.get('BOT_SHARD_COUNT', '0'))
+BOT_SUPERVISE_INTERVAL = float(os.environ.get('BOT_SUPERVISE_INTERVAL', '5'))
+BOT_MAX_RESTART_DELAY = float(os.environ.get('BOT_MAX_RESTART_DELAY', '60'))
+BOT_SHARD_STATUS_MAX_AGE = float(os.environ.get('BOT_SHARD_STATUS_MAX_AGE', '60'))
+
+# Worker N serves metrics on BOT_METRICS_BASE_PORT + N (0 disables them)
+BOT_METRICS_BASE_PORT = int(os.environ.get('BOT_METRICS_BASE_PORT', '9100'))
+BOT_METRICS_TIMEOUT = float(os.environ.get('BOT_METRICS_TIMEOUT', '2'))
+
+# Give up on a control message if a worker's stdin pipe stays full this long
+BOT_CONTROL_TIMEOUT = float(os.environ.get('BOT_CONTROL_TIMEOUT', '2'))
+
+# /api/bot/status is served from a snapshot rebuilt this often, and never older than BOT_STATUS_MAX_AGE
+BOT_STATUS_REFRESH_INTERVAL = float(os.environ.get('BOT_STATUS_REFRESH_INTERVAL', '5'))
+BOT_STATUS_MAX_AGE = float(os.environ.get('BOT_STATUS_MAX_AGE', '15'))
+
+async def get_shard_count(processes):
+    """Get the configured shard count, or Discord's recommendation"""
+    if BOT_SHARD_COUNT > 0:
+        return max(BOT_SHARD_COUNT, processes)
     try:
-        bot_process = subprocess.Popen([
+        async with httpx.AsyncClient(timeout=10.0) as client:
+            response = await client.get(
+                "https://discord.com/api/v10/gateway/bot",
+                headers={"Authorization": f"Bot {DISCORD_BOT_TOKEN}"}
+            )
+        response.raise_for_status()
+        return max(response.json()["shards"], processes)
+    except Exception as e:
+        print(f"Error fetching recommended shard count, using {processes}: {e}")
+        return processes
+
+def plan_shards(processes, shard_count):
+    """Split shard ids into contiguous ranges, one per worker"""
+    base, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        size = base + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+def spawn_bot_worker(worker_id):
+    """Start (or restart) one bot worker process"""
+    worker = bot_workers[worker_id]
+    env = dict(
+        os.environ,
+        WORKER_ID=str(worker_id),
+        SHARD_IDS=",".join(str(shard_id) for shard_id in worker["shard_ids"]),
+        SHARD_COUNT=str(bot_shard_count),
+        WORKER_COUNT=str(len(bot_workers)),
+        METRICS_PORT=str(BOT_METRICS_BASE_PORT + worker_id if BOT_METRICS_BASE_PORT else 0)
+    )
+    try:
+        worker["process"] = subprocess.Popen([
             sys.executable, "/app/backend/bot.py"
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print(f"Discord bot started with PID: {bot_process.pid}")
+        ], stdin=subprocess.PIPE, env=env)
+        worker["started_at"] = time.time()
+        print(f"Discord bot worker {worker_id} (shards {worker['shard_ids']}) started with PID: {worker['process'].pid}")
     except Exception as e:
-        print(f"Error starting Discord bot: {e}")
+        worker["process"] = None
+        print(f"Error starting Discord bot worker {worker_id}: {e}")
 
-def stop_discord_bot():
-    """Stop the Discord bot"""
-    global bot_process
-    if bot_process:
-        bot_process.terminate()
-        bot_process.wait()
-        print("Discord bot stopped")
+def worker_running(worker):
+    return worker.get("process") is not None and worker["process"].poll() is None
+
+async def start_discord_bot():
+    """Start the Discord bot as a cluster of sharded worker processes"""
+    global bot_shard_count
+    processes = BOT_CLUSTER_PROCESSES or os.cpu_count() or 1
+    
+    if not bot_workers:
+        bot_shard_count = await get_shard_count(processes)
+        for worker_id, shard_ids in enumerate(plan_shards(min(processes, bot_shard_count), bot_shard_count)):
+            bot_workers[worker_id] = {"shard_ids": shard_ids, "process": None, "restarts": 0, "restart_delay": 1.0}
+    
+    for worker_id, worker in bot_workers.items():
+        worker["desired"] = True
+        if not worker_running(worker):
+            spawn_bot_worker(worker_id)
+
+async def supervise_bot_workers():
+    """Restart crashed workers individually with exponential backoff"""
+    while True:
+        await asyncio.sleep(BOT_SUPERVISE_INTERVAL)
+        now = time.time()
+        for worker_id, worker in bot_workers.items():
+            if not worker.get("desired") or worker_running(worker):
+                # Reset the backoff once a worker has stayed up for a while
+                if worker_running(worker) and now - worker["started_at"] > BOT_MAX_RESTART_DELAY:
+                    worker["restart_delay"] = 1.0
+                continue
+            if now < worker.get("next_restart", 0):
+                continue
+            if worker.get("process") is not None:
+                print(f"Discord bot worker {worker_id} exited with code {worker['process'].returncode}, restarting")
+            worker["restarts"] += 1
+            worker["next_restart"] = now + worker["restart_delay"]
+            worker["restart_delay"] = min(worker["restart_delay"] * 2, BOT_MAX_RESTART_DELAY)
+            spawn_bot_worker(worker_id)
+
+def worker_for_server(server_id):
+    """Get the worker whose shards include a guild, if the id is a snowflake"""
+    try:
+        shard_id = (int(server_id) >> 22) % bot_shard_count
+    except (ValueError, ZeroDivisionError):
+        return None
+    for worker in bot_workers.values():
+        if shard_id in worker["shard_ids"]:
+            return worker
+    return None
+
+def write_control_line(pipe, line):
+    pipe.write(line)
+    pipe.flush()
+
+async def notify_bot(message, server_id=None):
+    """Send a control message to the worker owning a guild, or to every worker.
+
+    Pipe writes run in a thread so a worker that stops reading can't block the
+    API. While a write to a worker is still stuck, further messages to it are
+    dropped rather than interleaved with the stuck one.
+    """
+    owner = worker_for_server(server_id) if server_id is not None else None
+    targets = [owner] if owner else list(bot_workers.values())
+    line = (json.dumps(message) + "\n").encode()
+    
+    delivered = False
+    for worker in targets:
+        process = worker.get("process")
+        if not worker_running(worker) or process.stdin is None:
+            continue
+        
+        pending = worker.get("control_write")
+        if pending is not None and not pending.done():
+            print(f"Discord bot worker (pid {process.pid}) isn't reading control messages, dropping one")
+            continue
+        
+        write = asyncio.ensure_future(asyncio.to_thread(write_control_line, process.stdin, line))
+        worker["control_write"] = write
+        try:
+            await asyncio.wait_for(asyncio.shield(write), BOT_CONTROL_TIMEOUT)
+            delivered = True
+        except asyncio.TimeoutError:
+            print(f"Timed out notifying Discord bot worker (pid {process.pid})")
+        except (BrokenPipeError, OSError) as e:
+            print(f"Error notifying Discord bot worker: {e}")
+    return delivered
+
+CONFIG_FIELDS = ("prefix", "welcome_channel", "log_channel", "auto_role", "settings")
+
+def config_updates(config):
+    """Flatten the fields a request actually sent into per-field $set paths.
+
+    Settings are set section by section ("settings.<section>"), so saving one
+    section from the dashboard leaves the ones the bot manages alone.
+    """
+    sent = config.dict(exclude_unset=True)
+    updates = {field: value for field, value in sent.items() if field != "settings"}
+    for section, value in (sent.get("settings") or {}).items():
+        updates[f"settings.{section}"] = value
+    return updates
+
+def config_changes(previous, updates):
+    """Get the updated fields whose stored value differs"""
+    changes = {}
+    old_settings = previous.get("settings") or {}
+    for field, value in updates.items():
+        if field.startswith("settings."):
+            old_value = old_settings.get(field.split(".", 1)[1])
+        elif field in CONFIG_FIELDS:
+            old_value = previous.get(field)
+        else:
+            continue
+        if old_value != value:
+            changes[field] = value
+    return changes
+
+def wait_for_worker(worker_id, process):
+    """Wait for a terminated worker to exit, killing it after 15s"""
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    print(f"Discord bot worker {worker_id} stopped")
+
+async def stop_discord_bot():
+    """Stop every bot worker, signalling them all first and waiting for them together"""
+    stopping = []
+    for worker_id, worker in bot_workers.items():
+        worker["desired"] = False
+        process = worker.get("process")
+        if process and process.poll() is None:
+            process.terminate()
+            stopping.append((worker_id, process))
+    
+    await asyncio.gather(*(asyncio.to_thread(wait_for_worker, worker_id, process) for worker_id, process in stopping))
+
+def get_worker_status():
+    """Get process and shard state for every worker"""
+    cutoff = datetime.utcnow() - timedelta(seconds=BOT_SHARD_STATUS_MAX_AGE)
+    shards = {
+        shard["shard_id"]: shard
+        for shard in bot_shards_collection.find({}, {"_id": 0})
+    }
+    
+    workers = []
+    for worker_id, worker in sorted(bot_workers.items()):
+        running = worker_running(worker)
+        worker_shards = []
+        for shard_id in worker["shard_ids"]:
+            shard = shards.get(shard_id)
+            fresh = running and shard and shard["updated_at"] >= cutoff
+            worker_shards.append({
+                "shard_id": shard_id,
+                "status": shard["status"] if fresh else ("starting" if running else "stopped"),
+                "latency": shard.get("latency") if fresh else None,
+                "guilds": shard.get("guilds", 0) if fresh else 0
+            })
+        workers.append({
+            "worker_id": worker_id,
+            "pid": worker["process"].pid if running else None,
+            "status": "running" if running else "stopped",
+            "uptime": int(time.time() - worker["started_at"]) if running else None,
+            "restarts": worker["restarts"],
+            "shards": worker_shards
+        })
+    return workers
+
+async def fetch_from_workers(path):
+    """GET a path from every running worker's metrics server concurrently"""
+    running = [worker_id for worker_id, worker in bot_workers.items() if worker_running(worker)]
+    if not BOT_METRICS_BASE_PORT or not running:
+        return {}
+    
+    async with httpx.AsyncClient(timeout=BOT_METRICS_TIMEOUT) as client:
+        async def fetch(worker_id):
+            try:
+                response = await client.get(f"http://127.0.0.1:{BOT_METRICS_BASE_PORT + worker_id}{path}")
+                response.raise_for_status()
+                return response
+            except httpx.HTTPError as e:
+                print(f"Error fetching {path} from Discord bot worker {worker_id}: {e}")
+                return None
+        
+        responses = await asyncio.gather(*(fetch(worker_id) for worker_id in running))
+    return dict(zip(running, responses))
+
+def merge_metrics(texts):
+    """Merge Prometheus text from several workers, grouping samples by metric family"""
+    families: Dict[str, Dict[str, List[str]]] = {}
+    for text in texts:
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                family = line.split(" ", 3)[2]
+                entry = families.setdefault(family, {"meta": [], "samples": []})
+                if len(entry["meta"]) < 2 and line not in entry["meta"]:
+                    entry["meta"].append(line)
+            elif line and family is not None:
+                families[family]["samples"].append(line)
+    
+    lines = []
+    for entry in families.values():
+        lines.extend(entry["meta"])
+        lines.extend(entry["samples"])
+    return "\n".join(lines) + "\n"
+
+status_snapshot: Dict[str, Any] = {}
+status_refresh = None
+
+async def build_status_snapshot():
+    """Collect worker state, worker health and collection sizes for /api/bot/status"""
+    global status_snapshot
+    workers = await asyncio.to_thread(get_worker_status)
+    
+    # Loop lag, stalls and gateway latency history reported by each worker
+    health = await fetch_from_workers("/health")
+    for worker in workers:
+        response = health.get(worker["worker_id"])
+        worker["health"] = response.json() if response is not None else None
+    
+    # Read from collection metadata instead of counting every document
+    server_count, total_commands = await asyncio.to_thread(lambda: (
+        servers_collection.estimated_document_count(),
+        commands_collection.estimated_document_count()
+    ))
+    
+    started = [bot_workers[worker["worker_id"]]["started_at"] for worker in workers if worker["status"] == "running"]
+    status_snapshot = {
+        "workers": workers,
+        "servers": server_count,
+        "commands_executed": total_commands,
+        "started_at": min(started) if started else None,
+        "refreshed_at": time.time()
+    }
+
+async def refresh_status_snapshot():
+    """Rebuild the status snapshot, sharing one rebuild between concurrent callers"""
+    global status_refresh
+    if status_refresh is None or status_refresh.done():
+        status_refresh = asyncio.create_task(build_status_snapshot())
+    await asyncio.shield(status_refresh)
+
+async def maintain_status_snapshot():
+    """Keep the status snapshot fresh so requests never wait on MongoDB or the workers"""
+    while True:
+        try:
+            await refresh_status_snapshot()
+        except Exception as e:
+            print(f"Error refreshing bot status: {e}")
+        await asyncio.sleep(BOT_STATUS_REFRESH_INTERVAL)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     print("Starting Discord Bot Server...")
-    start_discord_bot()
+    index_task = asyncio.create_task(asyncio.to_thread(ensure_indexes, db))
+    async with bot_control_lock:
+        await start_discord_bot()
+    supervisor_task = asyncio.create_task(supervise_bot_workers())
+    status_task = asyncio.create_task(maintain_status_snapshot())
     yield
     # Shutdown
     print("Stopping Discord Bot Server...")
-    stop_discord_bot()
+    status_task.cancel()
+    supervisor_task.cancel()
+    async with bot_control_lock:
+        await stop_discord_bot()
 
 app = FastAPI(
     title="Discord Bot Management API",
@@ -80,6 +394,12 @@ app.add_middleware(
 )
 
 # Pydantic models
+class LevelSettings(BaseModel):
+    """settings.levels; message XP stays off until a guild enables it"""
+    enabled: bool = False
+    announce: bool = True
+    announce_channel: Optional[str] = None
+
 class ServerConfig(BaseModel):
     server_id: str
     server_name: str
@@ -89,6 +409,13 @@ class ServerConfig(BaseModel):
     auto_role: Optional[str] = None
     settings: Dict[str, Any] = {}
 
+    @field_validator("settings")
+    @classmethod
+    def check_level_settings(cls, settings):
+        if settings.get("levels") is not None:
+            settings["levels"] = LevelSettings(**settings["levels"]).dict()
+        return settings
+
 class CommandLog(BaseModel):
     command_id: str
     server_id: str
@@ -104,6 +431,209 @@ class BotStatus(BaseModel):
     uptime: Optional[str] = None
     servers: int = 0
     commands_executed: int = 0
+    shard_count: int = 0
+    workers: List[Dict[str, Any]] = []
+    updated_at: Optional[datetime] = None
+
+# Command catalogue for the dashboard, serialized once at import for /api/commands
+COMMAND_CATALOGUE = [
+    # Moderation Commands
+    {"name": "ban", "category": "moderation", "description": "Ban a user from the server"},
+    {"name": "kick", "category": "moderation", "description": "Kick a user from the server"},
+    {"name": "mute", "category": "moderation", "description": "Mute a user"},
+    {"name": "unmute", "category": "moderation", "description": "Unmute a user"},
+    {"name": "warn", "category": "moderation", "description": "Warn a user"},
+    {"name": "timeout", "category": "moderation", "description": "Timeout a user"},
+    {"name": "clear", "category": "moderation", "description": "Clear messages"},
+    {"name": "slowmode", "category": "moderation", "description": "Set channel slowmode"},
+    {"name": "lock", "category": "moderation", "description": "Lock a channel"},
+    {"name": "unlock", "category": "moderation", "description": "Unlock a channel"},
+    {"name": "purge", "category": "moderation", "description": "Purge messages by user"},
+    {"name": "massban", "category": "moderation", "description": "Mass ban users"},
+    {"name": "softban", "category": "moderation", "description": "Soft ban a user"},
+    {"name": "tempban", "category": "moderation", "description": "Temporarily ban a user"},
+    {"name": "unban", "category": "moderation", "description": "Unban a user"},
+    {"name": "warnings", "category": "moderation", "description": "View user warnings"},
+    {"name": "clearwarnings", "category": "moderation", "description": "Clear user warnings"},
+    {"name": "lockdown", "category": "moderation", "description": "Server lockdown"},
+    {"name": "unlockdown", "category": "moderation", "description": "Remove server lockdown"},
+    {"name": "nuke", "category": "moderation", "description": "Recreate channel"},
+    
+    # Server Management Commands
+    {"name": "serverinfo", "category": "server", "description": "Get server information"},
+    {"name": "serverconfig", "category": "server", "description": "Configure server settings"},
+    {"name": "prefix", "category": "server", "description": "Set bot prefix"},
+    {"name": "welcome", "category": "server", "description": "Configure welcome messages"},
+    {"name": "autorole", "category": "server", "description": "Set auto role for new members"},
+    {"name": "backup", "category": "server", "description": "Backup server settings"},
+    {"name": "restore", "category": "server", "description": "Restore server from backup"},
+    {"name": "invitetracker", "category": "server", "description": "Track server invites"},
+    {"name": "serverstats", "category": "server", "description": "Server statistics"},
+    {"name": "membercount", "category": "server", "description": "Get member count"},
+    {"name": "boostinfo", "category": "server", "description": "Server boost information"},
+    {"name": "emojistats", "category": "server", "description": "Emoji usage statistics"},
+    {"name": "channelstats", "category": "server", "description": "Channel statistics"},
+    {"name": "activity", "category": "server", "description": "Server activity stats"},
+    {"name": "growth", "category": "server", "description": "Server growth statistics"},
+    
+    # Role Management Commands
+    {"name": "createrole", "category": "roles", "description": "Create a new role"},
+    {"name": "deleterole", "category": "roles", "description": "Delete a role"},
+    {"name": "editrole", "category": "roles", "description": "Edit role properties"},
+    {"name": "assignrole", "category": "roles", "description": "Assign role to user"},
+    {"name": "removerole", "category": "roles", "description": "Remove role from user"},
+    {"name": "roleinfo", "category": "roles", "description": "Get role information"},
+    {"name": "rolemembers", "category": "roles", "description": "List role members"},
+    {"name": "rolecolor", "category": "roles", "description": "Change role color"},
+    {"name": "rolepermissions", "category": "roles", "description": "Edit role permissions"},
+    {"name": "massrole", "category": "roles", "description": "Mass assign/remove roles"},
+    {"name": "autoroles", "category": "roles", "description": "Configure auto roles"},
+    {"name": "reactionroles", "category": "roles", "description": "Set up reaction roles"},
+    {"name": "rolehierarchy", "category": "roles", "description": "View role hierarchy"},
+    {"name": "roleall", "category": "roles", "description": "Give role to all members"},
+    {"name": "rolehumans", "category": "roles", "description": "Give role to all humans"},
+    
+    # Channel Management Commands
+    {"name": "createchannel", "category": "channels", "description": "Create a new channel"},
+    {"name": "deletechannel", "category": "channels", "description": "Delete a channel"},
+    {"name": "editchannel", "category": "channels", "description": "Edit channel properties"},
+    {"name": "channelinfo", "category": "channels", "description": "Get channel information"},
+    {"name": "channelpermissions", "category": "channels", "description": "Edit channel permissions"},
+    {"name": "clone", "category": "channels", "description": "Clone a channel"},
+    {"name": "move", "category": "channels", "description": "Move channel position"},
+    {"name": "topic", "category": "channels", "description": "Set channel topic"},
+    {"name": "nsfw", "category": "channels", "description": "Toggle NSFW channel"},
+    {"name": "announce", "category": "channels", "description": "Make announcement"},
+    {"name": "categoryinfo", "category": "channels", "description": "Get category information"},
+    {"name": "createcategory", "category": "channels", "description": "Create channel category"},
+    {"name": "deletecategory", "category": "channels", "description": "Delete channel category"},
+    {"name": "movecategory", "category": "channels", "description": "Move channel to category"},
+    {"name": "listchannels", "category": "channels", "description": "List all channels"},
+    
+    # User Management Commands
+    {"name": "userinfo", "category": "users", "description": "Get user information"},
+    {"name": "nickname", "category": "users", "description": "Change user nickname"},
+    {"name": "avatar", "category": "users", "description": "Get user avatar"},
+    {"name": "userstats", "category": "users", "description": "Get user statistics"},
+    {"name": "activity", "category": "users", "description": "Get user activity"},
+    {"name": "permissions", "category": "users", "description": "Check user permissions"},
+    {"name": "badges", "category": "users", "description": "View user badges"},
+    {"name": "joindate", "category": "users", "description": "Get user join date"},
+    {"name": "profile", "category": "users", "description": "View user profile"},
+    {"name": "rank", "category": "users", "description": "View user rank"},
+    
+    # Auto-Moderation Commands
+    {"name": "automod", "category": "automod", "description": "Configure auto moderation"},
+    {"name": "antispam", "category": "automod", "description": "Configure anti-spam"},
+    {"name": "antiraid", "category": "automod", "description": "Configure anti-raid"},
+    {"name": "wordfilter", "category": "automod", "description": "Configure word filter"},
+    {"name": "antiinvite", "category": "automod", "description": "Block invite links"},
+    {"name": "antilink", "category": "automod", "description": "Block external links"},
+    {"name": "anticaps", "category": "automod", "description": "Prevent excessive caps"},
+    {"name": "antimention", "category": "automod", "description": "Prevent mass mentions"},
+    {"name": "autodehoist", "category": "automod", "description": "Auto dehoist nicknames"},
+    {"name": "verification", "category": "automod", "description": "Set verification level"},
+    
+    # Logging Commands
+    {"name": "logs", "category": "logging", "description": "View server logs"},
+    {"name": "modlogs", "category": "logging", "description": "View moderation logs"},
+    {"name": "messagelogs", "category": "logging", "description": "View message logs"},
+    {"name": "joinlogs", "category": "logging", "description": "View join/leave logs"},
+    {"name": "voicelogs", "category": "logging", "description": "View voice logs"},
+    {"name": "serverlogs", "category": "logging", "description": "View server change logs"},
+    {"name": "auditlog", "category": "logging", "description": "View audit log"},
+    {"name": "setlogchannel", "category": "logging", "description": "Set log channel"},
+    {"name": "logconfig", "category": "logging", "description": "Configure logging"},
+    {"name": "exportlogs", "category": "logging", "description": "Export logs to file"},
+    
+    # Utility Commands
+    {"name": "poll", "category": "utility", "description": "Create a poll"},
+    {"name": "embed", "category": "utility", "description": "Create custom embed"},
+    {"name": "say", "category": "utility", "description": "Make bot say something"},
+    {"name": "dm", "category": "utility", "description": "Send DM to user"},
+    {"name": "remind", "category": "utility", "description": "Set reminder"},
+    {"name": "timer", "category": "utility", "description": "Set timer"},
+    {"name": "calc", "category": "utility", "description": "Calculator"},
+    {"name": "weather", "category": "utility", "description": "Get weather info"},
+    {"name": "translate", "category": "utility", "description": "Translate text"},
+    {"name": "qr", "category": "utility", "description": "Generate QR code"},
+    
+    # Fun Commands
+    {"name": "meme", "category": "fun", "description": "Get random meme"},
+    {"name": "joke", "category": "fun", "description": "Get random joke"},
+    {"name": "fact", "category": "fun", "description": "Get random fact"},
+    {"name": "quote", "category": "fun", "description": "Get random quote"},
+    {"name": "8ball", "category": "fun", "description": "Magic 8 ball"},
+    {"name": "dice", "category": "fun", "description": "Roll dice"},
+    {"name": "coinflip", "category": "fun", "description": "Flip coin"},
+    {"name": "random", "category": "fun", "description": "Random number"},
+    {"name": "trivia", "category": "fun", "description": "Trivia questions"},
+    {"name": "riddle", "category": "fun", "description": "Get riddle"},
+    
+    # Economy Commands
+    {"name": "balance", "category": "economy", "description": "Check balance"},
+    {"name": "daily", "category": "economy", "description": "Daily reward"},
+    {"name": "work", "category": "economy", "description": "Work for money"},
+    {"name": "shop", "category": "economy", "description": "Server shop"},
+    {"name": "buy", "category": "economy", "description": "Buy item"},
+    {"name": "inventory", "category": "economy", "description": "View inventory"},
+    {"name": "transfer", "category": "economy", "description": "Transfer money"},
+    {"name": "leaderboard", "category": "economy", "description": "Economy leaderboard"},
+    {"name": "gamble", "category": "economy", "description": "Gamble money"},
+    {"name": "rob", "category": "economy", "description": "Rob another user"},
+    
+    # Advanced Commands
+    {"name": "ticket", "category": "advanced", "description": "Ticket system"},
+    {"name": "giveaway", "category": "advanced", "description": "Create giveaway"},
+    {"name": "suggestion", "category": "advanced", "description": "Suggestion system"},
+    {"name": "report", "category": "advanced", "description": "Report system"},
+    {"name": "starboard", "category": "advanced", "description": "Configure starboard"},
+    {"name": "levels", "category": "advanced", "description": "Leveling system"},
+    {"name": "leveling", "category": "advanced", "description": "Configure leveling"},
+    {"name": "customcommand", "category": "advanced", "description": "Create custom command"},
+    {"name": "tags", "category": "advanced", "description": "Tag system"},
+    {"name": "afk", "category": "advanced", "description": "AFK system"},
+    {"name": "music", "category": "advanced", "description": "Music commands"},
+    
+    # News Commands
+    {"name": "news", "category": "news", "description": "Get latest news from US, UK, or India"},
+    {"name": "news us", "category": "news", "description": "Get US news"},
+    {"name": "news uk", "category": "news", "description": "Get UK news"},
+    {"name": "news india", "category": "news", "description": "Get India news"},
+    {"name": "news us tech", "category": "news", "description": "Get US technology news"},
+    {"name": "news uk business", "category": "news", "description": "Get UK business news"},
+    {"name": "news india sports", "category": "news", "description": "Get India sports news"},
+]
+
+def serialize_catalogue(payload):
+    """Serialize a catalogue response once, with a strong ETag derived from its bytes"""
+    body = json.dumps(payload, separators=(",", ":")).encode()
+    return body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def build_catalogue_responses(commands):
+    """Pre-serialize the full catalogue and each category, keyed by category (None for all)"""
+    categories: Dict[str, List[Dict[str, str]]] = {}
+    for command in commands:
+        categories.setdefault(command["category"], []).append(command)
+    
+    responses = {None: serialize_catalogue({"commands": commands, "total": len(commands)})}
+    for category, category_commands in categories.items():
+        responses[category] = serialize_catalogue(
+            {"commands": category_commands, "category": category, "total": len(category_commands)}
+        )
+    return responses
+
+CATALOGUE_RESPONSES = build_catalogue_responses(COMMAND_CATALOGUE)
+
+def catalogue_response(request, body, etag):
+    """Send pre-serialized JSON, or 304 when the client already has this version"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # API Routes
 @app.get("/")
@@ -113,44 +643,58 @@ async def root():
 
 @app.get("/api/bot/status")
 async def get_bot_status():
-    """Get bot status information"""
-    global bot_process
-    
-    bot_running = bot_process is not None and bot_process.poll() is None
-    
-    # Get server count from database
-    server_count = servers_collection.count_documents({})
-    
-    # Get total commands executed
-    total_commands = commands_collection.count_documents({})
+    """Get bot status information from the background snapshot"""
+    if time.time() - status_snapshot.get("refreshed_at", 0) > BOT_STATUS_MAX_AGE:
+        try:
+            await refresh_status_snapshot()
+        except Exception as e:
+            if not status_snapshot:
+                raise HTTPException(status_code=503, detail=f"Bot status unavailable: {e}")
+            print(f"Error refreshing bot status, serving the last snapshot: {e}")
     
+    snapshot = status_snapshot
+    workers = snapshot["workers"]
+    started_at = snapshot["started_at"]
     return BotStatus(
-        status="running" if bot_running else "stopped",
-        servers=server_count,
-        commands_executed=total_commands
+        status="running" if any(worker["status"] == "running" for worker in workers) else "stopped",
+        uptime=str(timedelta(seconds=int(time.time() - started_at))) if started_at else None,
+        servers=snapshot["servers"],
+        commands_executed=snapshot["commands_executed"],
+        shard_count=bot_shard_count,
+        workers=workers,
+        updated_at=datetime.utcfromtimestamp(snapshot["refreshed_at"])
     )
 
 @app.post("/api/bot/start")
 async def start_bot():
     """Start the Discord bot"""
-    global bot_process
-    
-    if bot_process and bot_process.poll() is None:
-        return {"message": "Bot is already running"}
-    
-    start_discord_bot()
-    return {"message": "Bot started successfully"}
+    async with bot_control_lock:
+        if bot_workers and all(worker_running(worker) for worker in bot_workers.values()):
+            return {"message": "Bot is already running", "workers": await asyncio.to_thread(get_worker_status)}
+        
+        await start_discord_bot()
+        status_snapshot.clear()
+    return {"message": "Bot started successfully", "workers": await asyncio.to_thread(get_worker_status)}
 
 @app.post("/api/bot/stop")
 async def stop_bot():
     """Stop the Discord bot"""
-    global bot_process
-    
-    if not bot_process or bot_process.poll() is not None:
-        return {"message": "Bot is not running"}
-    
-    stop_discord_bot()
-    return {"message": "Bot stopped successfully"}
+    async with bot_control_lock:
+        if not any(worker_running(worker) for worker in bot_workers.values()):
+            return {"message": "Bot is not running", "workers": await asyncio.to_thread(get_worker_status)}
+        
+        await stop_discord_bot()
+        status_snapshot.clear()
+    return {"message": "Bot stopped successfully", "workers": await asyncio.to_thread(get_worker_status)}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Get Prometheus metrics merged from every bot worker"""
+    responses = await fetch_from_workers("/metrics")
+    return PlainTextResponse(
+        merge_metrics(response.text for response in responses.values() if response is not None),
+        media_type="text/plain; version=0.0.4"
+    )
 
 @app.get("/api/servers")
 async def get_servers():
@@ -169,198 +713,38 @@ async def get_server(server_id: str):
 @app.post("/api/servers")
 async def create_server_config(config: ServerConfig):
     """Create or update server configuration"""
-    config_dict = config.dict()
-    config_dict["created_at"] = datetime.utcnow()
-    config_dict["updated_at"] = datetime.utcnow()
+    updates = config_updates(config)
+    now = datetime.utcnow()
     
-    # Upsert server configuration
-    servers_collection.update_one(
+    # Upsert only the fields the request sent
+    previous = await asyncio.to_thread(
+        servers_collection.find_one_and_update,
         {"server_id": config.server_id},
-        {"$set": config_dict},
-        upsert=True
+        {"$set": {**updates, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+        projection={field: 1 for field in CONFIG_FIELDS},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
     )
     
+    # Push what changed into the bot's cached config, so it never has to re-read it
+    changes = config_changes(previous or {}, updates)
+    if changes:
+        await notify_bot({"type": "config_update", "server_id": config.server_id, "changes": changes}, config.server_id)
+    
     return {"message": "Server configuration saved", "server_id": config.server_id}
 
 @app.get("/api/commands")
-async def get_commands():
+async def get_commands(request: Request):
     """Get all available commands"""
-    commands = [
-        # Moderation Commands
-        {"name": "ban", "category": "moderation", "description": "Ban a user from the server"},
-        {"name": "kick", "category": "moderation", "description": "Kick a user from the server"},
-        {"name": "mute", "category": "moderation", "description": "Mute a user"},
-        {"name": "unmute", "category": "moderation", "description": "Unmute a user"},
-        {"name": "warn", "category": "moderation", "description": "Warn a user"},
-        {"name": "timeout", "category": "moderation", "description": "Timeout a user"},
-        {"name": "clear", "category": "moderation", "description": "Clear messages"},
-        {"name": "slowmode", "category": "moderation", "description": "Set channel slowmode"},
-        {"name": "lock", "category": "moderation", "description": "Lock a channel"},
-        {"name": "unlock", "category": "moderation", "description": "Unlock a channel"},
-        {"name": "purge", "category": "moderation", "description": "Purge messages by user"},
-        {"name": "massban", "category": "moderation", "description": "Mass ban users"},
-        {"name": "softban", "category": "moderation", "description": "Soft ban a user"},
-        {"name": "tempban", "category": "moderation", "description": "Temporarily ban a user"},
-        {"name": "unban", "category": "moderation", "description": "Unban a user"},
-        {"name": "warnings", "category": "moderation", "description": "View user warnings"},
-        {"name": "clearwarnings", "category": "moderation", "description": "Clear user warnings"},
-        {"name": "lockdown", "category": "moderation", "description": "Server lockdown"},
-        {"name": "unlockdown", "category": "moderation", "description": "Remove server lockdown"},
-        {"name": "nuke", "category": "moderation", "description": "Recreate channel"},
-        
-        # Server Management Commands
-        {"name": "serverinfo", "category": "server", "description": "Get server information"},
-        {"name": "serverconfig", "category": "server", "description": "Configure server settings"},
-        {"name": "prefix", "category": "server", "description": "Set bot prefix"},
-        {"name": "welcome", "category": "server", "description": "Configure welcome messages"},
-        {"name": "autorole", "category": "server", "description": "Set auto role for new members"},
-        {"name": "backup", "category": "server", "description": "Backup server settings"},
-        {"name": "restore", "category": "server", "description": "Restore server from backup"},
-        {"name": "invitetracker", "category": "server", "description": "Track server invites"},
-        {"name": "serverstats", "category": "server", "description": "Server statistics"},
-        {"name": "membercount", "category": "server", "description": "Get member count"},
-        {"name": "boostinfo", "category": "server", "description": "Server boost information"},
-        {"name": "emojistats", "category": "server", "description": "Emoji usage statistics"},
-        {"name": "channelstats", "category": "server", "description": "Channel statistics"},
-        {"name": "activity", "category": "server", "description": "Server activity stats"},
-        {"name": "growth", "category": "server", "description": "Server growth statistics"},
-        
-        # Role Management Commands
-        {"name": "createrole", "category": "roles", "description": "Create a new role"},
-        {"name": "deleterole", "category": "roles", "description": "Delete a role"},
-        {"name": "editrole", "category": "roles", "description": "Edit role properties"},
-        {"name": "assignrole", "category": "roles", "description": "Assign role to user"},
-        {"name": "removerole", "category": "roles", "description": "Remove role from user"},
-        {"name": "roleinfo", "category": "roles", "description": "Get role information"},
-        {"name": "rolemembers", "category": "roles", "description": "List role members"},
-        {"name": "rolecolor", "category": "roles", "description": "Change role color"},
-        {"name": "rolepermissions", "category": "roles", "description": "Edit role permissions"},
-        {"name": "massrole", "category": "roles", "description": "Mass assign/remove roles"},
-        {"name": "autoroles", "category": "roles", "description": "Configure auto roles"},
-        {"name": "reactionroles", "category": "roles", "description": "Set up reaction roles"},
-        {"name": "rolehierarchy", "category": "roles", "description": "View role hierarchy"},
-        {"name": "roleall", "category": "roles", "description": "Give role to all members"},
-        {"name": "rolehumans", "category": "roles", "description": "Give role to all humans"},
-        
-        # Channel Management Commands
-        {"name": "createchannel", "category": "channels", "description": "Create a new channel"},
-        {"name": "deletechannel", "category": "channels", "description": "Delete a channel"},
-        {"name": "editchannel", "category": "channels", "description": "Edit channel properties"},
-        {"name": "channelinfo", "category": "channels", "description": "Get channel information"},
-        {"name": "channelpermissions", "category": "channels", "description": "Edit channel permissions"},
-        {"name": "clone", "category": "channels", "description": "Clone a channel"},
-        {"name": "move", "category": "channels", "description": "Move channel position"},
-        {"name": "topic", "category": "channels", "description": "Set channel topic"},
-        {"name": "nsfw", "category": "channels", "description": "Toggle NSFW channel"},
-        {"name": "announce", "category": "channels", "description": "Make announcement"},
-        {"name": "categoryinfo", "category": "channels", "description": "Get category information"},
-        {"name": "createcategory", "category": "channels", "description": "Create channel category"},
-        {"name": "deletecategory", "category": "channels", "description": "Delete channel category"},
-        {"name": "movecategory", "category": "channels", "description": "Move channel to category"},
-        {"name": "listchannels", "category": "channels", "description": "List all channels"},
-        
-        # User Management Commands
-        {"name": "userinfo", "category": "users", "description": "Get user information"},
-        {"name": "nickname", "category": "users", "description": "Change user nickname"},
-        {"name": "avatar", "category": "users", "description": "Get user avatar"},
-        {"name": "userstats", "category": "users", "description": "Get user statistics"},
-        {"name": "activity", "category": "users", "description": "Get user activity"},
-        {"name": "permissions", "category": "users", "description": "Check user permissions"},
-        {"name": "badges", "category": "users", "description": "View user badges"},
-        {"name": "joindate", "category": "users", "description": "Get user join date"},
-        {"name": "profile", "category": "users", "description": "View user profile"},
-        {"name": "rank", "category": "users", "description": "View user rank"},
-        
-        # Auto-Moderation Commands
-        {"name": "automod", "category": "automod", "description": "Configure auto moderation"},
-        {"name": "antispam", "category": "automod", "description": "Configure anti-spam"},
-        {"name": "antiraid", "category": "automod", "description": "Configure anti-raid"},
-        {"name": "wordfilter", "category": "automod", "description": "Configure word filter"},
-        {"name": "antiinvite", "category": "automod", "description": "Block invite links"},
-        {"name": "antilink", "category": "automod", "description": "Block external links"},
-        {"name": "anticaps", "category": "automod", "description": "Prevent excessive caps"},
-        {"name": "antimention", "category": "automod", "description": "Prevent mass mentions"},
-        {"name": "autodehoist", "category": "automod", "description": "Auto dehoist nicknames"},
-        {"name": "verification", "category": "automod", "description": "Set verification level"},
-        
-        # Logging Commands
-        {"name": "logs", "category": "logging", "description": "View server logs"},
-        {"name": "modlogs", "category": "logging", "description": "View moderation logs"},
-        {"name": "messagelogs", "category": "logging", "description": "View message logs"},
-        {"name": "joinlogs", "category": "logging", "description": "View join/leave logs"},
-        {"name": "voicelogs", "category": "logging", "description": "View voice logs"},
-        {"name": "serverlogs", "category": "logging", "description": "View server change logs"},
-        {"name": "auditlog", "category": "logging", "description": "View audit log"},
-        {"name": "setlogchannel", "category": "logging", "description": "Set log channel"},
-        {"name": "logconfig", "category": "logging", "description": "Configure logging"},
-        {"name": "exportlogs", "category": "logging", "description": "Export logs to file"},
-        
-        # Utility Commands
-        {"name": "poll", "category": "utility", "description": "Create a poll"},
-        {"name": "embed", "category": "utility", "description": "Create custom embed"},
-        {"name": "say", "category": "utility", "description": "Make bot say something"},
-        {"name": "dm", "category": "utility", "description": "Send DM to user"},
-        {"name": "remind", "category": "utility", "description": "Set reminder"},
-        {"name": "timer", "category": "utility", "description": "Set timer"},
-        {"name": "calc", "category": "utility", "description": "Calculator"},
-        {"name": "weather", "category": "utility", "description": "Get weather info"},
-        {"name": "translate", "category": "utility", "description": "Translate text"},
-        {"name": "qr", "category": "utility", "description": "Generate QR code"},
-        
-        # Fun Commands
-        {"name": "meme", "category": "fun", "description": "Get random meme"},
-        {"name": "joke", "category": "fun", "description": "Get random joke"},
-        {"name": "fact", "category": "fun", "description": "Get random fact"},
-        {"name": "quote", "category": "fun", "description": "Get random quote"},
-        {"name": "8ball", "category": "fun", "description": "Magic 8 ball"},
-        {"name": "dice", "category": "fun", "description": "Roll dice"},
-        {"name": "coinflip", "category": "fun", "description": "Flip coin"},
-        {"name": "random", "category": "fun", "description": "Random number"},
-        {"name": "trivia", "category": "fun", "description": "Trivia questions"},
-        {"name": "riddle", "category": "fun", "description": "Get riddle"},
-        
-        # Economy Commands
-        {"name": "balance", "category": "economy", "description": "Check balance"},
-        {"name": "daily", "category": "economy", "description": "Daily reward"},
-        {"name": "work", "category": "economy", "description": "Work for money"},
-        {"name": "shop", "category": "economy", "description": "Server shop"},
-        {"name": "buy", "category": "economy", "description": "Buy item"},
-        {"name": "inventory", "category": "economy", "description": "View inventory"},
-        {"name": "transfer", "category": "economy", "description": "Transfer money"},
-        {"name": "leaderboard", "category": "economy", "description": "Economy leaderboard"},
-        {"name": "gamble", "category": "economy", "description": "Gamble money"},
-        {"name": "rob", "category": "economy", "description": "Rob another user"},
-        
-        # Advanced Commands
-        {"name": "ticket", "category": "advanced", "description": "Ticket system"},
-        {"name": "giveaway", "category": "advanced", "description": "Create giveaway"},
-        {"name": "suggestion", "category": "advanced", "description": "Suggestion system"},
-        {"name": "report", "category": "advanced", "description": "Report system"},
-        {"name": "starboard", "category": "advanced", "description": "Configure starboard"},
-        {"name": "levels", "category": "advanced", "description": "Leveling system"},
-        {"name": "customcommand", "category": "advanced", "description": "Create custom command"},
-        {"name": "tags", "category": "advanced", "description": "Tag system"},
-        {"name": "afk", "category": "advanced", "description": "AFK system"},
-        {"name": "music", "category": "advanced", "description": "Music commands"},
-        
-        # News Commands
-        {"name": "news", "category": "news", "description": "Get latest news from US, UK, or India"},
-        {"name": "news us", "category": "news", "description": "Get US news"},
-        {"name": "news uk", "category": "news", "description": "Get UK news"},
-        {"name": "news india", "category": "news", "description": "Get India news"},
-        {"name": "news us tech", "category": "news", "description": "Get US technology news"},
-        {"name": "news uk business", "category": "news", "description": "Get UK business news"},
-        {"name": "news india sports", "category": "news", "description": "Get India sports news"},
-    ]
-    
-    return {"commands": commands, "total": len(commands)}
+    return catalogue_response(request, *CATALOGUE_RESPONSES[None])
 
 @app.get("/api/commands/{category}")
-async def get_commands_by_category(category: str):
+async def get_commands_by_category(category: str, request: Request):
     """Get commands by category"""
-    all_commands = await get_commands()
-    commands = [cmd for cmd in all_commands["commands"] if cmd["category"] == category]
-    return {"commands": commands, "category": category, "total": len(commands)}
+    cached = CATALOGUE_RESPONSES.get(category)
+    if cached is None:
+        cached = serialize_catalogue({"commands": [], "category": category, "total": 0})
+    return catalogue_response(request, *cached)
 
 @app.post("/api/commands/execute")
 async def log_command_execution(command_log: CommandLog):
@@ -191,6 +191,23 @@ class DiscordBotAPITester:
         
         return all(results), {}
 
+    def test_commands_etag(self):
+        """Test the command catalogue carries an ETag and revalidates with 304"""
+        try:
+            response = requests.get(f"{self.base_url}/api/commands", timeout=10)
+            etag = response.headers.get("ETag")
+            if not etag:
+                self.log_test("Commands ETag", False, "ETag header missing")
+                return False, {}
+            
+            revalidated = requests.get(f"{self.base_url}/api/commands", headers={"If-None-Match": etag}, timeout=10)
+            success = revalidated.status_code == 304 and not revalidated.content
+            self.log_test("Commands ETag", success, f"Revalidation returned {revalidated.status_code}")
+            return success, {}
+        except Exception as e:
+            self.log_test("Commands ETag", False, f"Error checking ETag: {str(e)}")
+            return False, {}
+
     def test_log_command_execution(self):
         """Test command execution logging"""
         test_log_data = {
@@ -322,6 +339,7 @@ class DiscordBotAPITester:
         print("-" * 30)
         self.test_get_commands()
         self.test_get_commands_by_category()
+        self.test_commands_etag()
         
         # Logging tests
         print("\n📋 LOGGING TESTS")
@@ -0,0 +1,75 @@
+"""
+In-memory stand-in for the Motor collections used by the write-behind ledgers.
+Supports the queries economy.py and leveling.py make, including the
+flush_seq guard that sequenced_update adds to bulk upserts.
+"""
+
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        self.docs.sort(key=lambda doc: doc.get(key, 0), reverse=direction < 0)
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(0)
+        return self.docs
+
+class FakeCollection:
+    """Documents keyed by (server_id, user_id), as the unique index enforces"""
+
+    def __init__(self):
+        self.docs = {}
+        # Set to an exception to raise it after a bulk write has been applied
+        self.fail_after_write = None
+
+    @staticmethod
+    def _project(doc, projection):
+        if not projection:
+            return dict(doc)
+        return {key: value for key, value in doc.items() if projection.get(key)}
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        doc = self.docs.get((query["server_id"], query["user_id"]))
+        return self._project(doc, projection) if doc else None
+
+    def find(self, query, projection=None):
+        docs = [self._project(doc, projection) for (server_id, _), doc in self.docs.items()
+                if server_id == query["server_id"]]
+        return FakeCursor(docs)
+
+    async def insert_one(self, doc):
+        self.docs[(doc["server_id"], doc["user_id"])] = dict(doc)
+
+    async def bulk_write(self, operations, ordered=True):
+        await asyncio.sleep(0)
+        errors = []
+        for index, operation in enumerate(operations):
+            query, update = operation._filter, operation._doc
+            key = (query["server_id"], query["user_id"])
+            doc = self.docs.get(key)
+            seq = query.get("flush_seq", {}).get("$not", {}).get("$gte")
+            if doc is not None and seq is not None and doc.get("flush_seq", 0) >= seq:
+                # The filter misses, so the upsert collides with the unique index
+                errors.append({"index": index, "code": 11000, "errmsg": "duplicate key"})
+                continue
+
+            doc = self.docs.setdefault(key, {"server_id": key[0], "user_id": key[1]})
+            for field, amount in update.get("$inc", {}).items():
+                doc[field] = doc.get(field, 0) + amount
+            for field, value in update.get("$max", {}).items():
+                if doc.get(field) is None or value > doc[field]:
+                    doc[field] = value
+            doc.update(update.get("$set", {}))
+
+        if self.fail_after_write:
+            error, self.fail_after_write = self.fail_after_write, None
+            raise error
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
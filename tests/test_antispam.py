@@ -0,0 +1,40 @@
+"""
+Tests for anti-spam and anti-raid config resolution and detection.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from antispam import ANTIRAID_DEFAULTS, ANTISPAM_DEFAULTS, RaidDetector, SpamDetector, resolve_config
+
+def test_resolve_config_clamps_dashboard_values():
+    """Zero, negative and non-numeric settings are clamped or replaced with defaults"""
+    config = resolve_config(ANTISPAM_DEFAULTS, {"enabled": True, "messages": 0, "seconds": -5, "duplicates": "x"})
+
+    assert config["messages"] == 2
+    assert config["seconds"] == 1
+    assert config["duplicates"] == ANTISPAM_DEFAULTS["duplicates"]
+    assert resolve_config(ANTISPAM_DEFAULTS, {"enabled": False, "messages": 0}) is None
+
+    raid = resolve_config(ANTIRAID_DEFAULTS, {"enabled": True, "joins": 0, "channels": "general"})
+    assert raid["joins"] == 2
+    assert raid["channels"] == []
+
+def test_zero_window_config_still_detects_floods():
+    """A config saved with messages: 0 no longer raises on every message"""
+    config = resolve_config(ANTISPAM_DEFAULTS, {"enabled": True, "messages": 0, "seconds": 5})
+    detector = SpamDetector()
+
+    assert detector.check(1, 1, "a", 0, config, now=0) is None
+    assert detector.check(1, 1, "b", 0, config, now=1) == "flood"
+
+def test_zero_join_config_still_detects_raids():
+    """A config saved with joins: 0 no longer raises on every join"""
+    config = resolve_config(ANTIRAID_DEFAULTS, {"enabled": True, "joins": 0, "seconds": 10})
+    detector = RaidDetector()
+
+    assert not detector.check(1, config, now=0)
+    assert detector.check(1, config, now=1)
+    assert detector.in_raid(1, now=2)
@@ -0,0 +1,65 @@
+"""
+Tests for compiling and matching automod word lists and rules.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from automod import MAX_TERM_LENGTH, NO_RULES, AutomodRules, compile_word_list
+
+def test_compile_word_list_splits_words_and_phrases():
+    """Single words go in the term set, phrases and punctuated terms in the regex"""
+    terms, phrases = compile_word_list(["Bad", " worse ", "", "very bad", "foo-bar"])
+
+    assert terms == {"bad", "worse"}
+    assert phrases.search("this is very bad")
+    assert phrases.search("foo-bar")
+    assert not phrases.search("very badly")
+
+def test_compile_word_list_shares_prefixes():
+    """Phrases that are prefixes of each other all match on whole words"""
+    _, phrases = compile_word_list(["ab c", "ab cd", "ab cde"])
+
+    for text in ("ab c", "ab cd", "ab cde"):
+        assert phrases.fullmatch(text)
+    assert not phrases.search("ab cdef")
+
+def test_long_phrases_do_not_recurse():
+    """Phrases up to the length cap compile, and longer ones are ignored"""
+    long_phrase = ("a " * (MAX_TERM_LENGTH // 2)).strip()
+    terms, phrases = compile_word_list([long_phrase, "a " * 250])
+
+    assert not terms
+    assert phrases.search(long_phrase)
+
+    rules = AutomodRules({"enabled": True, "words": ["a " * 250]})
+    assert not rules.enabled
+    assert rules.check("a " * 250) is None
+
+def test_check_rules():
+    """Each rule reports its own name and respects its settings"""
+    rules = AutomodRules({
+        "enabled": True,
+        "words": ["spam", "buy now"],
+        "antiinvite": True,
+        "antilink": True,
+        "allowed_domains": ["example.com"],
+        "anticaps": True
+    })
+
+    assert rules.check("join discord.gg/abc") == "invite"
+    assert rules.check("see https://evil.test/page") == "link"
+    assert rules.check("see https://docs.example.com/page") is None
+    assert rules.check("no SPAM please") == "word"
+    assert rules.check("Buy now!") == "word"
+    assert rules.check("spammer") is None
+    assert rules.check("THIS IS ALL CAPS TEXT") == "caps"
+    assert rules.check("Normal message") is None
+
+def test_disabled_rules_match_nothing():
+    """Rules do nothing while automod is off or nothing is configured"""
+    assert not AutomodRules({"enabled": False, "words": ["spam"]}).check("spam")
+    assert not AutomodRules({"enabled": True}).enabled
+    assert NO_RULES.check("discord.gg/abc") is None
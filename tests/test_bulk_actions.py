@@ -0,0 +1,121 @@
+"""
+Tests for mass action jobs: guild reservations, role hierarchy checks,
+resuming from the checkpoint watermark and failure handling.
+"""
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from bulk_actions import BulkActionExecutor, moderatable_targets
+
+class FakeJobCollection:
+    """bulk_jobs documents keyed by job_id"""
+
+    def __init__(self):
+        self.jobs = {}
+
+    async def insert_one(self, doc):
+        self.jobs[doc["job_id"]] = dict(doc)
+
+    async def update_one(self, query, update):
+        self.jobs[query["job_id"]].update(update["$set"])
+
+    def find(self, query, projection=None):
+        docs = [dict(doc) for doc in self.jobs.values()
+                if doc["status"] == query["status"] and doc["server_id"] in query["server_id"]["$in"]]
+        return SimpleNamespace(to_list=lambda length=None: asyncio.sleep(0, docs))
+
+class FakeGuild:
+    def __init__(self, guild_id=1, owner_id=1, members=None, bot_role=100):
+        self.id = guild_id
+        self.owner_id = owner_id
+        self.members = members or {}
+        self.me = SimpleNamespace(top_role=bot_role)
+        self.banned = []
+        self.fail_with = None
+
+    def get_member(self, user_id):
+        return self.members.get(user_id)
+
+    async def ban(self, user, reason=None, delete_message_seconds=0):
+        if self.fail_with:
+            raise self.fail_with
+        self.banned.append(user.id)
+
+def _executor(collection):
+    return BulkActionExecutor(collection, rates={"ban": 1000.0, "add_role": 1000.0, "remove_role": 1000.0},
+                              checkpoint_interval=60)
+
+def _job(targets, cursor=0, status="running"):
+    return {"job_id": "job", "server_id": "1", "action": "ban", "role_id": None, "reason": "test",
+            "targets": [str(target) for target in targets], "cursor": cursor, "done": cursor,
+            "failed": 0, "skipped": 0, "status": status}
+
+def test_reserve_blocks_second_job():
+    """Only the first of two overlapping commands gets the guild"""
+    executor = BulkActionExecutor(collection=None)
+    assert executor.reserve(1)
+    assert executor.is_busy(1)
+    assert not executor.reserve(1)
+    assert executor.reserve(2)
+
+def test_release_frees_guild():
+    """A failed job creation releases the reservation"""
+    executor = BulkActionExecutor(collection=None)
+    assert executor.reserve(1)
+    executor.release(1)
+    assert not executor.is_busy(1)
+    assert executor.reserve(1)
+
+def test_outranking_targets_are_skipped():
+    """Members at or above the moderator or the bot are skipped; non-members are kept"""
+    guild = FakeGuild(owner_id=99, bot_role=50, members={
+        10: SimpleNamespace(top_role=5),
+        11: SimpleNamespace(top_role=20),
+        12: SimpleNamespace(top_role=60),
+    })
+    moderator = SimpleNamespace(id=2, top_role=20)
+
+    assert moderatable_targets(guild, moderator, [10, 11, 12, 13]) == ([10, 13], 2)
+
+    owner = SimpleNamespace(id=99, top_role=20)
+    assert moderatable_targets(guild, owner, [10, 11, 12, 13]) == ([10, 11, 13], 1)
+
+def test_resume_continues_from_watermark():
+    """An interrupted job only repeats the targets after its checkpointed cursor"""
+    async def run():
+        collection = FakeJobCollection()
+        await collection.insert_one(_job(range(100, 106), cursor=3))
+        guild = FakeGuild()
+        executor = _executor(collection)
+
+        assert await executor.resume([guild]) == 1
+        await asyncio.gather(*executor._running.values())
+
+        assert sorted(guild.banned) == [103, 104, 105]
+        stored = collection.jobs["job"]
+        assert stored["status"] == "completed"
+        assert stored["cursor"] == 6 and stored["done"] == 6
+        assert not executor.is_busy(1)
+
+    asyncio.run(run())
+
+def test_unexpected_error_marks_job_failed():
+    """A job that raises is marked failed instead of being left running"""
+    async def run():
+        collection = FakeJobCollection()
+        await collection.insert_one(_job([100, 101]))
+        guild = FakeGuild()
+        guild.fail_with = RuntimeError("boom")
+        executor = _executor(collection)
+
+        await executor.start(collection.jobs["job"], guild)
+
+        assert collection.jobs["job"]["status"] == "failed"
+        assert not executor.is_busy(1)
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+"""
+Tests for resolving and applying command cooldown limits.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from cooldowns import CommandCooldowns, clean_overrides
+
+DEFAULTS = {
+    "*": {"user": {"rate": 5, "per": 10}, "guild": {"rate": 30, "per": 10}},
+    "news": {"user": {"rate": 2, "per": 30}}
+}
+
+def test_partial_override_merges_fields():
+    """An override naming only the rate keeps the default window"""
+    cooldowns = CommandCooldowns(DEFAULTS)
+    overrides = clean_overrides({"ban": {"user": {"rate": 1}}})
+
+    assert cooldowns.limits("ban", overrides)["user"] == {"rate": 1, "per": 10}
+    assert cooldowns.check(1, 1, "ban", overrides, now=0) == (0.0, None)
+    retry_after, scope = cooldowns.check(1, 1, "ban", overrides, now=0)
+    assert scope == "user" and retry_after == 10
+
+def test_invalid_overrides_are_dropped():
+    """Zero windows, negative or non-numeric values and unknown scopes are ignored"""
+    overrides = clean_overrides({
+        "ban": {"user": {"rate": 1, "per": 0}, "guild": {"rate": -1, "per": "x"}, "channel": {"rate": 1}},
+        "kick": "fast",
+        "warn": {"user": None}
+    })
+
+    assert overrides == {"ban": {"user": {"rate": 1.0}}, "warn": {"user": None}}
+    cooldowns = CommandCooldowns(DEFAULTS)
+    assert cooldowns.limits("warn", overrides)["user"] is None
+    assert cooldowns.check(1, 1, "ban", overrides, now=0) == (0.0, None)
+
+def test_zero_window_never_divides():
+    """A limit without a usable window is skipped instead of raising"""
+    cooldowns = CommandCooldowns({"*": {"user": {"rate": 1, "per": 0}}})
+    assert cooldowns.check(1, 1, "ping", now=0) == (0.0, None)
+
+def test_fractional_rate_never_blocks_forever():
+    """Overrides below one call are dropped, and a fractional default still lets a call through"""
+    assert clean_overrides({"ban": {"user": {"rate": 0.5, "per": 60}}}) == {"ban": {"user": {"per": 60.0}}}
+
+    cooldowns = CommandCooldowns({"*": {"user": {"rate": 0.5, "per": 60}}})
+    assert cooldowns.check(1, 1, "ping", now=0) == (0.0, None)
+    retry_after, scope = cooldowns.check(1, 1, "ping", now=0)
+    assert scope == "user" and retry_after == 120
+    assert cooldowns.check(1, 1, "ping", now=120) == (0.0, None)
@@ -0,0 +1,135 @@
+"""
+Concurrency tests for the atomic daily reward claim.
+The direct claim runs against the MongoDB at MONGO_URL and is skipped when
+none is reachable; the write-behind ledger claim runs on a FakeCollection.
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+
+from economy import EconomyLedger, MissingIndex, claim_daily
+from tests.fake_collection import FakeCollection
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+PARALLEL_CLAIMS = 50
+
+async def _economy_collection():
+    """Get a scratch economy collection with the production unique index"""
+    client = AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except PyMongoError:
+        client.close()
+        pytest.skip("MongoDB is not reachable")
+
+    collection = client[f"test_daily_claim_{uuid.uuid4().hex}"].economy
+    await collection.create_index([("server_id", 1), ("user_id", 1)], unique=True)
+    return client, collection
+
+def test_parallel_claims_pay_once():
+    """Only one of many simultaneous claims for a new user is paid"""
+    async def run():
+        client, collection = await _economy_collection()
+        try:
+            results = await asyncio.gather(*[
+                claim_daily(collection, "server", "user", 100)
+                for _ in range(PARALLEL_CLAIMS)
+            ])
+
+            assert sum(1 for claimed, _, _ in results if claimed) == 1
+            user_data = await collection.find_one({"server_id": "server", "user_id": "user"})
+            assert user_data["balance"] == 100
+            assert await collection.count_documents({}) == 1
+        finally:
+            await client.drop_database(collection.database.name)
+            client.close()
+
+    asyncio.run(run())
+
+def test_parallel_claims_after_cooldown_pay_once():
+    """An existing user past the cooldown is paid once and gets the new balance back"""
+    async def run():
+        client, collection = await _economy_collection()
+        try:
+            await collection.insert_one({
+                "server_id": "server",
+                "user_id": "user",
+                "balance": 1000,
+                "last_daily": datetime.utcnow() - timedelta(days=2)
+            })
+
+            results = await asyncio.gather(*[
+                claim_daily(collection, "server", "user", 100)
+                for _ in range(PARALLEL_CLAIMS)
+            ])
+
+            paid = [balance for claimed, balance, _ in results if claimed]
+            assert paid == [1100]
+            assert all(last_daily is not None for claimed, _, last_daily in results if not claimed)
+        finally:
+            await client.drop_database(collection.database.name)
+            client.close()
+
+    asyncio.run(run())
+
+def test_parallel_ledger_claims_pay_once():
+    """Only one of many simultaneous write-behind claims for a new user is paid"""
+    async def run():
+        collection = FakeCollection()
+        ledger = EconomyLedger(collection, flush_interval=5, unique_index=True)
+        results = await asyncio.gather(*[
+            ledger.claim_daily("server", "user", 100)
+            for _ in range(PARALLEL_CLAIMS)
+        ])
+
+        assert sum(1 for claimed, _, _ in results if claimed) == 1
+        await ledger.flush()
+        assert collection.docs[("server", "user")]["balance"] == 100
+
+    asyncio.run(run())
+
+def test_parallel_ledger_claims_after_cooldown_pay_once():
+    """An existing user past the cooldown is paid once through the ledger"""
+    async def run():
+        collection = FakeCollection()
+        await collection.insert_one({
+            "server_id": "server",
+            "user_id": "user",
+            "balance": 1000,
+            "last_daily": datetime.utcnow() - timedelta(days=2)
+        })
+        ledger = EconomyLedger(collection, flush_interval=5, unique_index=True)
+
+        results = await asyncio.gather(*[
+            ledger.claim_daily("server", "user", 100)
+            for _ in range(PARALLEL_CLAIMS)
+        ])
+
+        paid = [balance for claimed, balance, _ in results if claimed]
+        assert paid == [1100]
+        assert all(last_daily is not None for claimed, _, last_daily in results if not claimed)
+        await ledger.flush()
+        assert collection.docs[("server", "user")]["balance"] == 1100
+
+    asyncio.run(run())
+
+def test_direct_claim_refuses_without_unique_index():
+    """Direct claims fail closed until the unique index has been verified"""
+    async def run():
+        collection = FakeCollection()
+        ledger = EconomyLedger(collection, flush_interval=0)
+        with pytest.raises(MissingIndex):
+            await ledger.claim_daily("server", "user", 100)
+        assert collection.docs == {}
+
+    asyncio.run(run())
@@ -0,0 +1,24 @@
+"""
+Tests for resolving a guild's leveling settings.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from leveling import resolve_levels
+
+def test_leveling_is_off_by_default():
+    """Guilds without settings.levels, or with enabled unset, get no XP"""
+    assert resolve_levels(None) is None
+    assert resolve_levels({"announce_channel": "123"}) is None
+    assert resolve_levels({"enabled": "yes"}) is None
+
+def test_enabled_settings_are_cleaned():
+    """Malformed announce settings fall back to announcing where the message was sent"""
+    assert resolve_levels({"enabled": True}) == {"enabled": True, "announce": True, "announce_channel": None}
+    assert resolve_levels({"enabled": True, "announce": False, "announce_channel": 123}) == {
+        "enabled": True, "announce": False, "announce_channel": "123"
+    }
+    assert resolve_levels({"enabled": True, "announce_channel": "#general"})["announce_channel"] is None
@@ -0,0 +1,207 @@
+"""
+Tests for the job scheduler's heap, batched dispatch, retries and window loading.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from scheduler import JobScheduler
+
+OPERATORS = {
+    "$lte": lambda value, bound: value <= bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$gt": lambda value, bound: value > bound,
+    "$in": lambda value, bound: value in bound,
+}
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(matches(doc, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(doc, part) for part in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not all(OPERATORS[op](doc.get(key), bound) for op, bound in condition.items()):
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+class FakeJobCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        self.docs.sort(key=lambda doc: tuple(doc[key] for key, _ in keys))
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(0)
+        return self.docs
+
+class FakeJobCollection:
+    """The scheduled_jobs queries JobScheduler makes, with a count of find() calls"""
+
+    def __init__(self):
+        self.jobs = {}
+        self.finds = 0
+
+    async def insert_one(self, doc):
+        self.jobs[doc["job_id"]] = dict(doc)
+
+    def find(self, query, projection=None):
+        self.finds += 1
+        return FakeJobCursor([dict(doc) for doc in self.jobs.values() if matches(doc, query)])
+
+    async def update_one(self, query, update):
+        for doc in self.jobs.values():
+            if matches(doc, query):
+                doc.update(update["$set"])
+                return SimpleNamespace(modified_count=1)
+        return SimpleNamespace(modified_count=0)
+
+    async def delete_one(self, query):
+        return await self._delete(query, limit=1)
+
+    async def delete_many(self, query):
+        return await self._delete(query)
+
+    async def _delete(self, query, limit=None):
+        matched = [job_id for job_id, doc in self.jobs.items() if matches(doc, query)][:limit]
+        for job_id in matched:
+            del self.jobs[job_id]
+        return SimpleNamespace(deleted_count=len(matched))
+
+def _scheduler(collection, owned=("server",), **options):
+    owned = set(owned)
+    scheduler = JobScheduler(collection, owns=lambda server_id: server_id in owned,
+                             horizon=60, retry_delay=0.05, **options)
+    ran = []
+
+    @scheduler.handler("reminder")
+    async def remind(job):
+        ran.append(job["payload"]["name"])
+
+    return scheduler, owned, ran
+
+async def _wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+def test_due_jobs_run_in_order_and_are_deleted():
+    """Overdue jobs run first, then one scheduled after start, and all leave MongoDB"""
+    async def run():
+        collection = FakeJobCollection()
+        scheduler, _, ran = _scheduler(collection)
+        now = datetime.utcnow()
+        await scheduler.schedule("reminder", "server", now - timedelta(seconds=1), name="second")
+        await scheduler.schedule("reminder", "server", now - timedelta(seconds=2), name="first")
+        scheduler.start()
+        await _wait_for(lambda: len(ran) == 2)
+
+        await scheduler.schedule("reminder", "server", datetime.utcnow() + timedelta(seconds=0.1), name="later")
+        await _wait_for(lambda: len(ran) == 3)
+        await scheduler.close()
+
+        # Overdue jobs share one concurrent batch; the later one is popped after them
+        assert sorted(ran[:2]) == ["first", "second"] and ran[2] == "later"
+        assert collection.jobs == {}
+        assert scheduler.get_stats()["completed"] == 3
+
+    asyncio.run(run())
+
+def test_backlog_is_loaded_in_pages_and_dispatched_in_batches():
+    """An overdue backlog larger than batch_size is paged and every job runs once"""
+    async def run():
+        collection = FakeJobCollection()
+        scheduler, _, ran = _scheduler(collection, batch_size=3)
+        due = datetime.utcnow() - timedelta(minutes=5)
+        for index in range(10):
+            await collection.insert_one({"job_id": f"job-{index:02}", "kind": "reminder", "server_id": "server",
+                                         "due_at": due, "attempts": 0, "payload": {"name": index}})
+        scheduler.start()
+        await _wait_for(lambda: len(ran) == 10)
+        await scheduler.close()
+
+        assert sorted(ran) == list(range(10))
+        assert collection.finds >= 4
+        assert scheduler.get_stats()["dispatch_batches"] >= 4
+
+    asyncio.run(run())
+
+def test_failing_job_is_retried_then_completed():
+    """A handler error reschedules the job with its attempt count"""
+    async def run():
+        collection = FakeJobCollection()
+        scheduler, _, _ = _scheduler(collection)
+        calls = []
+
+        @scheduler.handler("unban")
+        async def flaky(job):
+            calls.append(job["attempts"])
+            if len(calls) == 1:
+                raise RuntimeError("Discord is down")
+
+        await scheduler.schedule("unban", "server", datetime.utcnow(), user_id="1")
+        scheduler.start()
+        await _wait_for(lambda: len(calls) == 2 and not collection.jobs)
+        await scheduler.close()
+
+        assert calls == [0, 1]
+        assert scheduler.get_stats()["retried"] == 1
+
+    asyncio.run(run())
+
+def test_cancelled_job_does_not_run():
+    """A cancelled job's heap entry is skipped when it comes due"""
+    async def run():
+        collection = FakeJobCollection()
+        scheduler, _, ran = _scheduler(collection)
+        scheduler.start()
+        await _wait_for(lambda: scheduler._loaded_until is not None)
+        job_id = await scheduler.schedule("reminder", "server", datetime.utcnow() + timedelta(seconds=0.1), name="cancelled")
+        await scheduler.schedule("reminder", "server", datetime.utcnow() + timedelta(seconds=0.2), name="kept")
+        assert await scheduler.cancel(job_id)
+        await _wait_for(lambda: ran)
+        await scheduler.close()
+
+        assert ran == ["kept"]
+
+    asyncio.run(run())
+
+def test_jobs_for_unavailable_guild_run_once_it_returns():
+    """Jobs skipped while owns() rejects their guild aren't lost when the window moves on"""
+    async def run():
+        collection = FakeJobCollection()
+        scheduler, owned, ran = _scheduler(collection)
+        await collection.insert_one({"job_id": "outage", "kind": "reminder", "server_id": "other",
+                                     "due_at": datetime.utcnow(), "attempts": 0, "payload": {"name": "outage"}})
+        scheduler.start()
+        await _wait_for(lambda: scheduler._loaded_until is not None)
+        await asyncio.sleep(0.05)
+        assert ran == []
+        assert scheduler.get_stats()["deferred_guilds"] == 1
+
+        owned.add("other")
+        scheduler.recheck()
+        await _wait_for(lambda: ran)
+        await scheduler.close()
+
+        assert ran == ["outage"]
+        assert collection.jobs == {}
+        assert scheduler.get_stats()["deferred_guilds"] == 0
+
+    asyncio.run(run())
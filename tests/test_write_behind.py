@@ -0,0 +1,95 @@
+"""
+Tests that write-behind flushes stay exactly-once when a flush times out
+after MongoDB has already applied it, and wait for the unique index.
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+from database import DatabaseTimeout
+from economy import EconomyLedger
+from leveling import XPEngine
+
+from tests.fake_collection import FakeCollection
+
+def test_ledger_flush_retry_after_timeout_applies_once():
+    """A delta resent after an ambiguous timeout is not credited twice"""
+    async def run():
+        collection = FakeCollection()
+        ledger = EconomyLedger(collection, flush_interval=5, unique_index=True)
+
+        await ledger.add("server", "user", 100)
+        collection.fail_after_write = DatabaseTimeout("timed out")
+        await ledger.flush()
+        assert collection.docs[("server", "user")]["balance"] == 100
+
+        await ledger.add("server", "user", 5)
+        await ledger.flush()
+        await ledger.flush()
+
+        assert collection.docs[("server", "user")]["balance"] == 105
+        assert ledger.get_stats()["dirty"] == 0
+        assert await ledger.get_balance("server", "user") == 105
+
+    asyncio.run(run())
+
+def test_ledger_resumes_sequence_after_reload():
+    """A fresh ledger continues from the stored flush sequence"""
+    async def run():
+        collection = FakeCollection()
+        first = EconomyLedger(collection, flush_interval=5, unique_index=True)
+        await first.add("server", "user", 10)
+        await first.flush()
+
+        second = EconomyLedger(collection, flush_interval=5, unique_index=True)
+        await second.add("server", "user", 10)
+        await second.flush()
+
+        assert collection.docs[("server", "user")]["balance"] == 20
+        assert collection.docs[("server", "user")]["flush_seq"] == 2
+
+    asyncio.run(run())
+
+def test_xp_flush_retry_after_timeout_applies_once():
+    """XP resent after an ambiguous timeout is not awarded twice"""
+    async def run():
+        collection = FakeCollection()
+        engine = XPEngine(collection, cooldown=60, xp_range=(20, 20), unique_index=True)
+
+        await engine.award_message("server", "user", now=0)
+        collection.fail_after_write = DatabaseTimeout("timed out")
+        await engine.flush()
+
+        await engine.award_message("server", "user", now=100)
+        await engine.flush()
+        await engine.flush()
+
+        assert collection.docs[("server", "user")]["xp"] == 40
+        assert engine.get_stats()["pending"] == 0
+
+    asyncio.run(run())
+
+def test_flushes_are_held_without_unique_index():
+    """Nothing is written until the unique index is verified, and nothing pending is lost"""
+    async def run():
+        economy, levels = FakeCollection(), FakeCollection()
+        ledger = EconomyLedger(economy, flush_interval=5)
+        engine = XPEngine(levels, cooldown=60, xp_range=(20, 20))
+
+        await ledger.add("server", "user", 100)
+        await engine.award_message("server", "user", now=0)
+        await ledger.flush()
+        await engine.flush()
+        assert economy.docs == levels.docs == {}
+        assert ledger.get_stats()["held_flushes"] == engine.get_stats()["held_flushes"] == 1
+
+        ledger.unique_index = engine.unique_index = True
+        await ledger.flush()
+        await engine.flush()
+        assert economy.docs[("server", "user")]["balance"] == 100
+        assert levels.docs[("server", "user")]["xp"] == 20
+
+    asyncio.run(run())